@@ -0,0 +1,134 @@
+"""
+带上界的编辑距离与editdistance.eval的对比
+读取推理结果文件中的 (middle_code, inference_result) 对 默认只取CLASS_TYPE样本
+先统一去注释和分词 只比较编辑距离本身的耗时 并检查窗口判断和窗口内的距离与editdistance.eval完全一致
+在src目录下运行: python -m benchmark.bounded_distance --input ./result/python/<model>/inference --threshold 50
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import editdistance
+
+from calculate.bounded_distance import bounded_edit_distance, distance_window, edit_similarity
+
+
+def iter_input_files(input_path):
+    path = Path(input_path)
+    if path.is_dir():
+        yield from sorted(path.rglob("*.jsonl"))
+    else:
+        yield path
+
+
+def load_pairs(input_path, fill_type, limit):
+    """返回 [(true_code, predict_code, language)]"""
+    from calculate.scoring_engine import RAW_OUTPUT_MODELS
+    from calculate import similarity
+    calculator = similarity.SimilarityCalculator()
+    pairs = []
+    for file in iter_input_files(input_path):
+        with open(file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if limit and len(pairs) >= limit:
+                    return calculator, pairs
+                try:
+                    data = json.loads(line)
+                    info = data["inference_info"]
+                    if fill_type != "all" and info.get("fill_type") != fill_type:
+                        continue
+                    inference_result = data["inference_content"]["inference_result"]
+                    language = info.get("language_type", "python")
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+                if data["inference_content"].get("inference_model") in RAW_OUTPUT_MODELS:
+                    predict_code = inference_result
+                else:
+                    predict_code = calculator.extract_code_from_predict(inference_result, language)
+                if info.get("middle_code") and predict_code:
+                    pairs.append((info["middle_code"], predict_code, language))
+    return calculator, pairs
+
+
+def tokenize_pairs(calculator, pairs):
+    from utils import utils
+    tokenized = []
+    for true_code, predict_code, language in pairs:
+        try:
+            true_clean = utils.remove_comments(true_code, language)
+            predict_clean = utils.remove_comments(predict_code, language)
+        except Exception:
+            continue
+        true_tokens = list(calculator.tokenizer(true_clean, add_special_tokens=False)['input_ids'])
+        predict_tokens = list(calculator.tokenizer(predict_clean, add_special_tokens=False)['input_ids'])
+        if true_tokens or predict_tokens:
+            tokenized.append((predict_tokens, true_tokens))
+    return tokenized
+
+
+def full_check(predict_tokens, true_tokens, lower, upper):
+    """原来的做法 先算完整的编辑距离再比较相似度"""
+    max_len = max(len(true_tokens), len(predict_tokens))
+    edit_val = editdistance.eval(predict_tokens, true_tokens)
+    similarity = edit_similarity(edit_val, max_len)
+    return (True, edit_val) if lower < similarity < upper else (False, None)
+
+
+def bounded_check(predict_tokens, true_tokens, lower, upper):
+    max_len = max(len(true_tokens), len(predict_tokens))
+    window = distance_window(max_len, lower, upper)
+    if window is None:
+        return False, None
+    edit_val = bounded_edit_distance(predict_tokens, true_tokens, window[1])
+    if edit_val is None or edit_val < window[0]:
+        return False, None
+    return True, edit_val
+
+
+def time_checks(check, tokenized, lower, upper, repeat):
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [check(p, t, lower, upper) for p, t in tokenized]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="带上界的编辑距离与editdistance.eval的对比")
+    parser.add_argument("--input", type=str, required=True, help="推理结果文件或目录")
+    parser.add_argument("--fill_type", type=str, default="CLASS_TYPE", help="只使用该类型的样本 all表示全部")
+    parser.add_argument("--lower", type=float, default=10, help="相似度窗口下界(不含)")
+    parser.add_argument("--threshold", type=float, default=50.0, help="相似度窗口上界(不含) 与create_test的similarity_threshold一致")
+    parser.add_argument("--limit", type=int, default=0, help="最多读取的样本数 0表示不限制")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数 取最快的一次")
+    args = parser.parse_args()
+
+    calculator, pairs = load_pairs(args.input, args.fill_type, args.limit)
+    tokenized = tokenize_pairs(calculator, pairs)
+    if not tokenized:
+        print(f"❌ {args.input} 中没有可用的 {args.fill_type} 样本")
+        sys.exit(1)
+    tokens = sum(len(p) + len(t) for p, t in tokenized)
+    print(f"样本数 {len(tokenized)} 平均token数 {tokens / len(tokenized) / 2:.1f} 窗口 ({args.lower}, {args.threshold})")
+
+    full_time, full_results = time_checks(full_check, tokenized, args.lower, args.threshold, args.repeat)
+    bounded_time, bounded_results = time_checks(bounded_check, tokenized, args.lower, args.threshold, args.repeat)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(full_results, bounded_results)) if a != b]
+    accepted = sum(1 for in_window, _ in full_results if in_window)
+    print(f"窗口内样本 {accepted}/{len(tokenized)}")
+    print(f"editdistance.eval   {full_time * 1e3:9.2f} ms")
+    print(f"bounded_edit_distance {bounded_time * 1e3:7.2f} ms  加速比 {full_time / bounded_time if bounded_time > 0 else 0:.2f}x")
+    if mismatches:
+        print(f"❌ {len(mismatches)} 个样本的结果不一致 例如第 {mismatches[0]} 个: {full_results[mismatches[0]]} vs {bounded_results[mismatches[0]]}")
+        sys.exit(1)
+    print("✅ 结果与editdistance.eval一致")
+
+
+if __name__ == "__main__":
+    main()
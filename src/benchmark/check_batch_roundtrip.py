@@ -0,0 +1,102 @@
+"""
+离线批量推理的导出/导入往返检查 不需要网络和模型(token数按字符估算)
+在临时目录中构造推理输入 导出请求文件后只为一部分样本写入结果(包括一条失败的结果)
+再从同一个目录导入(与--batch_output的默认值相同) 检查:
+  有结果的样本写入inference_content 失败的样本记录error
+  没有结果的样本保持未完成 不会因为读到请求文件而被记成失败 失败和缺失的样本下次都会重跑
+在src目录下运行: python -m benchmark.check_batch_roundtrip
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import inference
+from inferencepkg import batch_io
+from inferencepkg import prompt_builder
+from inferencepkg.checkpoint import get_sample_id
+from utils import jsonl_stream
+
+MODEL = "roundtrip-model"
+
+
+def make_item(index):
+    return {
+        "repo_name": "demo",
+        "file_name": f"demo_{index}.py",
+        "context_code": "",
+        "inference_info": {
+            "language_type": "python",
+            "fill_type": "LINE_TYPE",
+            "prefix_code": f"def f{index}():\n    ",
+            "middle_code": f"return {index}",
+            "suffix_code": "\n",
+        },
+        "task_instance_info": {"created_task_model": "other-model"},
+    }
+
+
+def output_line(custom_id, content=None, error=None):
+    if error is not None:
+        return {"custom_id": custom_id, "response": None, "error": {"message": error}}
+    body = {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 1, "completion_tokens": 1}}
+    return {"custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None}
+
+
+def main():
+    # 只检查导出和导入 不需要真实的tokenizer
+    prompt_builder.configure_prompt_builder(allow_char_tokenizer=True)
+    errors = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_file = os.path.join(work_dir, "demo.jsonl")
+        output_file = os.path.join(work_dir, "demo_inference_result.jsonl")
+        batch_dir = os.path.join(work_dir, "batch")
+        items = [make_item(index) for index in range(6)]
+        with open(input_file, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        bench_files = [(input_file, "python", output_file)]
+
+        request_files = inference.export_batch_requests(bench_files, MODEL, batch_dir)
+        with open(request_files[0], encoding="utf-8") as f:
+            custom_ids = [json.loads(line)["custom_id"] for line in f]
+        if len(custom_ids) != len(items):
+            errors.append(f"导出了 {len(custom_ids)} 条请求 应为 {len(items)} 条")
+
+        # 前两条成功 第三条失败 其余没有结果
+        with open(os.path.join(batch_dir, "batch_output_0000.jsonl"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(output_line(custom_ids[0], content="return 0")) + "\n")
+            f.write(json.dumps(output_line(custom_ids[1], content="<think>x</think>return 1")) + "\n")
+            f.write(json.dumps(output_line(custom_ids[2], error="server error")) + "\n")
+
+        outputs = batch_io.load_batch_outputs(batch_dir)
+        if set(outputs) != set(custom_ids[:3]):
+            errors.append(f"从目录读取到 {len(outputs)} 条结果 应为 3 条 请求文件被当成了结果")
+
+        inference.import_batch_outputs(bench_files, MODEL, batch_dir)
+        results = {get_sample_id(item): item for item in jsonl_stream.read_jsonl(output_file)} if os.path.exists(output_file) else {}
+        ids = [get_sample_id(item) for item in items]
+        if results.get(ids[0], {}).get("inference_content", {}).get("inference_result") != "return 0":
+            errors.append("第0条样本没有导入结果")
+        if results.get(ids[1], {}).get("inference_content", {}).get("inference_result") != "return 1":
+            errors.append("第1条样本没有去掉思考过程")
+        if not results.get(ids[2], {}).get("error"):
+            errors.append("第2条样本没有记录失败原因")
+        for sample_id in ids[3:]:
+            if sample_id in results:
+                errors.append(f"没有结果的样本 {sample_id[:8]} 被写入了输出: {results[sample_id].get('error')}")
+        # 失败的样本与缺失的样本一样需要重跑
+        _, pending = inference.prepare_file_task(input_file, "python", output_file)
+        if pending != 4:
+            errors.append(f"导入后剩余 {pending} 条未完成 应为 4 条")
+
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        sys.exit(1)
+    print("✅ 导出后从同一个目录导入 缺失的样本保持未完成")
+
+
+if __name__ == "__main__":
+    main()
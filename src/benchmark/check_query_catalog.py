@@ -0,0 +1,115 @@
+"""
+检查查询目录(create.query_catalog)取出的采样候选与原来逐个节点分类的结果一致 并对比耗时
+原来的做法: list(traverse_tree(root)) 后按language_symbols逐个节点做in判断
+对每个文件比较四个候选列表(包括块和单行的子类型)的内容和顺序
+作为基准的分类使用完整的先序遍历 另外单独统计与traverse_tree遍历结果不同的文件数:
+traverse_tree在单子节点链很深的语法树上(例如verilog)会提前结束 原来的采样只看到了文件的前一部分
+语料目录的格式与benchmark.remove_comments相同
+在src目录下运行: python -m benchmark.check_query_catalog --corpus ./corpus
+"""
+
+import argparse
+import sys
+import time
+
+from benchmark.remove_comments import iter_all_nodes, load_corpus
+from create.parser_factory import get_parser, traverse_tree
+from create.query_catalog import find_candidates, get_query
+from utils import utils
+
+
+def legacy_candidates(all_nodes, language):
+    """CodeSampler原来的分类逻辑 只用于对比"""
+    groups = {key: [] for key in ("import", "comment", "if", "for", "while", "return", "expression", "assignment", "class", "function")}
+    node_types = utils.language_symbols[language]
+    for child in all_nodes:
+        if child.type in node_types["IMPORT_TYPE"]:
+            groups["import"].append(child)
+        elif child.type in node_types["COMMENT_TYPE"]:
+            groups["comment"].append(child)
+        elif child.type in node_types["IF_STATEMENT_TYPE"]:
+            groups["if"].append(child)
+        elif child.type in node_types["FOR_STATEMENT_TYPE"]:
+            groups["for"].append(child)
+        elif child.type in node_types["WHILE_STATEMENT_TYPE"]:
+            groups["while"].append(child)
+        elif child.type in node_types["RETURN_STATEMENT_TYPE"]:
+            groups["return"].append(child)
+        elif child.type in node_types["EXPRESSION_STATEMENT_TYPE"]:
+            groups["expression"].append(child)
+        elif child.type in node_types["ASSIGNMENT_STATEMENT_TYPE"]:
+            groups["assignment"].append(child)
+        elif child.type in node_types["CLASS_TYPE"]:
+            groups["class"].append(child)
+        elif child.type in node_types["FUNCTION_TYPE"]:
+            groups["function"].append(child)
+    block_nodes_with_type = ([(node, "for_statement") for node in groups["for"]] + [(node, "if_statement") for node in groups["if"]]
+                             + [(node, "while_statement") for node in groups["while"]] + [(node, "import") for node in groups["import"]])
+    line_nodes_with_type = ([(node, "assignment") for node in groups["assignment"]] + [(node, "expression") for node in groups["expression"]]
+                            + [(node, "return_statement") for node in groups["return"]])
+    return groups["class"], groups["function"], block_nodes_with_type, line_nodes_with_type
+
+
+def describe(candidates):
+    """节点对象每次访问都是新的 用位置和类型比较"""
+    class_nodes, function_nodes, block_nodes_with_type, line_nodes_with_type = candidates
+    as_key = lambda node: (node.start_byte, node.end_byte, node.type)
+    return (
+        [as_key(node) for node in class_nodes],
+        [as_key(node) for node in function_nodes],
+        [(as_key(node), sub_type) for node, sub_type in block_nodes_with_type],
+        [(as_key(node), sub_type) for node, sub_type in line_nodes_with_type],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查查询目录取出的采样候选与逐个节点分类的结果一致")
+    parser.add_argument("--corpus", type=str, required=True, help="语料目录 按语言分子目录")
+    parser.add_argument("--limit", type=int, default=0, help="每种语言最多读取的文件数 0表示不限制")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.limit)
+    # html由HtmlSampler单独处理 不经过查询目录
+    corpus = {language: codes for language, codes in corpus.items() if language != "html" and language in utils.language_symbols}
+    if not corpus:
+        print(f"❌ {args.corpus} 中没有可用的语料")
+        sys.exit(1)
+
+    print(f"{'语言':<12}{'文件':>6}{'候选':>8}{'一致':>6}{'遍历提前结束':>12}{'逐个分类(ms)':>14}{'查询(ms)':>10}{'加速比':>8}")
+    totals = {"files": 0, "candidates": 0, "same": 0, "truncated": 0, "legacy_time": 0.0, "query_time": 0.0}
+    failures = []
+    for language, codes in corpus.items():
+        # 编译查询的耗时只有第一次调用才有 不计入对比
+        get_query(language)
+        row = {"files": len(codes), "candidates": 0, "same": 0, "truncated": 0, "legacy_time": 0.0, "query_time": 0.0}
+        for index, code in enumerate(codes):
+            tree = get_parser(language).parse(bytes(code, "utf8"))
+            start = time.perf_counter()
+            legacy = legacy_candidates(list(traverse_tree(tree.root_node)), language)
+            row["legacy_time"] += time.perf_counter() - start
+            start = time.perf_counter()
+            candidates = find_candidates(tree.root_node, language)
+            row["query_time"] += time.perf_counter() - start
+
+            found = describe(candidates)
+            expected = describe(legacy_candidates(iter_all_nodes(tree.root_node), language))
+            row["candidates"] += sum(len(group) for group in found)
+            if found == expected:
+                row["same"] += 1
+            else:
+                failures.append(f"{language} 第{index}个文件")
+            row["truncated"] += describe(legacy) != expected
+        print(f"{language:<12}{row['files']:>6}{row['candidates']:>8}{row['same']:>6}{row['truncated']:>12}"
+              f"{row['legacy_time'] * 1e3:>14.1f}{row['query_time'] * 1e3:>10.1f}{row['legacy_time'] / row['query_time']:>8.2f}x")
+        for key, value in row.items():
+            totals[key] += value
+    print(f"{'合计':<12}{totals['files']:>6}{totals['candidates']:>8}{totals['same']:>6}{totals['truncated']:>12}"
+          f"{totals['legacy_time'] * 1e3:>14.1f}{totals['query_time'] * 1e3:>10.1f}{totals['legacy_time'] / totals['query_time']:>8.2f}x")
+    if failures:
+        print(f"❌ {len(failures)} 个文件的候选与逐个分类的结果不一致 例如 {failures[0]}")
+        sys.exit(1)
+    print("✅ 查询取出的候选与先序遍历后逐个分类的结果一致(内容和顺序)")
+
+
+if __name__ == "__main__":
+    main()
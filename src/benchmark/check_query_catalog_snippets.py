@@ -0,0 +1,654 @@
+"""
+不需要语料的查询目录检查 每种语言一段内置的小代码 覆盖import、条件、循环、返回、表达式、赋值、类、函数等节点
+对每段代码比较查询目录(create.query_catalog.find_candidates)取出的候选与先序遍历后逐个分类的结果(内容和顺序)
+language_symbols中新增语言时需要在SNIPPETS中补充代码 否则检查失败 html由HtmlSampler单独处理 不在检查范围内
+verilog另外附带一段单子节点链很深的代码 traverse_tree在这类语法树上会提前结束 查询仍然覆盖整个文件
+在src目录下运行: python -m benchmark.check_query_catalog_snippets
+"""
+
+import sys
+
+from benchmark.check_query_catalog import describe, legacy_candidates
+from benchmark.remove_comments import iter_all_nodes
+from create.parser_factory import get_parser, traverse_tree
+from create.query_catalog import find_candidates
+from utils import utils
+
+SNIPPETS = {
+    "python": '''
+import os
+from sys import path
+
+class Point:
+    """文档字符串"""
+    def __init__(self, x):
+        self.x = x  # 注释
+
+    def norm(self):
+        if self.x > 0:
+            return self.x
+        elif self.x < 0:
+            return -self.x
+        return 0
+
+def walk(items):
+    total = 0
+    for item in items:
+        total += item
+    while total > 10:
+        total -= 1
+    print(total)
+    return total
+''',
+    "java": '''
+import java.util.List;
+
+public class Counter {
+    private int count = 0;
+
+    // 注释
+    public int add(List<Integer> items) {
+        for (int item : items) {
+            count += item;
+        }
+        for (int i = 0; i < 3; i++) {
+            count++;
+        }
+        while (count > 10) {
+            count--;
+        }
+        if (count == 0) {
+            System.out.println("zero");
+        }
+        return count;
+    }
+}
+''',
+    "cpp": '''
+#include <vector>
+
+// 注释
+class Counter {
+public:
+    int add(const std::vector<int>& items) {
+        int total = 0;
+        for (int item : items) {
+            total += item;
+        }
+        while (total > 10) {
+            total--;
+        }
+        if (total == 0) {
+            total = 1;
+        }
+        return total;
+    }
+};
+
+int main() {
+    Counter c;
+    int x = c.add({1, 2, 3});
+    return x;
+}
+''',
+    "c_sharp": '''
+using System;
+
+namespace Demo {
+    /* 注释 */
+    public class Counter {
+        public int Add(int[] items) {
+            int total = 0;
+            foreach (var item in items) {
+                total += item;
+            }
+            for (int i = 0; i < 3; i++) {
+                total++;
+            }
+            while (total > 10) {
+                total--;
+            }
+            if (total == 0) {
+                Console.WriteLine("zero");
+            }
+            return total;
+        }
+    }
+}
+''',
+    "typescript": '''
+import { readFile } from "fs";
+
+// 注释
+class Counter {
+    count: number = 0;
+    add(items: number[]): number {
+        for (const item of items) {
+            this.count += item;
+        }
+        while (this.count > 10) {
+            this.count--;
+        }
+        if (this.count === 0) {
+            console.log("zero");
+        }
+        return this.count;
+    }
+}
+
+function walk(n: number): number {
+    let total = 0;
+    for (let i = 0; i < n; i++) {
+        total += i;
+    }
+    return total;
+}
+''',
+    "javascript": '''
+import fs from "fs";
+const path = require("path");
+
+// 注释
+class Counter {
+    add(items) {
+        let total = 0;
+        for (const item of items) {
+            total += item;
+        }
+        while (total > 10) {
+            total--;
+        }
+        if (total === 0) {
+            console.log("zero");
+        }
+        return total;
+    }
+}
+
+function walk(n) {
+    let total = 0;
+    for (let i = 0; i < n; i++) {
+        total += i;
+    }
+    return total;
+}
+''',
+    "php": '''<?php
+require_once "lib.php";
+use App\\Models\\User;
+
+// 注释
+class Counter {
+    public function add($items) {
+        $total = 0;
+        foreach ($items as $item) {
+            $total += $item;
+        }
+        for ($i = 0; $i < 3; $i++) {
+            $total++;
+        }
+        while ($total > 10) {
+            $total--;
+        }
+        if ($total == 0) {
+            echo "zero";
+        }
+        return $total;
+    }
+}
+
+function walk($n) {
+    return $n * 2;
+}
+''',
+    "go": '''
+package main
+
+import (
+    "fmt"
+)
+
+// 注释
+type Counter struct {
+    count int
+}
+
+func (c *Counter) Add(items []int) int {
+    total := 0
+    for _, item := range items {
+        total += item
+    }
+    for total > 10 {
+        total--
+    }
+    if total == 0 {
+        fmt.Println("zero")
+    }
+    c.count = total
+    return total
+}
+
+func main() {
+    c := &Counter{}
+    c.Add([]int{1, 2})
+}
+''',
+    "c": '''
+#include <stdio.h>
+
+/* 注释 */
+struct point {
+    int x;
+};
+
+int walk(int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        total += i;
+    }
+    while (total > 10) {
+        total--;
+    }
+    if (total == 0) {
+        printf("zero");
+    }
+    return total;
+}
+''',
+    "rust": '''
+use std::collections::HashMap;
+
+// 注释
+struct Counter {
+    count: i32,
+}
+
+impl Counter {
+    fn add(&mut self, items: &[i32]) -> i32 {
+        let mut total = 0;
+        for item in items {
+            total += item;
+        }
+        while total > 10 {
+            total -= 1;
+        }
+        loop {
+            break;
+        }
+        if total == 0 {
+            println!("zero");
+        }
+        self.count = total;
+        return total;
+    }
+}
+''',
+    "r": '''
+library(stats)
+
+# 注释
+walk <- function(items) {
+  total <- 0
+  for (item in items) {
+    total <- total + item
+  }
+  while (total > 10) {
+    total <- total - 1
+  }
+  if (total == 0) {
+    print("zero")
+  }
+  return(total)
+}
+''',
+    "ruby": '''
+require "set"
+
+# 注释
+class Counter
+  def add(items)
+    total = 0
+    for item in items
+      total += item
+    end
+    while total > 10
+      total -= 1
+    end
+    if total == 0
+      puts "zero"
+    end
+    return total
+  end
+end
+''',
+    "scala": '''
+import scala.collection.mutable
+
+// 注释
+class Counter {
+  var count = 0
+  def add(items: List[Int]): Int = {
+    for (item <- items) {
+      count += item
+    }
+    while (count > 10) {
+      count -= 1
+    }
+    if (count == 0) {
+      println("zero")
+    }
+    return count
+  }
+}
+
+object Main {
+  val counter = new Counter()
+}
+''',
+    "kotlin": '''
+import kotlin.math.abs
+
+// 注释
+class Counter {
+    var count = 0
+    fun add(items: List<Int>): Int {
+        for (item in items) {
+            count += item
+        }
+        while (count > 10) {
+            count--
+        }
+        if (count == 0) {
+            println("zero")
+        }
+        return count
+    }
+}
+
+fun walk(n: Int): Int {
+    val total = n * 2
+    return total
+}
+''',
+    "perl": '''
+use strict;
+use List::Util qw(sum);
+
+# 注释
+package Counter;
+
+sub add {
+    my ($self, @items) = @_;
+    my $total = 0;
+    foreach my $item (@items) {
+        $total += $item;
+    }
+    for (my $i = 0; $i < 3; $i++) {
+        $total++;
+    }
+    while ($total > 10) {
+        $total--;
+    }
+    if ($total == 0) {
+        print "zero";
+    }
+    return $total;
+}
+''',
+    "lua": '''
+local json = require("json")
+
+-- 注释
+local Counter = {}
+
+function Counter.add(items)
+  local total = 0
+  for _, item in ipairs(items) do
+    total = total + item
+  end
+  for i = 1, 3 do
+    total = total + i
+  end
+  while total > 10 do
+    total = total - 1
+  end
+  if total == 0 then
+    print("zero")
+  end
+  return total
+end
+''',
+    "css": '''
+@import url("base.css");
+
+/* 注释 */
+.box {
+  color: red;
+  margin: 0 auto;
+}
+
+@media (max-width: 600px) {
+  .box {
+    display: none;
+  }
+}
+''',
+    "elisp": '''
+(require 'cl-lib)
+
+;; 注释
+(defvar demo-count 0)
+
+(defun demo-add (items)
+  (let ((total 0))
+    (dolist (item items)
+      (setq total (+ total item)))
+    (while (> total 10)
+      (setq total (1- total)))
+    (if (= total 0)
+        (message "zero"))
+    total))
+''',
+    "erlang": '''
+-module(counter).
+-export([add/1]).
+-include("records.hrl").
+
+% 注释
+add(Items) ->
+    Total = lists:sum(Items),
+    case Total of
+        0 -> io:format("zero~n");
+        _ -> ok
+    end,
+    if
+        Total > 10 -> Total - 1;
+        true -> Total
+    end.
+''',
+    "ocaml": '''
+open Printf
+
+(* 注释 *)
+type point = { x : int; y : int }
+
+let add items =
+  let total = ref 0 in
+  List.iter (fun item -> total := !total + item) items;
+  for i = 1 to 3 do
+    total := !total + i
+  done;
+  while !total > 10 do
+    total := !total - 1
+  done;
+  if !total = 0 then printf "zero\\n";
+  !total
+
+class counter = object
+  val mutable count = 0
+  method add n = count <- count + n
+end
+''',
+    "julia": '''
+using LinearAlgebra
+import Base: show
+
+# 注释
+struct Point
+    x::Int
+end
+
+function walk(items)
+    total = 0
+    for item in items
+        total += item
+    end
+    while total > 10
+        total -= 1
+    end
+    if total == 0
+        println("zero")
+    end
+    return total
+end
+''',
+    "hcl": '''
+# 注释
+variable "region" {
+  default = "us-east-1"
+}
+
+resource "aws_instance" "web" {
+  count = var.enabled ? 1 : 0
+  tags = {
+    for key, value in var.tags : key => upper(value)
+  }
+}
+
+output "ids" {
+  value = [for instance in aws_instance.web : instance.id]
+}
+''',
+    "swift": '''
+import Foundation
+
+// 注释
+class Counter {
+    var count = 0
+    func add(_ items: [Int]) -> Int {
+        for item in items {
+            count += item
+        }
+        while count > 10 {
+            count -= 1
+        }
+        if count == 0 {
+            print("zero")
+        }
+        return count
+    }
+}
+
+func walk(n: Int) -> Int {
+    let total = n * 2
+    return total
+}
+''',
+    "zig": '''
+const std = @import("std");
+
+// 注释
+const Point = struct {
+    x: i32,
+};
+
+pub fn walk(items: []const i32) i32 {
+    var total: i32 = 0;
+    for (items) |item| {
+        total += item;
+    }
+    while (total > 10) {
+        total -= 1;
+    }
+    if (total == 0) {
+        std.debug.print("zero", .{});
+    }
+    return total;
+}
+''',
+    "verilog": '''
+`include "defs.vh"
+
+// 注释
+module counter(input clk, input rst, output reg [7:0] count);
+  integer i;
+  always @(posedge clk) begin
+    if (rst) begin
+      count <= 0;
+    end else begin
+      count <= count + 1;
+    end
+    for (i = 0; i < 4; i = i + 1) begin
+      count <= count + i;
+    end
+    while (count > 10) begin
+      count = count - 1;
+    end
+  end
+  assign out = count;
+endmodule
+
+function integer double;
+  input integer x;
+  begin
+    double = x * 2;
+  end
+endfunction
+''',
+}
+
+# 单子节点链很深的语法树 traverse_tree会在到达后面的模块之前结束
+DEEP_CHAIN_SNIPPETS = {
+    "verilog": "\n".join(
+        f"module m{index}(input a, output b);\n  assign b = a;\n  always @(a) begin\n    if (a) b = 1;\n  end\nendmodule"
+        for index in range(40)
+    ),
+}
+
+
+def check(language, code):
+    """返回 (候选数, 是否一致, traverse_tree是否提前结束)"""
+    tree = get_parser(language).parse(bytes(code, "utf8"))
+    found = describe(find_candidates(tree.root_node, language))
+    expected = describe(legacy_candidates(iter_all_nodes(tree.root_node), language))
+    truncated = describe(legacy_candidates(list(traverse_tree(tree.root_node)), language)) != expected
+    return sum(len(group) for group in found), found == expected, truncated
+
+
+def main():
+    languages = [language for language in utils.language_symbols if language != "html"]
+    failures = []
+    missing = [language for language in languages if language not in SNIPPETS]
+    print(f"{'语言':<12}{'候选':>6}{'一致':>6}{'遍历提前结束':>12}")
+    cases = [(language, SNIPPETS[language]) for language in languages if language in SNIPPETS]
+    cases += [(f"{language}(深)", code) for language, code in DEEP_CHAIN_SNIPPETS.items()]
+    for name, code in cases:
+        language = name.split("(")[0]
+        count, same, truncated = check(language, code)
+        print(f"{name:<12}{count:>6}{'是' if same else '否':>6}{'是' if truncated else '否':>12}")
+        if not same:
+            failures.append(f"{name} 的候选与逐个分类的结果不一致")
+        elif count == 0:
+            failures.append(f"{name} 的代码没有取出任何候选 需要补充代码")
+
+    if missing:
+        failures.append(f"以下语言没有内置代码: {', '.join(missing)}")
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print(f"✅ {len(cases)} 段代码 查询取出的候选与先序遍历后逐个分类的结果一致(内容和顺序)")
+
+
+if __name__ == "__main__":
+    main()
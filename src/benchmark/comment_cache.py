@@ -0,0 +1,63 @@
+"""
+去注释缓存的效果
+按采样流程的调用方式重放语料: 每个文件先整体去注释(CodeSampler.sample) 再去注释一次(create_samples)
+最后打分时再去注释一次(calculate_edit_distance) 对比关闭与开启缓存的耗时 并检查结果一致
+语料目录的格式与benchmark.remove_comments相同
+在src目录下运行: python -m benchmark.comment_cache --corpus ./corpus
+"""
+
+import argparse
+import sys
+import time
+
+from benchmark.remove_comments import load_corpus
+from utils import comment_cache
+from utils import utils
+
+# 每段代码在一次完整流程中被去注释的次数
+PIPELINE_CALLS = 3
+
+
+def replay(corpus, calls):
+    start = time.perf_counter()
+    results = []
+    for language, codes in corpus.items():
+        for code in codes:
+            for _ in range(calls):
+                result = utils.remove_comments(code, language)
+            results.append(result)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去注释缓存的效果")
+    parser.add_argument("--corpus", type=str, required=True, help="语料目录 按语言分子目录")
+    parser.add_argument("--limit", type=int, default=0, help="每种语言最多读取的文件数 0表示不限制")
+    parser.add_argument("--calls", type=int, default=PIPELINE_CALLS, help="每段代码去注释的次数")
+    parser.add_argument("--max_mb", type=int, default=comment_cache.DEFAULT_MAX_BYTES // (1024 * 1024), help="缓存大小上限(MB)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.limit)
+    if not corpus:
+        print(f"❌ {args.corpus} 中没有可用的语料")
+        sys.exit(1)
+    files = sum(len(codes) for codes in corpus.values())
+    print(f"{len(corpus)} 种语言 {files} 个文件 每个文件去注释 {args.calls} 次")
+
+    comment_cache.configure_comment_cache(enabled=False)
+    uncached_time, uncached_results = replay(corpus, args.calls)
+    cache = comment_cache.configure_comment_cache(max_bytes=args.max_mb * 1024 * 1024)
+    cached_time, cached_results = replay(corpus, args.calls)
+
+    print(f"关闭缓存 {uncached_time * 1e3:9.2f} ms")
+    print(f"开启缓存 {cached_time * 1e3:9.2f} ms  加速比 {uncached_time / cached_time if cached_time > 0 else 0:.2f}x")
+    stats = cache.stats()
+    print(f"{cache.summary(stats)} 缓存 {stats['entries']} 条 {stats['bytes'] / 2 ** 20:.1f} MB")
+    if uncached_results != cached_results:
+        print("❌ 开启缓存后的结果与关闭缓存时不一致")
+        sys.exit(1)
+    print("✅ 开启缓存后的结果与关闭缓存时一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+启动时间预算检查 确认不使用embedding指标时入口脚本不会导入torch/transformers等重量级依赖
+在src目录下运行: python -m benchmark.import_time [--budget 1.0] [--repeat 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (名称, 命令) 命令在src目录下执行
+COMMANDS = [
+    ("inference.py --help", [sys.executable, "inference.py", "--help"]),
+    ("calculate_ed.py --help", [sys.executable, "calculate_ed.py", "--help"]),
+]
+
+# 这些模块只应该在第一次使用对应功能时导入
+HEAVY_MODULES = ["torch", "transformers", "anthropic", "pandas", "openai"]
+IMPORT_TARGETS = ["inference", "calculate_ed", "calculate.similarity"]
+
+
+def time_command(command, repeat):
+    """返回多次运行中最快的一次 排除磁盘缓存等偶然因素"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=SRC_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} 运行失败: {result.stderr.strip()[-500:]}")
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def loaded_heavy_modules(module):
+    """导入module之后 检查哪些重量级依赖已经被加载"""
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败: {result.stderr.strip()[-500:]}")
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口脚本启动时间预算检查")
+    parser.add_argument("--budget", type=float, default=1.0, help="单个命令允许的最长启动时间(秒)")
+    parser.add_argument("--repeat", type=int, default=3, help="每个命令运行的次数 取最快的一次")
+    args = parser.parse_args()
+
+    failures = []
+    for name, command in COMMANDS:
+        elapsed = time_command(command, args.repeat)
+        status = "OK" if elapsed < args.budget else "超出预算"
+        print(f"{name:<28} {elapsed:.3f}s  (预算 {args.budget:.1f}s) {status}")
+        if elapsed >= args.budget:
+            failures.append(name)
+
+    for module in IMPORT_TARGETS:
+        heavy = loaded_heavy_modules(module)
+        print(f"import {module:<22} 已加载的重量级依赖: {', '.join(heavy) if heavy else '无'}")
+        if heavy:
+            failures.append(f"import {module}")
+
+    if failures:
+        print(f"❌ 启动时间检查未通过: {', '.join(failures)}")
+        sys.exit(1)
+    print("✅ 启动时间检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+按需解析(LazyRecord)与完整解析的对比
+模拟打分流程对每条记录的处理: 读取created_task_model、middle_code、language_type、inference_result 追加editdistance_info后写出
+只比较JSON处理本身的耗时 并检查两种方式的输出解析后完全一致
+另外把每条记录先转成紧凑格式(与jsonl_stream写出的格式相同) 检查两种方式的输出逐字节相同
+context_code越大按需解析的收益越大 安装了orjson时完整解析已经足够快 LazyRecord默认不再扫描 可以用--stdlib_json对比两种环境
+在src目录下运行: python -m benchmark.lazy_record --input ./result/python/<model>/inference
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from utils import jsonl_stream
+from utils.lazy_record import LazyRecord
+
+EDITDISTANCE_INFO = {"edit_distance": 50.0, "true_code_clean": "", "predict_code_clean": "", "calculate_time": "0"}
+
+
+def iter_input_files(input_path):
+    path = Path(input_path)
+    if path.is_dir():
+        yield from sorted(path.rglob("*.jsonl"))
+    else:
+        yield path
+
+
+def load_lines(input_path, limit):
+    lines = []
+    for file in iter_input_files(input_path):
+        for _, line in jsonl_stream.iter_lines(file):
+            if limit and len(lines) >= limit:
+                return lines
+            lines.append(line)
+    return lines
+
+
+def score_full(line):
+    data = jsonl_stream.loads(line)
+    fields = (
+        data["task_instance_info"]["created_task_model"],
+        data["inference_info"].get("middle_code"),
+        data["inference_info"].get("language_type", "python"),
+        data["inference_content"].get("inference_result"),
+    )
+    result = data.copy()
+    result.update({"editdistance_info": EDITDISTANCE_INFO})
+    return fields, jsonl_stream.dumps_bytes(result)
+
+
+def score_lazy(line):
+    data = LazyRecord(line, scan=True)
+    fields = (
+        data["task_instance_info.created_task_model"],
+        data.get("inference_info.middle_code"),
+        data.get("inference_info.language_type", "python"),
+        data.get("inference_content.inference_result"),
+    )
+    data["editdistance_info"] = EDITDISTANCE_INFO
+    return fields, data.to_bytes()
+
+
+def time_func(func, lines, repeat):
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(line) for line in lines]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def report(full_time, lazy_time, count, total_bytes):
+    print(f"完整解析 {full_time * 1e3:9.2f} ms  {total_bytes / full_time / 2 ** 20 if full_time > 0 else 0:8.1f} MB/s  {count / full_time if full_time > 0 else 0:8.1f} 条/秒")
+    print(f"按需解析 {lazy_time * 1e3:9.2f} ms  {total_bytes / lazy_time / 2 ** 20 if lazy_time > 0 else 0:8.1f} MB/s  {count / lazy_time if lazy_time > 0 else 0:8.1f} 条/秒  加速比 {full_time / lazy_time if lazy_time > 0 else 0:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按需解析与完整解析的对比")
+    parser.add_argument("--input", type=str, required=True, help="推理结果文件或目录")
+    parser.add_argument("--limit", type=int, default=0, help="最多读取的记录数 0表示不限制")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数 取最快的一次")
+    parser.add_argument("--stdlib_json", action="store_true", help="即使安装了orjson也使用标准库json 对比未安装orjson的环境")
+    args = parser.parse_args()
+    if args.stdlib_json:
+        jsonl_stream.orjson = None
+
+    lines = [line for line in load_lines(args.input, args.limit) if b'"inference_content"' in line]
+    if not lines:
+        print(f"❌ {args.input} 中没有推理结果记录")
+        sys.exit(1)
+    total_bytes = sum(len(line) for line in lines)
+    context_bytes = sum(len(LazyRecord(line).raw_field("context_code") or b"") for line in lines)
+    print(f"记录数 {len(lines)} 平均大小 {total_bytes / len(lines) / 1024:.1f} KB context_code占比 {context_bytes / total_bytes * 100:.1f}% JSON库 {'orjson' if jsonl_stream.orjson else 'json'}")
+
+    full_time, full_results = time_func(score_full, lines, args.repeat)
+    lazy_time, lazy_results = time_func(score_lazy, lines, args.repeat)
+    report(full_time, lazy_time, len(lines), total_bytes)
+    mismatches = [
+        i for i, ((full_fields, full_line), (lazy_fields, lazy_line)) in enumerate(zip(full_results, lazy_results))
+        if full_fields != lazy_fields or jsonl_stream.loads(full_line) != jsonl_stream.loads(lazy_line)
+    ]
+    compact_lines = [jsonl_stream.dumps_bytes(jsonl_stream.loads(line)) for line in lines]
+    format_mismatches = [i for i, line in enumerate(compact_lines) if score_full(line)[1] != score_lazy(line)[1]]
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} 条记录的结果不一致 例如第 {mismatches[0]} 条")
+        sys.exit(1)
+    if format_mismatches:
+        print(f"❌ 紧凑格式的输入上 {len(format_mismatches)} 条记录的输出不是逐字节相同 例如第 {format_mismatches[0]} 条")
+        sys.exit(1)
+    print("✅ 按需解析的结果与完整解析一致 紧凑格式的输入上输出逐字节相同")
+
+
+if __name__ == "__main__":
+    main()
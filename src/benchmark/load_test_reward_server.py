@@ -0,0 +1,139 @@
+"""
+奖励服务压测 模拟强化学习每一步的大批量rollout
+多个客户端线程并发发送批量请求 统计吞吐和延迟分位数
+样本来自推理结果文件(middle_code, inference_result) 没有指定时使用合成数据
+先启动服务: python reward_server.py --port 8100
+在src目录下运行: python -m benchmark.load_test_reward_server --url http://127.0.0.1:8100 --clients 8 --batch_size 256 --requests 20
+unix socket: python -m benchmark.load_test_reward_server --unix_socket /tmp/reward.sock
+"""
+
+import argparse
+import http.client
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=600):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def make_connection(args):
+    if args.unix_socket:
+        return UnixHTTPConnection(args.unix_socket)
+    url = urlparse(args.url)
+    return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=600)
+
+
+def load_items(input_path, limit):
+    items = []
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+                items.append({
+                    "reference": data["inference_info"]["middle_code"],
+                    "completion": data["inference_content"]["inference_result"],
+                    "language": data["inference_info"].get("language_type", "python"),
+                })
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+            if limit and len(items) >= limit:
+                break
+    return items
+
+
+def synthetic_items(count, seed=0):
+    """合成的python补全 一部分完全正确 一部分有改动"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        lines = [f"    value_{j} = compute(value_{j - 1}, {rng.randint(0, 100)})" for j in range(1, rng.randint(5, 40))]
+        reference = f"def function_{i}(value_0):\n" + "\n".join(lines) + "\n    return value_0"
+        predict_lines = [line for line in lines if rng.random() > 0.2]
+        completion = f"def function_{i}(value_0):\n" + "\n".join(predict_lines) + "\n    return value_0"
+        items.append({"reference": reference, "completion": f"```python\n[TASK_BEGIN]\n{completion}\n[TASK_END]\n```", "language": "python"})
+    return items
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="奖励服务压测")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8100", help="服务地址")
+    parser.add_argument("--unix_socket", type=str, default=None, help="通过unix socket访问服务")
+    parser.add_argument("--input", type=str, default=None, help="推理结果文件 不指定时使用合成数据")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--batch_size", type=int, default=256, help="每个请求的样本数")
+    parser.add_argument("--requests", type=int, default=20, help="每个客户端发送的请求数")
+    args = parser.parse_args()
+
+    items = load_items(args.input, args.batch_size * 4) if args.input else synthetic_items(args.batch_size * 4)
+    if not items:
+        print(f"❌ {args.input} 中没有可用的样本")
+        sys.exit(1)
+
+    latencies = []
+    errors = []
+    scored = [0]
+    lock = threading.Lock()
+
+    def client(client_id):
+        connection = make_connection(args)
+        rng = random.Random(client_id)
+        for _ in range(args.requests):
+            batch = [items[rng.randrange(len(items))] for _ in range(args.batch_size)]
+            body = json.dumps({"items": batch}).encode("utf-8")
+            start = time.perf_counter()
+            try:
+                connection.request("POST", "/reward", body=body, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                payload = json.loads(response.read())
+                if response.status != 200:
+                    raise RuntimeError(payload.get("error"))
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                connection.close()
+                connection = make_connection(args)
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                scored[0] += len(payload["rewards"])
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"客户端 {args.clients} 每批 {args.batch_size} 条 共 {len(latencies)} 个成功请求 {len(errors)} 个失败")
+    print(f"吞吐 {scored[0] / elapsed:.1f} 条/秒 总耗时 {elapsed:.2f} 秒")
+    print(f"请求延迟 p50 {percentile(latencies, 50) * 1e3:.1f}ms p90 {percentile(latencies, 90) * 1e3:.1f}ms p99 {percentile(latencies, 99) * 1e3:.1f}ms")
+    if errors:
+        print(f"❌ 失败示例: {errors[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+线程内解析器缓存与每次新建解析器的对比
+每种语言分别测量获取解析器本身的耗时 以及获取解析器后解析一小段代码的耗时
+并检查不同线程拿到的是不同的解析器 同一线程内同一种语言(包括别名)拿到的是同一个解析器
+在src目录下运行: python -m benchmark.parser_pool
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import tree_sitter_language_pack as tree_sitter_languages
+from tree_sitter import Language, Parser
+
+from create.parser_factory import get_parser, normalize_language
+from utils import utils
+
+SNIPPET = b"a = 1\n"
+
+
+def uncached_parser(language):
+    """原来各个调用点的做法 每次调用都新建"""
+    language = normalize_language(language)
+    if language == "c_sharp":
+        import tree_sitter_c_sharp as tscsharp
+        return Parser(Language(tscsharp.language()))
+    return tree_sitter_languages.get_parser(language)
+
+
+def time_calls(func, language, number, parse):
+    start = time.perf_counter()
+    for _ in range(number):
+        parser = func(language)
+        if parse:
+            parser.parse(SNIPPET)
+    return (time.perf_counter() - start) / number
+
+
+def check_threads(languages):
+    """每个线程各自的解析器 返回错误信息列表"""
+    errors = []
+    results = {}
+
+    def worker(index):
+        results[index] = {language: get_parser(language) for language in languages}
+        if get_parser("c++") is not get_parser("cpp") or get_parser("C#") is not get_parser("c_sharp"):
+            errors.append(f"线程 {index} 中别名没有复用同一个解析器")
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for language in languages:
+        if len({id(results[index][language]) for index in results}) != len(results):
+            errors.append(f"{language} 的解析器在线程之间共用")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="线程内解析器缓存与每次新建解析器的对比")
+    parser.add_argument("--number", type=int, default=2000, help="每种语言调用的次数")
+    args = parser.parse_args()
+
+    languages = list(utils.language_symbols)
+    print(f"{'语言':<12}{'新建(us)':>10}{'缓存(us)':>10}{'新建+解析(us)':>16}{'缓存+解析(us)':>16}")
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for language in languages:
+        row = [
+            time_calls(uncached_parser, language, args.number, False),
+            time_calls(get_parser, language, args.number, False),
+            time_calls(uncached_parser, language, args.number, True),
+            time_calls(get_parser, language, args.number, True),
+        ]
+        totals = [total + value for total, value in zip(totals, row)]
+        print(f"{language:<12}{row[0] * 1e6:>10.2f}{row[1] * 1e6:>10.2f}{row[2] * 1e6:>16.2f}{row[3] * 1e6:>16.2f}")
+    averages = [total / len(languages) for total in totals]
+    print(f"{'平均':<12}{averages[0] * 1e6:>10.2f}{averages[1] * 1e6:>10.2f}{averages[2] * 1e6:>16.2f}{averages[3] * 1e6:>16.2f}")
+    print(f"获取解析器加速比 {averages[0] / averages[1] if averages[1] > 0 else 0:.1f}x")
+
+    errors = check_threads(languages)
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        sys.exit(1)
+    print("✅ 每个线程使用各自的解析器 别名复用同一个解析器")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+remove_comments新旧实现的对比 以旧实现的输出为基准 不把任何一种实现的输出当作标准答案
+旧实现: 最多十几遍全文正则替换 再用tree-sitter解析正则的结果 逐个注释重新拼接整个bytes
+新实现: tree-sitter解析一次 收集注释区间后一次拼接 语法树有错误、没有注释类型或者解析失败时走旧实现的路径
+
+--corpus: 完整的源文件 统计吞吐量以及输出与旧实现不同的文件数
+    语料目录按语言分子目录 子目录名为语言名(与language_symbols一致 也可以用c++、c#等别名):
+    corpus/python/*.py  corpus/java/*.java ...
+--dataset: 推理结果(*_inference_result.jsonl) 打分实际处理的是middle_code和预测代码这类片段
+    统计去注释结果与旧实现不同的片段数 以及按calculate_ed的方式计算的edit_distance的变化
+在src目录下运行:
+    python -m benchmark.remove_comments --corpus ./corpus
+    python -m benchmark.remove_comments --dataset ./result/python/<model>/inference --tokenizer_path ./models/models/Qwen/Qwen2.5-Coder-0.5B
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import editdistance
+
+from create.parser_factory import get_parser, normalize_language, traverse_tree
+from utils import comment_cache
+from utils import jsonl_stream
+from utils import utils
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def legacy_remove_comments(code, language, remove_blank_line=True):
+    """原来的实现 只用于对比"""
+    if not code or not code.strip():
+        return code
+    try:
+        code_after_regex = utils._remove_comments_regex_comprehensive(code, language)
+        try:
+            language = normalize_language(language)
+            comment_types = utils.language_symbols.get(language, {}).get('COMMENT_TYPE', [])
+            if comment_types:
+                code_bytes = bytes(code_after_regex, "utf8")
+                tree = get_parser(language).parse(code_bytes)
+                comment_ranges = [(node.start_byte, node.end_byte) for node in traverse_tree(tree.root_node) if node.type in comment_types]
+                comment_ranges.sort(key=lambda x: x[0], reverse=True)
+                for start_byte, end_byte in comment_ranges:
+                    code_bytes = code_bytes[:start_byte] + code_bytes[end_byte:]
+                code_after_regex = code_bytes.decode('utf8')
+        except Exception:
+            pass
+        if remove_blank_line:
+            code_after_regex = '\n'.join(line for line in code_after_regex.split('\n') if line.strip())
+        return code_after_regex
+    except Exception:
+        return code
+
+
+def iter_all_nodes(root_node):
+    """用栈遍历全部节点(包括注释内部的节点) 与被测实现的遍历方式无关"""
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def load_corpus(corpus_dir, limit):
+    """返回 {language: [code]}"""
+    corpus = {}
+    for directory in sorted(Path(corpus_dir).iterdir()):
+        if not directory.is_dir():
+            continue
+        language = normalize_language(directory.name)
+        codes = corpus.setdefault(language, [])
+        for file in sorted(directory.rglob("*")):
+            if limit and len(codes) >= limit:
+                break
+            if not file.is_file():
+                continue
+            try:
+                code = file.read_text(encoding="utf-8")
+            except (UnicodeDecodeError, OSError):
+                continue
+            if code.strip():
+                codes.append(code)
+    return {language: codes for language, codes in corpus.items() if codes}
+
+
+def time_func(func, codes, language, repeat):
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(code, language) for code in codes]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def same_ignoring_whitespace(a, b):
+    return _WHITESPACE.sub("", a) == _WHITESPACE.sub("", b)
+
+
+def report_corpus(corpus, repeat):
+    """整个文件上的吞吐量 以及新实现的输出与旧实现不同的文件数"""
+    print(f"{'语言':<12}{'文件':>6}{'KB':>8}{'输出相同':>8}{'忽略空白相同':>12}{'旧(MB/s)':>10}{'新(MB/s)':>10}{'加速比':>8}")
+    totals = {"files": 0, "bytes": 0, "same": 0, "same_ignoring_space": 0, "legacy_time": 0.0, "new_time": 0.0}
+    for language, codes in corpus.items():
+        size = sum(len(code.encode("utf8")) for code in codes)
+        legacy_time, legacy_results = time_func(legacy_remove_comments, codes, language, repeat)
+        new_time, new_results = time_func(utils.remove_comments, codes, language, repeat)
+        same = sum(legacy == new for legacy, new in zip(legacy_results, new_results))
+        same_ignoring_space = sum(same_ignoring_whitespace(legacy, new) for legacy, new in zip(legacy_results, new_results))
+        print(f"{language:<12}{len(codes):>6}{size / 1024:>8.0f}{same:>8}{same_ignoring_space:>12}"
+              f"{size / legacy_time / 2 ** 20:>10.2f}{size / new_time / 2 ** 20:>10.2f}{legacy_time / new_time:>8.2f}x")
+        for key, value in (("files", len(codes)), ("bytes", size), ("same", same), ("same_ignoring_space", same_ignoring_space),
+                           ("legacy_time", legacy_time), ("new_time", new_time)):
+            totals[key] += value
+    print(f"{'合计':<12}{totals['files']:>6}{totals['bytes'] / 1024:>8.0f}{totals['same']:>8}{totals['same_ignoring_space']:>12}"
+          f"{totals['bytes'] / totals['legacy_time'] / 2 ** 20:>10.2f}{totals['bytes'] / totals['new_time'] / 2 ** 20:>10.2f}{totals['legacy_time'] / totals['new_time']:>8.2f}x")
+
+
+def load_dataset(dataset_path, limit):
+    """返回 [(位置, 语言, middle_code, 提取后的预测代码)] 只保留有推理结果的记录"""
+    from calculate.similarity import extract_code
+    path = Path(dataset_path)
+    # 目录中只读推理结果 similarity结果中是同样的记录
+    files = sorted(path.rglob("*_inference_result.jsonl")) if path.is_dir() else [path]
+    records = []
+    for file in files:
+        for line_num, line in jsonl_stream.iter_lines(file):
+            if limit and len(records) >= limit:
+                return records
+            try:
+                data = jsonl_stream.loads(line)
+            except ValueError:
+                continue
+            info = data.get("inference_info") or {}
+            inference_result = (data.get("inference_content") or {}).get("inference_result")
+            language = info.get("language_type", "python")
+            predict_code = extract_code(inference_result, language) if inference_result else None
+            if info.get("middle_code") and predict_code:
+                records.append((f"{file.relative_to(path) if path.is_dir() else file.name}:{line_num}", normalize_language(language), info["middle_code"], predict_code))
+    return records
+
+
+def token_score(true_clean, predict_clean, tokenizer):
+    """与calculate_ed的edit_distance相同的计算方式"""
+    true_tokens = tokenizer(true_clean, add_special_tokens=False)["input_ids"]
+    predict_tokens = tokenizer(predict_clean, add_special_tokens=False)["input_ids"]
+    max_len = max(len(true_tokens), len(predict_tokens))
+    if max_len == 0:
+        return 100.0
+    return round((1 - editdistance.eval(predict_tokens, true_tokens) / max_len) * 100, 4)
+
+
+def report_dataset(records, tokenizer, top):
+    """
+    数据集中的代码片段(middle_code和提取后的预测代码)分别用新旧实现去注释
+    统计去注释结果不同的片段数 以及edit_distance发生变化的记录数和变化量
+    """
+    print(f"{'语言':<12}{'记录':>6}{'参考不同':>8}{'预测不同':>8}{'分数变化':>8}{'平均|Δ|':>10}{'最大|Δ|':>10}")
+    rows = {}
+    changes = []
+    for location, language, true_code, predict_code in records:
+        row = rows.setdefault(language, {"records": 0, "true_diff": 0, "predict_diff": 0, "score_diff": 0, "delta_sum": 0.0, "delta_max": 0.0})
+        legacy_true, new_true = legacy_remove_comments(true_code, language), utils.remove_comments(true_code, language)
+        legacy_predict, new_predict = legacy_remove_comments(predict_code, language), utils.remove_comments(predict_code, language)
+        row["records"] += 1
+        row["true_diff"] += legacy_true != new_true
+        row["predict_diff"] += legacy_predict != new_predict
+        if legacy_true == new_true and legacy_predict == new_predict:
+            continue
+        legacy_score = token_score(legacy_true, legacy_predict, tokenizer)
+        new_score = token_score(new_true, new_predict, tokenizer)
+        delta = abs(new_score - legacy_score)
+        if delta:
+            row["score_diff"] += 1
+            row["delta_sum"] += delta
+            row["delta_max"] = max(row["delta_max"], delta)
+            changes.append((delta, location, language, legacy_score, new_score))
+    totals = {"records": 0, "true_diff": 0, "predict_diff": 0, "score_diff": 0, "delta_sum": 0.0, "delta_max": 0.0}
+    for language, row in rows.items():
+        print(f"{language:<12}{row['records']:>6}{row['true_diff']:>8}{row['predict_diff']:>8}{row['score_diff']:>8}"
+              f"{row['delta_sum'] / row['records']:>10.3f}{row['delta_max']:>10.2f}")
+        for key in ("records", "true_diff", "predict_diff", "score_diff", "delta_sum"):
+            totals[key] += row[key]
+        totals["delta_max"] = max(totals["delta_max"], row["delta_max"])
+    print(f"{'合计':<12}{totals['records']:>6}{totals['true_diff']:>8}{totals['predict_diff']:>8}{totals['score_diff']:>8}"
+          f"{totals['delta_sum'] / max(totals['records'], 1):>10.3f}{totals['delta_max']:>10.2f}")
+    for delta, location, language, legacy_score, new_score in sorted(changes, reverse=True)[:top]:
+        print(f"  {location} {language} 旧 {legacy_score:.2f} -> 新 {new_score:.2f} (Δ {delta:.2f})")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="remove_comments新旧实现的对比")
+    parser.add_argument("--corpus", type=str, default=None, help="语料目录 按语言分子目录")
+    parser.add_argument("--dataset", type=str, default=None, help="推理结果文件或目录 比较代码片段上的去注释结果和分数")
+    parser.add_argument("--tokenizer_path", type=str, default="./models/models/Qwen/Qwen2.5-Coder-0.5B", help="计算edit_distance的tokenizer 与calculate_ed相同")
+    parser.add_argument("--limit", type=int, default=0, help="每种语言最多读取的文件数(--corpus) 或最多读取的记录数(--dataset) 0表示不限制")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数 取最快的一次")
+    parser.add_argument("--top", type=int, default=10, help="列出分数变化最大的记录数")
+    args = parser.parse_args()
+    if not args.corpus and not args.dataset:
+        parser.error("需要指定--corpus或--dataset")
+    # 只比较去注释本身 重复计时时不能命中缓存
+    comment_cache.configure_comment_cache(enabled=False)
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus, args.limit)
+        if not corpus:
+            print(f"❌ {args.corpus} 中没有可用的语料")
+            sys.exit(1)
+        report_corpus(corpus, args.repeat)
+
+    if args.dataset:
+        records = load_dataset(args.dataset, args.limit)
+        if not records:
+            print(f"❌ {args.dataset} 中没有带推理结果的记录")
+            sys.exit(1)
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer_path, local_files_only=True, trust_remote_code=True)
+        report_dataset(records, tokenizer, args.top)
+
+
+if __name__ == "__main__":
+    main()
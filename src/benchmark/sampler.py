@@ -0,0 +1,107 @@
+"""
+大文件上的采样耗时
+把语料中同一种语言的文件拼接成一个大文件(模拟整个仓库拼在一起的上下文) 行数不足--min_lines时重复拼接
+每种语言测量:
+  逐节点分类: 按字符串在language_symbols的列表中查找 与 按node.kind_id查node_tables的查找表 检查两者结果一致
+  去注释: remove_comments(关闭缓存)
+  采样: CodeSampler.sample / HtmlSampler.sample 固定随机种子 平均每次的耗时
+语料目录的格式与benchmark.remove_comments相同
+在src目录下运行: python -m benchmark.sampler --corpus ./corpus
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmark.remove_comments import iter_all_nodes, load_corpus
+from create.node_tables import CATEGORY_KEYS, get_node_table
+from create.parser_factory import get_parser
+from create.sampler_code import CodeSampler
+from utils import comment_cache
+from utils import utils
+
+
+def build_large_code(codes, min_lines):
+    code = "\n".join(codes)
+    lines = code.count("\n") + 1
+    if lines >= min_lines:
+        return code
+    return "\n".join([code] * (min_lines // lines + 1))
+
+
+def classify_by_list(nodes, node_types):
+    """原来的做法 每个节点取出类型字符串后在各个列表中逐个查找"""
+    categories = []
+    for node in nodes:
+        category = None
+        for key in CATEGORY_KEYS:
+            if node.type in node_types.get(key, []):
+                category = key
+                break
+        categories.append(category)
+    return categories
+
+
+def classify_by_table(nodes, table):
+    category_by_id = table.category_by_id
+    return [category_by_id.get(node.kind_id) for node in nodes]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大文件上的采样耗时")
+    parser.add_argument("--corpus", type=str, required=True, help="语料目录 按语言分子目录")
+    parser.add_argument("--min_lines", type=int, default=20000, help="每种语言拼接后的最少行数")
+    parser.add_argument("--samples", type=int, default=20, help="每种语言采样的次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+    comment_cache.configure_comment_cache(enabled=False)
+
+    corpus = load_corpus(args.corpus, 0)
+    corpus = {language: codes for language, codes in corpus.items() if language in utils.language_symbols}
+    if not corpus:
+        print(f"❌ {args.corpus} 中没有可用的语料")
+        sys.exit(1)
+
+    print(f"{'语言':<12}{'行数':>8}{'节点数':>10}{'列表分类(ms)':>14}{'查表分类(ms)':>14}{'加速比':>8}{'去注释(ms)':>12}{'采样(ms/次)':>12}")
+    mismatches = []
+    sampler = CodeSampler()
+    for language, codes in corpus.items():
+        code = build_large_code(codes, args.min_lines)
+        tree = get_parser(language).parse(bytes(code, "utf8"))
+        nodes = list(iter_all_nodes(tree.root_node))
+        table = get_node_table(language)
+        list_time, by_list = timed(classify_by_list, nodes, utils.language_symbols[language])
+        table_time, by_table = timed(classify_by_table, nodes, table)
+        if by_list != by_table:
+            mismatches.append(language)
+        remove_time, _ = timed(utils.remove_comments, code, language)
+
+        np.random.seed(args.seed)
+        start = time.perf_counter()
+        for _ in range(args.samples):
+            try:
+                sampler.sample(code, language, [1, 1, 1, 1])
+            except Exception as e:
+                # 个别语言的骨架生成可能失败 只统计耗时
+                print(f"{language} 采样出错: {e}")
+        sample_time = (time.perf_counter() - start) / args.samples
+
+        print(f"{language:<12}{code.count(chr(10)) + 1:>8}{len(nodes):>10}{list_time * 1e3:>14.1f}{table_time * 1e3:>14.1f}"
+              f"{list_time / table_time if table_time > 0 else 0:>8.2f}x{remove_time * 1e3:>12.1f}{sample_time * 1e3:>12.1f}")
+
+    if mismatches:
+        print(f"❌ 查表分类与列表分类不一致: {', '.join(mismatches)}")
+        sys.exit(1)
+    print("✅ 查表分类与列表分类一致")
+
+
+if __name__ == "__main__":
+    main()
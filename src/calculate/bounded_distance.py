@@ -0,0 +1,140 @@
+"""
+带上界的token编辑距离 用于create_test中的相似度窗口过滤
+只需要判断相似度是否落在 (lower, upper) 窗口内 距离超过上界时提前结束 不再计算精确值
+落在窗口内时返回与editdistance.eval完全一致的精确距离
+
+计算顺序:
+1. 去掉公共前缀和后缀 (不改变编辑距离 预测基本正确时剩下的部分很短)
+2. 长度差下界 超过上界直接判定为窗口外
+3. 较短的序列直接使用editdistance.eval (C实现 短序列上比任何Python实现都快)
+4. 较长的序列先检查多重集合差下界 再使用位并行的Myers算法(Hyyrö的编辑距离版本)
+   用Python大整数作为位向量 每处理一列检查一次下界 超过上界提前退出
+   editdistance.eval在1000个token左右之后退化为逐格动态规划 这之后位并行的实现更快
+"""
+
+from collections import Counter
+
+import editdistance
+
+# 两个序列都不短于该长度时使用位并行实现 否则使用editdistance.eval
+MYERS_MIN_TOKENS = 1024
+
+
+def trim_common_affix(a, b):
+    """去掉公共前缀和后缀 返回剩余部分"""
+    start = 0
+    limit = min(len(a), len(b))
+    while start < limit and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    return a[start:end_a], b[start:end_b]
+
+
+def length_lower_bound(a, b):
+    return abs(len(a) - len(b))
+
+
+def bag_lower_bound(a, b):
+    """
+    多重集合距离 每次编辑最多让两边的多重集合差减少1 所以差集大小中较大的一个是编辑距离的下界
+    """
+    count_a = Counter(a)
+    count_b = Counter(b)
+    return max(sum((count_a - count_b).values()), sum((count_b - count_a).values()))
+
+
+def myers_distance(a, b, max_distance=None):
+    """
+    位并行编辑距离 a作为模式串放入位向量 b逐个处理
+    max_distance不为None时 一旦可以证明距离大于max_distance就返回None
+    """
+    m, n = len(a), len(b)
+    if m == 0:
+        return n if max_distance is None or n <= max_distance else None
+    if n == 0:
+        return m if max_distance is None or m <= max_distance else None
+
+    peq = {}
+    for i, token in enumerate(a):
+        peq[token] = peq.get(token, 0) | (1 << i)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for j, token in enumerate(b, 1):
+        eq = peq.get(token, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # 第0行为D[0][j] = j 所以水平差值的最低位补1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        # 最后一行每多处理一列最多减少1
+        if max_distance is not None and score - (n - j) > max_distance:
+            return None
+    if max_distance is not None and score > max_distance:
+        return None
+    return score
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    返回a和b的编辑距离 距离大于max_distance时返回None
+    """
+    a, b = trim_common_affix(a, b)
+    if length_lower_bound(a, b) > max_distance:
+        return None
+    if not a or not b:
+        return max(len(a), len(b))
+    if min(len(a), len(b)) < MYERS_MIN_TOKENS:
+        edit_val = editdistance.eval(a, b)
+        return edit_val if edit_val <= max_distance else None
+    if bag_lower_bound(a, b) > max_distance:
+        return None
+    # 较短的一方逐个处理 提前退出的检查更早生效
+    if len(a) < len(b):
+        a, b = b, a
+    return myers_distance(a, b, max_distance)
+
+
+def edit_similarity(edit_val, max_len):
+    """与SimilarityCalculator.edit_distance_info中的edit_distance计算方式一致"""
+    return round((1 - edit_val / max_len) * 100, 4)
+
+
+def distance_window(max_len, lower, upper):
+    """
+    把相似度窗口 lower < similarity < upper 换算为编辑距离的闭区间 [min_distance, max_distance]
+    相似度随距离单调不增 按取整后的值二分查找 与直接比较相似度的结果完全一致
+    窗口为空时返回None
+    """
+    # 满足 similarity > lower 的最大距离
+    left, right = -1, max_len
+    while left < right:
+        middle = (left + right + 1) // 2
+        if edit_similarity(middle, max_len) > lower:
+            left = middle
+        else:
+            right = middle - 1
+    max_distance = left
+    # 满足 similarity < upper 的最小距离
+    left, right = 0, max_len + 1
+    while left < right:
+        middle = (left + right) // 2
+        if edit_similarity(middle, max_len) < upper:
+            right = middle
+        else:
+            left = middle + 1
+    min_distance = left
+    if max_distance < 0 or min_distance > max_distance:
+        return None
+    return min_distance, max_distance
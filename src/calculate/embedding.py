@@ -0,0 +1,164 @@
+"""
+代码embedding与余弦相似度
+模型在每个进程中只加载一次 在CPU上以torch.inference_mode()批量计算
+按token长度排序后分批(长度分桶) 同一批内的长度接近 padding最少
+参考答案(middle_code)的embedding缓存在磁盘上 同一个bench文件被多个模型评测时只需要计算预测代码的embedding
+
+torch和transformers只在第一次计算embedding时导入 不计算cosine指标时不会加载
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+
+from calculate.memmap_store import AppendOnlyStore
+
+DEFAULT_EMBEDDING_MODEL_PATH = "./models/models/Qwen/Qwen2.5-Coder-0.5B"
+DEFAULT_EMBEDDING_CACHE_DIR = "./cache/reference_embeddings"
+
+# 需要在创建进程池之前通过configure_embedding修改 fork出的worker会继承这里的设置
+EMBEDDING_SETTINGS = {
+    "model_path": DEFAULT_EMBEDDING_MODEL_PATH,
+    "num_threads": None,  # None表示使用torch的默认线程数
+    "batch_size": 16,
+    "max_length": 8192,
+    "cache_dir": DEFAULT_EMBEDDING_CACHE_DIR,  # None表示不缓存参考答案的embedding
+}
+
+_settings_lock = threading.Lock()
+_service = None
+_service_lock = threading.Lock()
+
+
+def configure_embedding(model_path=None, num_threads=None, batch_size=None, max_length=None, cache_dir=None, no_cache=False):
+    global _service
+    with _settings_lock:
+        if model_path is not None:
+            EMBEDDING_SETTINGS["model_path"] = model_path
+        if num_threads is not None:
+            EMBEDDING_SETTINGS["num_threads"] = num_threads
+        if batch_size is not None:
+            EMBEDDING_SETTINGS["batch_size"] = batch_size
+        if max_length is not None:
+            EMBEDDING_SETTINGS["max_length"] = max_length
+        if cache_dir is not None:
+            EMBEDDING_SETTINGS["cache_dir"] = cache_dir
+        if no_cache:
+            EMBEDDING_SETTINGS["cache_dir"] = None
+    with _service_lock:
+        # 设置变化后重新加载
+        _service = None
+
+
+class EmbeddingService:
+    """
+    加载一次模型 embed(texts)按长度分桶批量计算 返回L2归一化后的float32向量
+    """
+    def __init__(self, model_path, num_threads=None, batch_size=16, max_length=8192):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.model_path = str(model_path)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path, local_files_only=True, trust_remote_code=True)
+        self.model = AutoModel.from_pretrained(self.model_path, local_files_only=True, trust_remote_code=True, torch_dtype=torch.float32)
+        self.model.to("cpu")
+        self.model.eval()
+        self.model_id = self._model_id()
+        print(f"成功加载embedding模型: {self.model_path} 线程数 {torch.get_num_threads()}")
+
+    def _model_id(self):
+        """模型标识 用于区分不同模型的embedding缓存"""
+        config = getattr(self.model, "config", None)
+        name = getattr(config, "_name_or_path", "") or self.model_path
+        return hashlib.sha1(f"{name}:{getattr(config, 'hidden_size', '')}:{self.max_length}".encode("utf-8")).hexdigest()[:16]
+
+    def embed(self, texts):
+        torch = self.torch
+        input_ids = self.tokenizer(list(texts), add_special_tokens=False, truncation=True, max_length=self.max_length)["input_ids"]
+        # 按长度排序 长度接近的文本放在同一批
+        order = sorted(range(len(texts)), key=lambda index: len(input_ids[index]))
+        vectors = [None] * len(texts)
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                width = max(1, max(len(input_ids[index]) for index in batch))
+                ids = torch.zeros((len(batch), width), dtype=torch.long)
+                mask = torch.zeros((len(batch), width), dtype=torch.long)
+                for row, index in enumerate(batch):
+                    length = len(input_ids[index])
+                    if length:
+                        ids[row, :length] = torch.tensor(input_ids[index], dtype=torch.long)
+                        mask[row, :length] = 1
+                hidden = self.model(input_ids=ids, attention_mask=mask).last_hidden_state
+                # 只对真实token做平均 不计入padding
+                weights = mask.unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * weights).sum(dim=1) / weights.sum(dim=1).clamp(min=1)
+                pooled = torch.nn.functional.normalize(pooled, dim=-1)
+                for row, index in enumerate(batch):
+                    vectors[index] = pooled[row].numpy().astype(np.float32)
+        return vectors
+
+
+class EmbeddingCache(AppendOnlyStore):
+    """
+    参考答案embedding的磁盘缓存 向量以float32追加写入vectors.bin 通过memmap读取
+    index.jsonl每行记录一个key对应的偏移和维度 多个进程写入时通过文件锁互斥
+    """
+    def __init__(self, cache_dir=DEFAULT_EMBEDDING_CACHE_DIR):
+        super().__init__(cache_dir, "vectors.bin", np.float32, length_field="dim")
+
+    def get(self, key):
+        found = self.lookup(key)
+        if found is None:
+            return None
+        return np.array(found[0])
+
+    def add(self, entries):
+        """entries: [(key, vector)] 已经存在的key会被跳过"""
+        return self.append([(key, vector, None) for key, vector in entries])
+
+
+def get_embedding_service():
+    """进程内的单例 第一次调用时加载模型和缓存"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = (
+                EmbeddingService(
+                    EMBEDDING_SETTINGS["model_path"],
+                    num_threads=EMBEDDING_SETTINGS["num_threads"],
+                    batch_size=EMBEDDING_SETTINGS["batch_size"],
+                    max_length=EMBEDDING_SETTINGS["max_length"],
+                ),
+                EmbeddingCache(EMBEDDING_SETTINGS["cache_dir"]) if EMBEDDING_SETTINGS["cache_dir"] else None,
+            )
+        return _service
+
+
+def reference_key(code, model_id):
+    return f"{hashlib.sha1(code.encode('utf-8')).hexdigest()}:{model_id}"
+
+
+def cosine_similarities(true_codes, predict_codes):
+    """
+    批量计算余弦相似度 参考答案优先使用磁盘缓存 所有未命中的参考答案与预测代码放在同一批中计算
+    返回与输入等长的列表
+    """
+    service, cache = get_embedding_service()
+    keys = [reference_key(code, service.model_id) for code in true_codes]
+    true_vectors = [cache.get(key) if cache is not None else None for key in keys]
+    missing = [index for index, vector in enumerate(true_vectors) if vector is None]
+    texts = [true_codes[index] for index in missing] + list(predict_codes)
+    vectors = service.embed(texts) if texts else []
+    for index, vector in zip(missing, vectors):
+        true_vectors[index] = vector
+    predict_vectors = vectors[len(missing):]
+    if cache is not None and missing:
+        cache.add([(keys[index], true_vectors[index]) for index in missing])
+    # 向量已经归一化 点积即为余弦相似度
+    return [round(float(np.dot(true_vector, predict_vector)), 4) for true_vector, predict_vector in zip(true_vectors, predict_vectors)]
@@ -0,0 +1,119 @@
+"""
+只追加写入的磁盘存储 参考答案的token缓存和embedding缓存共用
+数组按固定的dtype追加写入数据文件 通过memmap读取
+index.jsonl每行记录一个key对应的偏移、长度以及可选的附加字段 多个进程写入时通过文件锁互斥
+"""
+
+import fcntl
+import json
+import os
+
+import numpy as np
+
+
+class AppendOnlyStore:
+    """
+    data_name: 数据文件名 dtype: 数组元素类型
+    length_field: 索引中记录长度的字段名 extra_field: 索引中随条目保存的附加字段名 None表示没有
+    已经写入的条目不会被修改 读取时会检查索引指向的数据是否完整
+    """
+    def __init__(self, cache_dir, data_name, dtype, length_field="length", extra_field=None):
+        self.cache_dir = cache_dir
+        self.data_path = os.path.join(cache_dir, data_name)
+        self.index_path = os.path.join(cache_dir, "index.jsonl")
+        self.dtype = np.dtype(dtype)
+        self.length_field = length_field
+        self.extra_field = extra_field
+        # key -> (偏移, 长度, 附加字段) 偏移和长度以元素为单位
+        self.index = {}
+        self._data = None
+        self._index_size = 0
+        self.reload()
+
+    def reload(self):
+        """读取上次之后新增的索引 并重新映射数据文件"""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_size)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # 另一个进程正在写入的行
+                        break
+                    self._index_size += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._remember(entry)
+        self._remap()
+
+    def _remember(self, entry):
+        extra = entry.get(self.extra_field) if self.extra_field else None
+        self.index[entry["key"]] = (entry["offset"], entry[self.length_field], extra)
+
+    def _remap(self):
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > 0:
+            self._data = np.memmap(self.data_path, dtype=self.dtype, mode='r')
+        else:
+            self._data = np.zeros(0, dtype=self.dtype)
+
+    def maybe_reload(self):
+        """索引文件比上次读到的位置长时才重新读取 只需要一次stat"""
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            return False
+        if size <= self._index_size:
+            return False
+        self.reload()
+        return True
+
+    def lookup(self, key):
+        """命中返回 (memmap上的切片, 附加字段) 否则返回None 切片只读 需要保留时由调用方复制"""
+        entry = self.index.get(key)
+        if entry is None or entry[0] + entry[1] > len(self._data):
+            return None
+        offset, length, extra = entry
+        return self._data[offset:offset + length], extra
+
+    def append(self, entries):
+        """
+        entries: [(key, 数组, 附加字段)] 已经存在的key会被跳过 返回实际写入的条数
+        """
+        entries = [entry for entry in entries if entry[0] not in self.index]
+        if not entries:
+            return 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.index_path, 'a', encoding='utf-8') as index_file:
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                # 其他进程可能已经写入了同样的key
+                self.reload()
+                with open(self.data_path, 'ab') as data_file:
+                    data_file.seek(0, os.SEEK_END)
+                    offset = data_file.tell() // self.dtype.itemsize
+                    records = []
+                    for key, values, extra in entries:
+                        if key in self.index:
+                            continue
+                        array = np.asarray(values, dtype=self.dtype)
+                        data_file.write(array.tobytes())
+                        record = {"key": key, "offset": offset, self.length_field: len(array)}
+                        if self.extra_field:
+                            record[self.extra_field] = extra
+                        records.append(record)
+                        self._remember(record)
+                        offset += len(array)
+                    # 缓存可以重建 不做fsync
+                    data_file.flush()
+                # 先写数据再写索引 索引中出现的条目一定有完整的数据
+                data = "".join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+                index_file.write(data)
+                index_file.flush()
+                # 持有锁期间索引文件只有当前进程在写 直接推进读取位置 不需要重新读取
+                self._index_size += len(data.encode('utf-8'))
+                # 新写入的数据需要重新映射后才能读到
+                self._remap()
+            finally:
+                fcntl.flock(index_file, fcntl.LOCK_UN)
+        return len(records)
@@ -0,0 +1,167 @@
+"""
+相似度指标注册表
+calculate_ed.py --metrics 指定的指标在同一次遍历中计算 去注释和分词的结果在所有指标之间共用
+每个指标写入editdistance_info中自己的key 默认只计算token_ed 输出与原来完全一致
+
+新增指标:
+    @register_metric("name", key="editdistance_info中的key")
+    def name_metric(record): ...
+需要整块一起计算的指标(例如embedding)使用batch=True 函数接收MetricRecord列表 返回等长的结果列表
+"""
+
+import editdistance
+
+from utils import utils
+
+DEFAULT_METRICS = ("token_ed",)
+
+# name -> {"key", "func", "batch", "description"}
+METRICS = {}
+
+
+def register_metric(name, key, batch=False, description=""):
+    def decorator(func):
+        METRICS[name] = {"key": key, "func": func, "batch": batch, "description": description}
+        return func
+    return decorator
+
+
+def parse_metrics(text):
+    """
+    解析逗号分隔的指标列表 token_ed始终计算(打分流程和统计依赖edit_distance)
+    未注册的指标抛出ValueError
+    """
+    names = [name.strip() for name in (text or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in METRICS]
+    if unknown:
+        raise ValueError(f"未知的指标 {', '.join(unknown)} 可选: {', '.join(METRICS)}")
+    ordered = list(DEFAULT_METRICS)
+    for name in names:
+        if name not in ordered:
+            ordered.append(name)
+    return ordered
+
+
+class MetricRecord:
+    """
+    一条记录的共用中间结果 指标需要的派生数据通过cached计算一次后在指标之间共用
+    """
+    def __init__(self, true_code_clean, predict_code_clean, true_tokens, predict_tokens, language):
+        self.true_code_clean = true_code_clean
+        self.predict_code_clean = predict_code_clean
+        self.true_tokens = true_tokens
+        self.predict_tokens = predict_tokens
+        self.language = language
+        self._cache = {}
+
+    def cached(self, name, func):
+        if name not in self._cache:
+            self._cache[name] = func(self)
+        return self._cache[name]
+
+
+def normalized_similarity(predict_items, true_items):
+    """与edit_distance相同的归一化方式 两边都为空时视为完全一致"""
+    max_len = max(len(true_items), len(predict_items))
+    if max_len == 0:
+        return 100.0
+    edit_val = editdistance.eval(predict_items, true_items)
+    return round((1 - edit_val / max_len) * 100, 4)
+
+
+def _code_lines(record):
+    true_lines = [line.strip() for line in record.true_code_clean.split("\n") if line.strip()]
+    predict_lines = [line.strip() for line in record.predict_code_clean.split("\n") if line.strip()]
+    return true_lines, predict_lines
+
+
+def _ast_node_types(code, language):
+    """
+    先序遍历整棵树得到的具名节点类型序列
+    不使用traverse_tree 它在单子节点链很深的语法树上(例如verilog)会提前结束 文件后面的节点不会被比较
+    """
+    from create.parser_factory import get_parser
+    tree = get_parser(language).parse(bytes(code, "utf8"))
+    types = []
+    cursor = tree.walk()
+    while True:
+        node = cursor.node
+        if node.is_named:
+            types.append(node.type)
+        if cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return types
+
+
+def _ast_nodes(record):
+    try:
+        return _ast_node_types(record.true_code_clean, record.language), _ast_node_types(record.predict_code_clean, record.language)
+    except Exception as e:
+        print(f"{record.language} 语法树解析失败 ast_node_ed记为None: {e}")
+        return None
+
+
+@register_metric("token_ed", key="edit_distance", description="tokenizer分词后id序列的编辑相似度")
+def token_edit_similarity(record):
+    return normalized_similarity(record.predict_tokens, record.true_tokens)
+
+
+@register_metric("char_ed", key="char_edit_distance", description="字符级编辑相似度(fuzzywuzzy ratio)")
+def char_edit_similarity(record):
+    return utils.cal_edit_sim([record.true_code_clean], [record.predict_code_clean])
+
+
+@register_metric("line_ed", key="line_edit_distance", description="去掉首尾空白后按行的编辑相似度")
+def line_edit_similarity(record):
+    true_lines, predict_lines = record.cached("lines", _code_lines)
+    return normalized_similarity(predict_lines, true_lines)
+
+
+@register_metric("exact_match", key="exact_match", description="忽略空白差异后完全一致记为1 否则为0")
+def exact_match(record):
+    return int(record.true_code_clean.split() == record.predict_code_clean.split())
+
+
+@register_metric("ast_node_ed", key="ast_node_edit_distance", description="tree-sitter具名节点类型序列的编辑相似度")
+def ast_node_edit_similarity(record):
+    nodes = record.cached("ast_nodes", _ast_nodes)
+    if nodes is None:
+        return None
+    true_nodes, predict_nodes = nodes
+    return normalized_similarity(predict_nodes, true_nodes)
+
+
+@register_metric("cosine", key="cosine_similarity", batch=True, description="代码embedding的余弦相似度(CPU批量计算 参考答案embedding缓存在磁盘上)")
+def cosine_similarity(records):
+    # torch和模型只在使用该指标时加载
+    from calculate import embedding
+    return embedding.cosine_similarities([record.true_code_clean for record in records], [record.predict_code_clean for record in records])
+
+
+def compute_metrics(records, names):
+    """
+    records: MetricRecord列表 names: 指标名列表
+    返回与records等长的 {key: value} 列表 单条记录的某个指标出错时该指标记为None
+    """
+    results = [{} for _ in records]
+    for name in names:
+        metric = METRICS[name]
+        key = metric["key"]
+        if metric["batch"]:
+            try:
+                values = metric["func"](records)
+            except Exception as e:
+                print(f"指标 {name} 批量计算出错: {e}")
+                values = [None] * len(records)
+            for result, value in zip(results, values):
+                result[key] = value
+            continue
+        for record, result in zip(records, results):
+            try:
+                result[key] = metric["func"](record)
+            except Exception as e:
+                print(f"指标 {name} 计算出错: {e}")
+                result[key] = None
+    return results
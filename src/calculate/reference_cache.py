@@ -0,0 +1,54 @@
+"""
+参考答案(middle_code)去注释与分词结果的持久化缓存
+同一个bench文件会被几十个模型反复打分 参考答案的去注释和分词只需要做一次
+key为(内容哈希, 语言, 去注释规则版本, tokenizer标识) token id以int32追加写入tokens.bin(calculate.memmap_store)
+index.jsonl每行记录一个key对应的偏移、长度以及去注释后的文本
+"""
+
+import hashlib
+
+import numpy as np
+
+from calculate.memmap_store import AppendOnlyStore
+from utils.comment_cache import STRIPPER_VERSION
+
+DEFAULT_REFERENCE_CACHE_DIR = "./cache/reference_tokens"
+
+
+def tokenizer_id(tokenizer):
+    """
+    tokenizer的标识 优先使用词表序列化结果的哈希 同名但不同版本的tokenizer不会共用缓存
+    """
+    try:
+        serialized = tokenizer.backend_tokenizer.to_str()
+        return hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:16]
+    except Exception:
+        return f"{getattr(tokenizer, 'name_or_path', 'unknown')}:{len(tokenizer)}"
+
+
+def make_key(code, language, tokenizer_key):
+    # 缓存的是去注释后的文本和它的token 去注释规则改变后旧的条目不再命中
+    return f"{hashlib.sha1(code.encode('utf-8')).hexdigest()}:{language}:s{STRIPPER_VERSION}:{tokenizer_key}"
+
+
+class ReferenceCache(AppendOnlyStore):
+    """
+    worker进程只读 由父进程调用add写入 多个calculate_ed进程同时写入时通过文件锁互斥
+    worker在每个块开始前调用maybe_reload 读到父进程在之后写入的条目 前一个模型新增的参考答案对后面的模型可见
+    """
+    def __init__(self, cache_dir=DEFAULT_REFERENCE_CACHE_DIR):
+        super().__init__(cache_dir, "tokens.bin", np.int32, extra_field="clean")
+
+    def get(self, key):
+        """命中返回 (去注释后的文本, token id列表) 否则返回None"""
+        found = self.lookup(key)
+        if found is None:
+            return None
+        tokens, clean = found
+        return clean, tokens.tolist()
+
+    def add(self, entries):
+        """
+        entries: [(key, clean, tokens)] 已经存在的key会被跳过
+        """
+        return self.append([(key, tokens, clean) for key, clean, tokens in entries])
@@ -0,0 +1,199 @@
+"""
+calculate_ed.py使用的多进程批量打分引擎
+推理结果按块分发到进程池 每个worker只加载一次tokenizer 块内去注释后批量编码
+记录通过LazyRecord读取 没有orjson时只解码打分用到的字段 context_code等其余字段的原始bytes直接写回输出
+按输入顺序写出结果 输出解析后与逐行计算时完全一致 格式为jsonl_stream的紧凑格式 与原来json.dumps的输出不是逐字节相同
+"""
+
+import json
+import multiprocessing as mp
+import os
+import time
+
+from calculate.metrics import DEFAULT_METRICS
+from calculate.reference_cache import ReferenceCache, make_key, tokenizer_id
+from utils import comment_cache
+from utils import jsonl_stream
+from utils.lazy_record import LazyRecord
+
+# 这些模型直接输出代码 不需要从markdown中提取
+RAW_OUTPUT_MODELS = ("Qwen3-8B-My-Instruct", "Qwen3-8B-RL-GSPO", "Qwen3-8B-RL-GRPO")
+
+DEFAULT_CHUNK_SIZE = 64
+
+# worker进程内的全局状态 由_init_worker初始化 在所有语言和模型之间共用
+_calculator = None
+_reference_cache = None
+_tokenizer_key = None
+
+
+def _init_worker(reference_cache_dir=None, quiet_tokenizer_threads=True, reference_cache=None):
+    """reference_cache: 在当前进程中计算时直接使用引擎的实例 与父进程写入的是同一份索引"""
+    global _calculator, _reference_cache, _tokenizer_key
+    if quiet_tokenizer_threads:
+        # 已经按进程并行 关闭tokenizers自带的线程池 避免CPU超额订阅
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    from calculate import similarity
+    _calculator = similarity.SimilarityCalculator()
+    if reference_cache is not None:
+        _reference_cache = reference_cache
+        _tokenizer_key = tokenizer_id(_calculator.tokenizer)
+    elif reference_cache_dir:
+        # worker只读 新的参考答案交给父进程统一写入
+        _reference_cache = ReferenceCache(reference_cache_dir)
+        _tokenizer_key = tokenizer_id(_calculator.tokenizer)
+
+
+def score_chunk(task):
+    """
+    task: (model, chunk, metrics) chunk为[(line_num, line)] 模型和指标随任务传入 同一个进程池可以给多个模型打分
+    返回 (输出行列表, 处理的记录数, 新增的参考答案缓存, 缓存命中数, (进程id, 去注释缓存统计)) 输出行已经序列化 顺序与输入一致
+    跳过逻辑与原来逐行计算时保持一致
+    """
+    model, chunk, metrics = task
+    prepared = []
+    for line_num, line in chunk:
+        try:
+            data = LazyRecord(line)
+            # 检查创建task的model和当前的model是否一致
+            created_task_model = data["task_instance_info.created_task_model"]
+            if created_task_model.lower() == model.lower(): # 创建task的model和当前model一致就不重新计算
+                print(f"第{line_num}行：已存在相似度数据 并且创建任务的模型{created_task_model}与推理模型{model}一致，跳过计算 ")
+                prepared.append((line_num, data, None))
+                continue
+            else:
+                print(f"第{line_num}行：即使已存在相似度数据 但是创建任务的模型{created_task_model}与推理模型{model}不一致，需要重新计算相似度 ")
+
+            # 获取数据
+            true_code = data.get('inference_info.middle_code')
+            inference_code = data.get("inference_content.inference_result")
+            language_type = data.get('inference_info.language_type', 'python')
+
+            # 步骤1：从predict_middle_code中提取代码
+            predict_code = _calculator.extract_code_from_predict(inference_code, language_type)
+            if model in RAW_OUTPUT_MODELS:
+                predict_code = inference_code
+            if not true_code:
+                print(f"第{line_num}行：true_code 为空，跳过")
+                continue
+            elif not predict_code:
+                print(f"第{line_num}行：predict_code 为空，跳过")
+                continue
+            prepared.append((line_num, data, (true_code, predict_code, language_type)))
+        except json.JSONDecodeError as e:
+            print(f"第{line_num}行JSON解析错误: {e}")
+        except Exception as e:
+            print(f"第{line_num}行处理出错: {e}")
+
+    # 步骤2：批量计算编辑距离 参考答案优先使用缓存
+    pairs = [pair for _, _, pair in prepared if pair is not None]
+    references, new_references, hits = None, [], 0
+    if _reference_cache is not None:
+        # 父进程可能已经写入了其他块或者前一个模型新增的参考答案
+        _reference_cache.maybe_reload()
+        keys = [make_key(true_code, language_type, _tokenizer_key) for true_code, _, language_type in pairs]
+        references = [_reference_cache.get(key) for key in keys]
+        missing = [index for index, reference in enumerate(references) if reference is None]
+        hits = len(references) - len(missing)
+    scores = iter(_calculator.calculate_edit_distance_batch(pairs, references, metrics=metrics))
+    if _reference_cache is not None:
+        new_references = [(keys[index], *references[index]) for index in missing if references[index] is not None]
+    lines = []
+    for line_num, data, pair in prepared:
+        if pair is None:
+            lines.append(data.to_bytes())
+            continue
+        editdistance_result = next(scores)
+        if isinstance(editdistance_result, Exception):
+            print(f"第{line_num}行处理出错: {editdistance_result}")
+            continue
+        # 保存原始数据并添加计算结果 未修改的字段原样输出
+        data["editdistance_info"] = editdistance_result
+        lines.append(data.to_bytes())
+        print(f"第{line_num}行处理完成，编辑距离: {editdistance_result['edit_distance']}")
+    # worker通过os._exit退出 不会执行atexit 每个任务结束时写入新的去注释结果
+    cache = comment_cache.get_comment_cache()
+    cache.flush()
+    return lines, len(chunk), new_references, hits, (os.getpid(), cache.stats())
+
+
+def iter_chunks(input_path, chunk_size):
+    """按块流式读取原始行 行在worker中解析"""
+    chunk = []
+    for line_num, line in jsonl_stream.iter_lines(input_path):
+        chunk.append((line_num, line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ScoringEngine:
+    """
+    进程池在多个文件、语言和模型之间复用 workers为1时在当前进程中计算 方便调试
+    """
+    def __init__(self, model=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, reference_cache_dir=None, metrics=None):
+        self.model = model
+        self.metrics = list(metrics or DEFAULT_METRICS)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.reference_cache_dir = reference_cache_dir
+        # 父进程是参考答案缓存唯一的写入者
+        self.reference_cache = ReferenceCache(reference_cache_dir) if reference_cache_dir else None
+        self.reference_hits = 0
+        self.reference_misses = 0
+        # 进程id -> 该进程去注释缓存的累计统计
+        self.comment_cache_stats = {}
+        self._pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = mp.get_context("fork").Pool(self.workers, initializer=_init_worker, initargs=(self.reference_cache_dir,))
+        else:
+            _init_worker(self.reference_cache_dir, quiet_tokenizer_threads=False, reference_cache=self.reference_cache)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _map(self, chunks):
+        if self._pool is None:
+            return map(score_chunk, chunks)
+        # imap保证结果按输入顺序返回
+        return self._pool.imap(score_chunk, chunks)
+
+    def score_file(self, input_path, output_path, model=None):
+        """
+        计算一个推理结果文件 先写临时文件再替换 返回 (写出的条数, 处理的记录数, 耗时)
+        model为None时使用创建引擎时指定的模型
+        """
+        model = model or self.model
+        tasks = ((model, chunk, self.metrics) for chunk in iter_chunks(input_path, self.chunk_size))
+        start = time.time()
+        written, processed = 0, 0
+        with jsonl_stream.JsonlWriter(output_path) as writer:
+            for lines, count, new_references, hits, (pid, cache_stats) in self._map(tasks):
+                self.comment_cache_stats[pid] = cache_stats
+                for line in lines:
+                    writer.write_raw(line)
+                written += len(lines)
+                processed += count
+                if self.reference_cache is not None:
+                    self.reference_cache.add(new_references)
+                    self.reference_hits += hits
+                    self.reference_misses += len(new_references)
+        elapsed = time.time() - start
+        print(f"处理完成，共处理 {written} 条数据，结果保存到: {output_path}")
+        print(f"共读取 {processed} 条记录 耗时 {elapsed:.2f} 秒 速度 {processed / elapsed if elapsed > 0 else 0:.1f} 条/秒")
+        if self.reference_cache is not None:
+            print(f"参考答案缓存 命中 {self.reference_hits} 次 新增 {self.reference_misses} 条")
+        if self.comment_cache_stats:
+            print(comment_cache.format_summary(comment_cache.merge_stats(self.comment_cache_stats.values())))
+        return written, processed, elapsed
@@ -2,13 +2,36 @@ import re
 from utils import utils
 from utils.logger import setup_logger
 import logging
-from transformers import AutoTokenizer, AutoModel
 from pathlib import Path
 import inspect
 import os
 import editdistance
+from calculate.bounded_distance import bounded_edit_distance, distance_window
+from calculate import metrics as metrics_module
 from datetime import datetime
-import torch
+
+def code_extraction_patterns(language_type):
+    """依次尝试的三种提取模式: ```语言 [TASK_BEGIN]...[TASK_END]```、[TASK_BEGIN]...[TASK_END]、```语言 ...```"""
+    # re.escape的用途是防止类似于c++的语言被匹配成正则的元符号
+    return [
+        rf'```{re.escape(language_type)}\s*\[TASK_BEGIN\]([\s\S]*?)\[TASK_END\]\s*```',
+        rf'\[TASK_BEGIN\]([\s\S]*?)\[TASK_END\]',
+        rf"```{re.escape(language_type)}\s*([\s\S]*?)\s*```",
+    ]
+
+
+def extract_code(predict_text, language_type):
+    """
+    与SimilarityCalculator.extract_code_from_predict的提取规则完全一致 但不写日志 供奖励服务等高吞吐场景使用
+    """
+    if not predict_text:
+        return ""
+    for pattern in code_extraction_patterns(language_type):
+        match = re.search(pattern, predict_text)
+        if match:
+            return match.group(1).strip()
+    return None
+
 
 class SimilarityCalculator:
     """代码相似度和复杂度计算器"""
@@ -20,9 +43,9 @@ class SimilarityCalculator:
         self.embedding_model_name = "Qwen2.5-Coder-0.5B"
         self.tokenizer_path = Path("./models/models/Qwen/Qwen2.5-Coder-0.5B") # 注意如果是从外部使用的话 包的路径需要修改
         self.embedding_path = Path("./models/models/Qwen") / self.embedding_model_name
-        self.device = torch.device("cuda:7" if torch.cuda.is_available() else "cpu")
         
-        # 初始化tokenizer
+        # 初始化tokenizer 只在创建计算器时导入transformers 导入本模块本身不依赖transformers和torch
+        from transformers import AutoTokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(
             self.tokenizer_path,
             local_files_only=True,
@@ -38,8 +61,9 @@ class SimilarityCalculator:
         if not predict_text:
             return ""
         
-        # 匹配TASK_BEGIN到TASK_END之间的内容 re.escape的用途是防止类似于c++的语言被匹配成正则的元符号
-        pattern = rf'```{re.escape(language_type)}\s*\[TASK_BEGIN\]([\s\S]*?)\[TASK_END\]\s*```'
+        # 匹配TASK_BEGIN到TASK_END之间的内容
+        patterns = code_extraction_patterns(language_type)
+        pattern = patterns[0]
         match = re.search(pattern, predict_text)
         if match:
             self.logger_info.info(f"{os.path.basename(__file__)}: 第一次正则匹配(```模式)获取到了代码为{match.group(1).strip()}")
@@ -48,7 +72,7 @@ class SimilarityCalculator:
             self.logger_error.error(f"{os.path.basename(__file__)}: 第一次正则没有获取到代码 当前代码为{predict_text} 将使用第二次[TASK_BEGIN]模式匹配"
             ,exc_info=True)
         
-        pattern = rf'\[TASK_BEGIN\]([\s\S]*?)\[TASK_END\]'
+        pattern = patterns[1]
         match = re.search(pattern, predict_text)
         if match:
             self.logger_info.info(f"{os.path.basename(__file__)}: 第二次正则匹配([TASK_BEGIN]模式)获取到了代码为{match.group(1).strip()}")
@@ -57,7 +81,7 @@ class SimilarityCalculator:
             self.logger_error.error(f"{os.path.basename(__file__)}: 第二次正则没有获取到代码 当前代码为{predict_text}"
             ,exc_info=True)
 
-        pattern = rf"```{re.escape(language_type)}\s*([\s\S]*?)\s*```"
+        pattern = patterns[2]
         match = re.search(pattern, predict_text)
         if match:
             self.logger_info.info(f"{os.path.basename(__file__)}: 第三次正则匹配(没有label模式)获取到了代码为{match.group(1).strip()}")
@@ -77,6 +101,10 @@ class SimilarityCalculator:
         true_tokens = list(self.tokenizer(true_code_clean, add_special_tokens=False)['input_ids'])
         predict_tokens = list(self.tokenizer(predict_code_clean, add_special_tokens=False)['input_ids'])
 
+        return self.edit_distance_info(true_code_clean, predict_code_clean, true_tokens, predict_tokens)
+
+    def edit_distance_info(self, true_code_clean, predict_code_clean, true_tokens, predict_tokens):
+        """根据已经分好词的id数组生成editdistance_info 单条计算与批量计算共用 保证输出格式一致"""
         edit_val = editdistance.eval(predict_tokens, true_tokens)
         max_len = max(len(true_tokens), len(predict_tokens))
 
@@ -87,34 +115,93 @@ class SimilarityCalculator:
             "predict_code_clean": predict_code_clean
         }
 
+    def edit_distance_in_window(self, true_code, predict_code, language, lower, upper):
+        """
+        只判断编辑相似度是否满足 lower < edit_distance < upper
+        距离可以证明落在窗口外时提前结束 不计算精确值
+        返回 (是否在窗口内, editdistance_info) 在窗口内时editdistance_info与calculate_edit_distance的结果一致 否则为None
+        """
+        true_code_clean = utils.remove_comments(true_code, language)
+        predict_code_clean = utils.remove_comments(predict_code, language)
+
+        true_tokens = list(self.tokenizer(true_code_clean, add_special_tokens=False)['input_ids'])
+        predict_tokens = list(self.tokenizer(predict_code_clean, add_special_tokens=False)['input_ids'])
+
+        max_len = max(len(true_tokens), len(predict_tokens))
+        window = distance_window(max_len, lower, upper) if max_len > 0 else None
+        if window is None:
+            return False, None
+        min_distance, max_distance = window
+        edit_val = bounded_edit_distance(predict_tokens, true_tokens, max_distance)
+        if edit_val is None or edit_val < min_distance:
+            return False, None
+        return True, {
+            "edit_distance": round((1 - edit_val / max_len) * 100, 4),
+            "calculate_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "true_code_clean": true_code_clean,
+            "predict_code_clean": predict_code_clean
+        }
+
+    def calculate_edit_distance_batch(self, pairs, references=None, metrics=None):
+        """
+        批量计算编辑距离 pairs: [(true_code, predict_code, language)]
+        去注释后一次性调用tokenizer的批量编码 返回与calculate_edit_distance相同格式的结果列表
+        某一条计算失败时对应位置为异常对象 由调用方决定如何处理
+        references: 可选 与pairs等长的列表 元素为参考答案已经缓存的(去注释文本, token id列表)或None
+                    为None的位置计算完成后会被填上 调用方可以据此更新缓存
+        metrics: 可选 calculate.metrics中注册的指标名列表 token_ed以外的指标追加到结果中各自的key下
+        """
+        if references is None:
+            references = [None] * len(pairs)
+        cleaned = []
+        for (true_code, predict_code, language), reference in zip(pairs, references):
+            try:
+                true_code_clean = reference[0] if reference is not None else utils.remove_comments(true_code, language)
+                cleaned.append((true_code_clean, utils.remove_comments(predict_code, language)))
+            except Exception as e:
+                cleaned.append(e)
+        # 只对没有缓存的参考答案和所有预测结果分词
+        texts = []
+        for item, reference in zip(cleaned, references):
+            if isinstance(item, Exception):
+                continue
+            if reference is None:
+                texts.append(item[0])
+            texts.append(item[1])
+        input_ids = iter(self.tokenizer(texts, add_special_tokens=False)['input_ids'] if texts else [])
+        results = []
+        records = []
+        for index, item in enumerate(cleaned):
+            if isinstance(item, Exception):
+                results.append(item)
+                continue
+            if references[index] is None:
+                references[index] = (item[0], list(next(input_ids)))
+            true_tokens = references[index][1]
+            predict_tokens = list(next(input_ids))
+            try:
+                results.append(self.edit_distance_info(item[0], item[1], true_tokens, predict_tokens))
+                records.append((index, metrics_module.MetricRecord(item[0], item[1], true_tokens, predict_tokens, pairs[index][2])))
+            except Exception as e:
+                results.append(e)
+
+        # 其余指标在同一批记录上计算 共用去注释和分词的结果
+        extra_metrics = [name for name in metrics or [] if name not in metrics_module.DEFAULT_METRICS]
+        if extra_metrics and records:
+            values = metrics_module.compute_metrics([record for _, record in records], extra_metrics)
+            for (index, _), value in zip(records, values):
+                results[index].update(value)
+        return results
+
     def calculate_cosine_similarity(self, true_code, predict_code, language):
-        """使用embedding信息来计算余弦相似度 ‼️ 未完成 有很多问题"""
+        """使用embedding信息来计算余弦相似度 模型由calculate.embedding统一加载 批量计算请使用cosine指标"""
+        from calculate import embedding
         true_code_clean = utils.remove_comments(true_code, language)
         predict_code_clean = utils.remove_comments(predict_code, language)
-        
-        def get_embedding(code):
-            """获取code对应的embedding"""
-            inputs = self.tokenizer(
-                code,
-                return_tensors="pt",
-                truncation=True,
-                max_length=8192,
-                padding=True,
-            ).to(self.device)
-
-            with torch.no_grad():
-                outputs = self.embedding_model(**inputs)
-
-            embedding = outputs.last_hidden_state.mean(dim=1).squeeze()
-            return embedding.cpu()
-        true_code_embedding = get_embedding(true_code_clean).to(self.device)
-        predict_code_embedding = get_embedding(predict_code_clean).to(self.device)
-        cosine_sim = torch.nn.functional.cosine_similarity(true_code_embedding, predict_code_embedding, dim=0)
+        cosine_sim = embedding.cosine_similarities([true_code_clean], [predict_code_clean])[0]
         return {
-            "cosine_similarity": cosine_sim.item(),
+            "cosine_similarity": cosine_sim,
             "calculate_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "true_code_clean": true_code_clean,
             "predict_code_clean": predict_code_clean
         }
-            
-
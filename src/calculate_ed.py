@@ -4,25 +4,51 @@ import os
 from pathlib import Path
 from utils import utils
 import argparse
-from fuzzywuzzy import fuzz
 from utils.logger import setup_logger
 import logging
-from calculate import similarity
+from calculate.scoring_engine import ScoringEngine, DEFAULT_CHUNK_SIZE
+from calculate.reference_cache import DEFAULT_REFERENCE_CACHE_DIR
+from calculate.metrics import METRICS, parse_metrics
+from calculate import embedding
+from utils import comment_cache
 
 logger_info = setup_logger("DeepSeek-R1", logging.INFO)
 logger_error = setup_logger("DeepSeek-R1", logging.ERROR)
 
-# 全局相似度计算器实例
-calculator = None
+# 全局打分引擎实例 进程池在所有文件之间复用
+engine = None
 
 def parse_args():
     """
     解析命令行参数
     """
     parser = argparse.ArgumentParser(description='计算代码相似度')
-    parser.add_argument('--language', type=str, required=True, help='编程语言')
-    parser.add_argument('--model', type=str, required=True, help='模型')
-    return parser.parse_args()
+    parser.add_argument('--language', type=str, default=None, help='编程语言 多个语言用逗号分隔')
+    parser.add_argument('--all', action='store_true', help='处理./result下的所有语言')
+    parser.add_argument('--model', type=str, required=True, help='模型 多个模型用逗号分隔')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='打分进程数 默认为CPU核数')
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE, help='每个任务块包含的记录数 块内批量分词')
+    parser.add_argument('--reference_cache', type=str, default=DEFAULT_REFERENCE_CACHE_DIR, help='参考答案去注释与分词结果的缓存目录')
+    parser.add_argument('--no-reference-cache', dest='no_reference_cache', action='store_true', help='不使用参考答案缓存')
+    parser.add_argument('--metrics', type=str, default='token_ed',
+                        help=f'要计算的指标 多个指标用逗号分隔 token_ed始终计算 可选: {",".join(METRICS)}')
+    parser.add_argument('--embedding_model', type=str, default=embedding.DEFAULT_EMBEDDING_MODEL_PATH, help='cosine指标使用的embedding模型路径')
+    parser.add_argument('--embedding_threads', type=int, default=None, help='每个打分进程计算embedding的线程数 默认为CPU核数/进程数')
+    parser.add_argument('--embedding_batch_size', type=int, default=16, help='embedding的批大小')
+    parser.add_argument('--embedding_cache', type=str, default=embedding.DEFAULT_EMBEDDING_CACHE_DIR, help='参考答案embedding的缓存目录')
+    parser.add_argument('--no-embedding-cache', dest='no_embedding_cache', action='store_true', help='不缓存参考答案的embedding')
+    parser.add_argument('--comment_cache', type=str, default=None,
+                        help=f'去注释结果的sqlite缓存文件 例如 {comment_cache.DEFAULT_CACHE_PATH} 可以与create_test.py共用 默认只在内存中缓存')
+    parser.add_argument('--comment_cache_max_mb', type=int, default=comment_cache.DEFAULT_MAX_BYTES // (1024 * 1024), help='内存中去注释缓存的总大小上限(MB) 按打分进程数平分给每个进程')
+    parser.add_argument('--no-comment-cache', dest='no_comment_cache', action='store_true', help='不缓存去注释结果')
+    args = parser.parse_args()
+    if not args.all and not args.language:
+        parser.error("需要指定 --language 或者 --all")
+    try:
+        args.metrics = parse_metrics(args.metrics)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 def get_output_path(input_file, language, model):
     """
@@ -46,74 +72,33 @@ def get_output_path(input_file, language, model):
     
 
     
-def calculate_similarity(input_path: str, output_path: str):
+def discover_inputs(languages, models):
     """
-    计算代码相似度的主函数
+    查找 ./result/{language}/{model}/inference 下的所有推理结果
+    返回 [(language, model, jsonl_file)]
     """
-    results = []
-    
-    try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                
-                try:
-                    data = json.loads(line)
-                    # 检查创建task的model和当前的model是否一致
-                    created_task_model = data["task_instance_info"]["created_task_model"]
-                    if created_task_model.lower() == model.lower(): # 创建task的model和当前model一致就不重新计算
-                        print(f"第{line_num}行：已存在相似度数据 并且创建任务的模型{created_task_model}与推理模型{model}一致，跳过计算 ")
-                        results.append(data)
-                        continue
-                    else:
-                        print(f"第{line_num}行：即使已存在相似度数据 但是创建任务的模型{created_task_model}与推理模型{model}不一致，需要重新计算相似度 ")
+    inputs = []
+    for language in languages:
+        for model in models:
+            input_path = f"./result/{language}/{model}/inference"
+            if not os.path.isdir(input_path):
+                print(f"{input_path} 不存在，跳过")
+                continue
+            # 扫描所有.jsonl文件
+            jsonl_files = utils.scan_jsonl_files(input_path)
+            if not jsonl_files:
+                print(f"在 {input_path} 中没有找到 .jsonl 文件")
+                continue
+            print(f"找到 {len(jsonl_files)} 个 .jsonl 文件: {jsonl_files}")
+            inputs.extend((language, model, jsonl_file) for jsonl_file in jsonl_files)
+    return inputs
 
-                    
-                    # 获取数据
-                    true_code = data["inference_info"].get('middle_code')
-                    inference_code = data["inference_content"].get("inference_result")
-                    language_type = data["inference_info"].get('language_type', 'python')
-                    
-                    # 步骤1：从predict_middle_code中提取代码
-                    predict_code = calculator.extract_code_from_predict(inference_code, language_type)
-                    if model == "Qwen3-8B-My-Instruct" or model == "Qwen3-8B-RL-GSPO" or model == "Qwen3-8B-RL-GRPO":
-                        predict_code = inference_code
-                    if not true_code:
-                        print(f"第{line_num}行：true_code 为空，跳过")
-                        continue
-                    elif not predict_code:
-                        print(f"第{line_num}行：predict_code 为空，跳过")
-                        continue
-                    
-                    # 步骤2：计算编辑距离
-                    editdistance_result = calculator.calculate_edit_distance(true_code, predict_code, language_type)
-                    # 保存原始数据并添加计算结果
-                    result = data.copy()
-                    result.update({
-                        "editdistance_info": editdistance_result
-                    })
-                    
-                    results.append(result)
-                    
-                    print(f"第{line_num}行处理完成，编辑距离: {editdistance_result['edit_distance']}")
-                    
-                except json.JSONDecodeError as e:
-                    print(f"第{line_num}行JSON解析错误: {e}")
-                    continue
-                except Exception as e:
-                    print(f"第{line_num}行处理出错: {e}")
-                    continue
-        
-        # 保存结果
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for result in results:
-                f.write(json.dumps(result, ensure_ascii=False) + '\n')
-        
-        print(f"处理完成，共处理 {len(results)} 条数据，结果保存到: {output_path}")
-        
+def calculate_similarity(input_path: str, output_path: str, model=None):
+    """
+    计算代码相似度的主函数 由打分引擎在进程池中分块计算 结果按输入顺序写出
+    """
+    try:
+        engine.score_file(input_path, str(output_path), model=model)
     except FileNotFoundError:
         print(f"输入文件不存在: {input_path}")
     except Exception as e:
@@ -121,34 +106,49 @@ def calculate_similarity(input_path: str, output_path: str):
 
 if __name__ == "__main__":
     args = parse_args()
-    language = args.language.lower()
-    model = args.model
-    input_path = f"./result/{language}/{model}/inference"
-    logger_info = setup_logger(model, logging.INFO)
-    logger_error = setup_logger(model, logging.ERROR)
-    
-    # 扫描所有.jsonl文件
-    jsonl_files = utils.scan_jsonl_files(input_path)
-    calculator = similarity.SimilarityCalculator()
-    
-    if not jsonl_files:
-        print(f"在 {input_path} 中没有找到 .jsonl 文件")
+    models = [model.strip() for model in args.model.split(",") if model.strip()]
+    if args.all:
+        languages = sorted(entry.name for entry in os.scandir("./result") if entry.is_dir())
+    else:
+        languages = [language.strip().lower() for language in args.language.split(",") if language.strip()]
+    logger_info = setup_logger(models[0], logging.INFO)
+    logger_error = setup_logger(models[0], logging.ERROR)
+
+    inputs = discover_inputs(languages, models)
+    if not inputs:
+        print(f"在 ./result/{languages}/{models}/inference 中没有找到 .jsonl 文件")
         exit(1)
+
+    print(f"共 {len(languages)} 种语言 {len(models)} 个模型 {len(inputs)} 个文件 指标: {', '.join(args.metrics)}")
+
+    if "cosine" in args.metrics:
+        # 进程池已经按进程并行 每个进程的torch线程数默认平分CPU
+        embedding.configure_embedding(
+            model_path=args.embedding_model,
+            num_threads=args.embedding_threads or max(1, (os.cpu_count() or 1) // max(1, args.workers or 1)),
+            batch_size=args.embedding_batch_size,
+            cache_dir=args.embedding_cache,
+            no_cache=args.no_embedding_cache,
+        )
+
+    # 在创建进程池之前配置 worker通过fork继承 每个worker各有一份缓存 总大小按进程数平分
+    comment_cache.configure_comment_cache(max_bytes=args.comment_cache_max_mb * 1024 * 1024, path=args.comment_cache, enabled=not args.no_comment_cache,
+                                          processes=args.workers or os.cpu_count() or 1)
+
+    # 所有语言和模型共用同一个进程池 每个worker只加载一次tokenizer
+    reference_cache_dir = None if args.no_reference_cache else args.reference_cache
+    with ScoringEngine(workers=args.workers, chunk_size=args.chunk_size, reference_cache_dir=reference_cache_dir, metrics=args.metrics) as engine:
+        for language, model, jsonl_file in inputs:
+            print(f"\n正在处理文件: {jsonl_file}")
+            
+            # 使用get_output_path函数生成输出文件路径
+            output_file = get_output_path(jsonl_file, language, model)
+            
+            print(f"输出路径: {output_file}")
+            
+            # 计算相似度
+            calculate_similarity(jsonl_file, output_file, model=model)
+            
+            print(f"文件 {jsonl_file} 处理完成！")
     
-    print(f"找到 {len(jsonl_files)} 个 .jsonl 文件: {jsonl_files}")
-    
-    # 处理每个文件
-    for jsonl_file in jsonl_files:
-        print(f"\n正在处理文件: {jsonl_file}")
-        
-        # 使用get_output_path函数生成输出文件路径
-        output_file = get_output_path(jsonl_file, language, model)
-        
-        print(f"输出路径: {output_file}")
-        
-        # 计算相似度
-        calculate_similarity(jsonl_file, output_file)
-        
-        print(f"文件 {jsonl_file} 处理完成！")
-    
-    print("\n所有文件处理完成！")
\ No newline at end of file
+    print("\n所有文件处理完成！")
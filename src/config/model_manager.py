@@ -1,8 +1,56 @@
 import json
 import os
 import sys
+import threading
 from . import config
 
+# model_config.json的进程级缓存 {config_file: (mtime_ns, configs)} 文件被修改后自动重新加载
+_CONFIG_CACHE = {}
+_config_cache_lock = threading.Lock()
+
+
+def load_model_configs(config_file):
+    """
+    读取并缓存model_config.json 只有文件的mtime变化时才重新解析
+    """
+    mtime = os.stat(config_file).st_mtime_ns
+    with _config_cache_lock:
+        cached = _CONFIG_CACHE.get(config_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(config_file, 'r', encoding="utf-8") as f:
+        configs = json.load(f)
+    with _config_cache_lock:
+        _CONFIG_CACHE[config_file] = (mtime, configs)
+    return configs
+
+
+def parse_endpoints(model_config):
+    """
+    解析模型的endpoint配置 返回 [{"url": ..., "weight": ...}]
+    支持以下写法:
+        "url": "http://localhost:30000/v1"
+        "url": ["http://localhost:30000/v1", "http://localhost:30001/v1"]
+        "urls": [{"url": "http://localhost:30000/v1", "weight": 2}, {"url": "http://localhost:30001/v1"}]
+    """
+    raw = model_config.get("urls", model_config.get("url"))
+    if raw is None:
+        raise KeyError("url")
+    if isinstance(raw, (str, dict)):
+        raw = [raw]
+    endpoints = []
+    for entry in raw:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        weight = float(entry.get("weight", 1))
+        if weight <= 0:
+            raise ValueError(f"endpoint {entry['url']} 的weight必须为正数 当前为 {weight}")
+        endpoints.append({"url": entry["url"], "weight": weight})
+    if not endpoints:
+        raise ValueError("url列表为空")
+    return endpoints
+
+
 class ModelManager:
     """
     模型配置
@@ -23,23 +71,30 @@ class ModelManager:
     def load_from_file(self):
         """
         从config.json中获取对应的信息 主要是url、if_inference
-        返回url与if_inference
+        返回url与if_inference url有多个副本时只返回第一个 多副本请使用load_endpoints
+        """
+        endpoints, if_inference = self.load_endpoints()
+        if not endpoints:
+            return "", False
+        return endpoints[0]["url"], if_inference
+
+    def load_endpoints(self):
+        """
+        获取模型的所有副本 返回 [{"url": ..., "weight": ...}] 与 if_inference
         """
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r', encoding="utf-8") as f:
-                    configs = json.load(f)
-                    # print(configs)
-                    if self.model_name in configs:
-                        url = configs[self.model_name]["url"]
-                        if_inference = configs[self.model_name]["if_inference"]
-                        return url, if_inference
-                    else:
-                        print(f"{self.model_name} 不在 {config.MODELS_LIST} 中")
-                        return "", False
+                configs = load_model_configs(self.config_file)
+                if self.model_name in configs:
+                    endpoints = parse_endpoints(configs[self.model_name])
+                    if_inference = configs[self.model_name]["if_inference"]
+                    return endpoints, if_inference
+                else:
+                    print(f"{self.model_name} 不在 {config.MODELS_LIST} 中")
+                    return [], False
             except Exception as e:
-                print(f"Error loading from file Line 24 {self.config_file}: {e}")
-                return "", False
+                print(f"Error loading endpoints from file {self.config_file}: {e}")
+                return [], False
         else:
             print(f"{self.config_file}文件不存在")
-            return "", False
\ No newline at end of file
+            return [], False
@@ -0,0 +1,90 @@
+# 节点类型查找表
+import threading
+
+from .parser_factory import get_language, normalize_language
+
+# language_symbols中参与分类的类别 顺序即优先级 同一种节点出现在多个类别中时归入靠前的类别
+CATEGORY_KEYS = (
+    "IMPORT_TYPE",
+    "COMMENT_TYPE",
+    "IF_STATEMENT_TYPE",
+    "FOR_STATEMENT_TYPE",
+    "WHILE_STATEMENT_TYPE",
+    "RETURN_STATEMENT_TYPE",
+    "EXPRESSION_STATEMENT_TYPE",
+    "ASSIGNMENT_STATEMENT_TYPE",
+    "CLASS_TYPE",
+    "FUNCTION_TYPE",
+)
+
+# 查找表只读 所有线程共用
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class NodeTypeTable:
+    """
+    一种语言的节点类型查找表 由language_symbols和tree-sitter语法生成后不再修改
+    node.kind_id是整数 用它查表不需要先取出node.type字符串 再在列表里逐个比较
+    同名的具名节点和匿名节点(例如关键字)id不同 两者都会收录 与按字符串比较的结果一致
+    """
+    __slots__ = ("language", "kind_names", "ids_by_name", "kind_ids", "category_by_id", "kinds_by_category")
+
+    def __init__(self, language, tree_language, node_types):
+        self.language = language
+        # id -> 节点类型名 语法中的所有节点类型
+        self.kind_names = {}
+        for kind_id in range(tree_language.node_kind_count):
+            name = tree_language.node_kind_for_id(kind_id)
+            if name is not None:
+                self.kind_names[kind_id] = name
+        ids_by_name = {}
+        for kind_id, name in self.kind_names.items():
+            ids_by_name.setdefault(name, set()).add(kind_id)
+        self.ids_by_name = {name: frozenset(ids) for name, ids in ids_by_name.items()}
+
+        # 类别 -> 该类别列出的所有节点类型的id 不考虑优先级 等价于 node.type in language_symbols[language][类别]
+        self.kind_ids = {}
+        # id -> 按优先级归入的类别 / 类别 -> 按优先级归入该类别的节点类型名
+        self.category_by_id = {}
+        self.kinds_by_category = {}
+        assigned = set()
+        for key in CATEGORY_KEYS:
+            kinds = node_types.get(key, [])
+            if isinstance(kinds, str):
+                kinds = [kinds]
+            ids = set()
+            own_kinds = set()
+            for kind in kinds:
+                ids.update(ids_by_name.get(kind, ()))
+                if kind not in assigned:
+                    assigned.add(kind)
+                    own_kinds.add(kind)
+                    for kind_id in ids_by_name.get(kind, ()):
+                        self.category_by_id[kind_id] = key
+            self.kind_ids[key] = frozenset(ids)
+            self.kinds_by_category[key] = frozenset(own_kinds)
+
+    def ids_for(self, *kinds):
+        """指定节点类型名(具名和匿名)对应的所有id"""
+        if len(kinds) == 1:
+            return self.ids_by_name.get(kinds[0], frozenset())
+        return frozenset().union(*(self.ids_by_name.get(kind, ()) for kind in kinds))
+
+    def category(self, node):
+        """节点按优先级归入的类别 不属于任何类别时返回None"""
+        return self.category_by_id.get(node.kind_id)
+
+
+def get_node_table(language):
+    """获取指定语言的节点类型查找表 每种语言只生成一次"""
+    language = normalize_language(language)
+    table = _tables.get(language)
+    if table is not None:
+        return table
+    # utils.utils导入了parser_factory 这里延迟导入避免循环依赖
+    from utils import utils
+    with _tables_lock:
+        if language not in _tables:
+            _tables[language] = NodeTypeTable(language, get_language(language), utils.language_symbols.get(language, {}))
+        return _tables[language]
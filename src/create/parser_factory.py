@@ -1,6 +1,21 @@
 # 树解析器工厂
+import threading
+
 import tree_sitter_language_pack as tree_sitter_languages
-from utils import utils
+from tree_sitter import Parser
+
+# 语言名称的别名 统一成tree-sitter和language_symbols使用的名称
+LANGUAGE_ALIASES = {
+    "c++": "cpp",
+    "c#": "c_sharp",
+    "csharp": "c_sharp",
+    "c-sharp": "c_sharp",
+}
+
+# Language对象只读 所有线程共用 Parser不是线程安全的 每个线程各自缓存一份
+_languages = {}
+_languages_lock = threading.Lock()
+_local = threading.local()
 
 
 def traverse_tree(node):
@@ -39,33 +54,51 @@ def has_return_statement(node, node_types):
     return False
 
 
-def get_parser(language):
-    """获取指定语言的解析器"""
+def normalize_language(language):
+    """语言名称标准化 c++ -> cpp c#/csharp -> c_sharp"""
     language = language.lower()
-    if language == "c++":
-        language = "cpp"
-    elif language == "c#":
-        language = "c_sharp"
-    
-    if language == "c_sharp":
-        try:
-            import tree_sitter_c_sharp as tscsharp
-            from tree_sitter import Language, Parser
-            CSHARP_LANGUAGE = Language(tscsharp.language())
-            parser = Parser(CSHARP_LANGUAGE)
-            return parser
-        except ImportError:
-            raise ImportError("C# parser not available")
-    else:
-        return tree_sitter_languages.get_parser(language)
+    if "sharp" in language:
+        return "c_sharp"
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+def get_language(language):
+    """获取指定语言的Language 每种语言只加载一次"""
+    language = normalize_language(language)
+    tree_language = _languages.get(language)
+    if tree_language is not None:
+        return tree_language
+    with _languages_lock:
+        if language not in _languages:
+            if language == "c_sharp":
+                try:
+                    import tree_sitter_c_sharp as tscsharp
+                    from tree_sitter import Language
+                except ImportError:
+                    raise ImportError("C# parser not available")
+                _languages[language] = Language(tscsharp.language())
+            else:
+                _languages[language] = tree_sitter_languages.get_language(language)
+        return _languages[language]
+
+
+def get_parser(language):
+    """获取指定语言的解析器 同一线程内复用 不要把返回的解析器交给其他线程使用"""
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    parser = parsers.get(language)
+    if parser is None:
+        name = normalize_language(language)
+        parser = parsers.get(name)
+        if parser is None:
+            parser = Parser(get_language(name))
+        # 原始名称和标准化后的名称都指向同一个解析器 下次查找不需要再标准化
+        parsers[language] = parsers[name] = parser
+    return parser
 
 
 def get_node_types(language):
     """获取语言的节点类型映射"""
-    language = language.lower()
-    if language == "c++":
-        language = "cpp"
-    elif language == "c#":
-        language = "c_sharp"
-    
-    return utils.language_symbols.get(language, {})
\ No newline at end of file
+    from utils import utils
+    return utils.language_symbols.get(normalize_language(language), {})
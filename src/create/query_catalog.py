@@ -0,0 +1,96 @@
+# 采样候选节点的查询目录
+import threading
+
+from tree_sitter import Query
+
+from .node_tables import CATEGORY_KEYS, get_node_table
+from .parser_factory import get_language, normalize_language
+
+try:
+    # tree-sitter>=0.25 查询由QueryCursor执行 Query本身不再带游标
+    from tree_sitter import QueryCursor
+except ImportError:
+    QueryCursor = None
+
+# language_symbols中的类别 -> 捕获名 捕获名就是块和单行任务的sub_task_type
+# 类别之间的优先级由node_tables.CATEGORY_KEYS决定 与CodeSampler原来的分类顺序一致 注释只用来排除 不需要捕获
+CAPTURES = {
+    "IMPORT_TYPE": "import",
+    "IF_STATEMENT_TYPE": "if_statement",
+    "FOR_STATEMENT_TYPE": "for_statement",
+    "WHILE_STATEMENT_TYPE": "while_statement",
+    "RETURN_STATEMENT_TYPE": "return_statement",
+    "EXPRESSION_STATEMENT_TYPE": "expression",
+    "ASSIGNMENT_STATEMENT_TYPE": "assignment",
+    "CLASS_TYPE": "class",
+    "FUNCTION_TYPE": "function",
+}
+# 块和单行候选中各子类型的先后顺序
+BLOCK_CAPTURES = ("for_statement", "if_statement", "while_statement", "import")
+LINE_CAPTURES = ("assignment", "expression", "return_statement")
+
+# 查询带有执行状态 和解析器一样每个线程各自缓存一份
+_local = threading.local()
+
+
+def _quote(kind):
+    return '"' + kind.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_query_source(language):
+    """
+    根据language_symbols(经过node_tables按优先级归类)生成查询语句 每个类别一个模式 例如 [(if_statement) (elif_clause)] @if_statement
+    语法中不存在的节点类型会被跳过(否则查询无法编译) 关键字之类的匿名节点用字符串模式匹配
+    """
+    language = normalize_language(language)
+    tree_language = get_language(language)
+    table = get_node_table(language)
+    patterns = []
+    for key in CATEGORY_KEYS:
+        capture = CAPTURES.get(key)
+        alternatives = []
+        for kind in sorted(table.kinds_by_category[key]):
+            if tree_language.id_for_node_kind(kind, True) is not None:
+                alternatives.append(f"({kind})")
+            if tree_language.id_for_node_kind(kind, False) is not None:
+                alternatives.append(_quote(kind))
+        if capture and alternatives:
+            patterns.append(f"[{' '.join(alternatives)}] @{capture}")
+    return "\n".join(patterns)
+
+
+def get_query(language):
+    """获取指定语言编译好的查询 同一线程内复用 语言没有任何可以采样的节点类型时返回None"""
+    queries = getattr(_local, "queries", None)
+    if queries is None:
+        queries = _local.queries = {}
+    if language not in queries:
+        name = normalize_language(language)
+        if name not in queries:
+            source = build_query_source(name)
+            query = Query(get_language(name), source) if source else None
+            if query is not None and QueryCursor is not None:
+                query = QueryCursor(query)
+            queries[name] = query
+        queries[language] = queries[name]
+    return queries[language]
+
+
+def _preorder_key(node):
+    # 起点相同时外层节点先出现 范围也相同时子孙更多的是祖先
+    return node.start_byte, -node.end_byte, -node.descendant_count
+
+
+def find_candidates(root_node, language):
+    """
+    执行一次查询 返回 (类节点, 函数节点, [(块节点, 子类型)], [(单行节点, 子类型)])
+    每个列表的内容和顺序与先序遍历整棵树后逐个分类的结果相同
+    """
+    query = get_query(language)
+    captures = query.captures(root_node) if query is not None else {}
+    nodes = {name: sorted(found, key=_preorder_key) for name, found in captures.items()}
+    class_nodes = nodes.get("class", [])
+    function_nodes = nodes.get("function", [])
+    block_nodes_with_type = [(node, name) for name in BLOCK_CAPTURES for node in nodes.get(name, [])]
+    line_nodes_with_type = [(node, name) for name in LINE_CAPTURES for node in nodes.get(name, [])]
+    return class_nodes, function_nodes, block_nodes_with_type, line_nodes_with_type
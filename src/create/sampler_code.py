@@ -1,8 +1,8 @@
 # 代码采样逻辑
 import numpy as np
-import tree_sitter_language_pack as tree_sitter_languages
 from utils import utils
-from .parser_factory import get_parser, traverse_tree
+from .parser_factory import get_parser, normalize_language, traverse_tree
+from .query_catalog import find_candidates
 from .concurrency import increment_zero_sampling_count
 from .skeletons import generate_class_skeleton, generate_function_skeleton
 
@@ -25,86 +25,21 @@ class CodeSampler:
         Returns:
             tuple: (node_type, prefix, middle, suffix, skeleton, sub_task_type) 或 None
         """
-        language = language.lower()
+        language = normalize_language(language)
         code_bytes = bytes(code, "utf8")
         
-        if language == "c++":
-            language = "cpp"
-        elif language == "c#" or "sharp" in language:
-            language = "c_sharp"
-        elif language == "html":
+        if language == "html":
             # HTML 由专门的 HtmlSampler 处理
             from .sampler_html import HtmlSampler
             html_sampler = HtmlSampler()
             return html_sampler.sample(code, ratio_list)
         
-        tree = None
-        if language == "c_sharp":
-            import tree_sitter_c_sharp as tscsharp
-            from tree_sitter import Language, Parser
-            CSHARP_LANGUAGE = Language(tscsharp.language())
-            parser = Parser(CSHARP_LANGUAGE)
-            tree = parser.parse(code_bytes)
-        else:
-            parser = tree_sitter_languages.get_parser(language)
-            tree = parser.parse(code_bytes)
+        tree = get_parser(language).parse(code_bytes)
         
-        root_node = tree.root_node
-        all_nodes = list(traverse_tree(root_node))
-        
-        # 节点分类
-        import_nodes = []
-        comment_nodes = []
-        return_statement_nodes = []
-        if_statement_nodes = []
-        for_statement_nodes = []
-        while_statement_nodes = []
-        class_nodes = []
-        function_nodes = []
-        assignment_nodes = []
-        expression_nodes = []
-        
-        node_types = utils.language_symbols[language]
-        for child in all_nodes:
-            if child.type in node_types["IMPORT_TYPE"]:
-                import_nodes.append(child)
-            elif child.type in node_types["COMMENT_TYPE"]:
-                comment_nodes.append(child)
-            elif child.type in node_types["IF_STATEMENT_TYPE"]:
-                if_statement_nodes.append(child)
-            elif child.type in node_types["FOR_STATEMENT_TYPE"]:
-                for_statement_nodes.append(child)
-            elif child.type in node_types["WHILE_STATEMENT_TYPE"]:
-                while_statement_nodes.append(child)
-            elif child.type in node_types["RETURN_STATEMENT_TYPE"]:
-                return_statement_nodes.append(child)
-            elif child.type in node_types["EXPRESSION_STATEMENT_TYPE"]:
-                expression_nodes.append(child)
-            elif child.type in node_types["ASSIGNMENT_STATEMENT_TYPE"]:
-                assignment_nodes.append(child)
-            elif child.type in node_types["CLASS_TYPE"]:
-                class_nodes.append(child)
-            elif child.type in node_types["FUNCTION_TYPE"]:
-                function_nodes.append(child)
-        
-        # 创建带有子类型标记的节点列表
-        block_nodes_with_type = []
-        for node in for_statement_nodes:
-            block_nodes_with_type.append((node, "for_statement"))
-        for node in if_statement_nodes:
-            block_nodes_with_type.append((node, "if_statement"))
-        for node in while_statement_nodes:
-            block_nodes_with_type.append((node, "while_statement"))
-        for node in import_nodes:
-            block_nodes_with_type.append((node, "import"))
-        
-        line_nodes_with_type = []
-        for node in assignment_nodes:
-            line_nodes_with_type.append((node, "assignment"))
-        for node in expression_nodes:
-            line_nodes_with_type.append((node, "expression"))
-        for node in return_statement_nodes:
-            line_nodes_with_type.append((node, "return_statement"))
+        # 一次查询取出类、函数、块、单行四种候选节点 查询按语言编译后缓存
+        # 查询覆盖整个文件 原来的traverse_tree在单子节点链很深的语法树上会提前结束(语料中的verilog文件都是这样)
+        # 所以verilog等语言的候选比原来多 固定随机种子时采样结果也与原来不同 见benchmark.check_query_catalog
+        class_nodes, function_nodes, block_nodes_with_type, line_nodes_with_type = find_candidates(tree.root_node, language)
         
         multi_level_nodes = [
             class_nodes,  # 类
@@ -1,6 +1,7 @@
 # 特殊的html采样逻辑
 import numpy as np
 from .parser_factory import get_parser, traverse_tree
+from .node_tables import get_node_table
 from .concurrency import get_zero_sampling_count, increment_zero_sampling_count
 
 
@@ -33,14 +34,19 @@ class HtmlSampler:
         block_nodes_with_type = []
         line_nodes_with_type = []
         
+        # 比较整数kind_id 不需要为每个节点取出类型字符串
+        table = get_node_table("html")
+        element_ids = table.ids_for("element")
+        start_tag_ids = table.ids_for("start_tag")
+        tag_name_ids = table.ids_for("tag_name")
         for node in all_nodes:
-            if node.type == "element":
+            if node.kind_id in element_ids:
                 # 获取标签名
                 tag_name = None
                 for child in node.children:
-                    if child.type == "start_tag":
+                    if child.kind_id in start_tag_ids:
                         for grandchild in child.children:
-                            if grandchild.type == "tag_name":
+                            if grandchild.kind_id in tag_name_ids:
                                 tag_name = grandchild.text.decode("utf8")
                                 break
                         break
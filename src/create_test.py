@@ -4,6 +4,7 @@ import os
 import editdistance
 import tree_sitter_language_pack as tree_sitter_languages
 from utils import utils
+from utils import comment_cache
 import numpy as np
 import tqdm
 import collections
@@ -31,12 +32,16 @@ from create.concurrency import (
     get_failed_attempts, increment_failed_attempts, check_max_failed_attempts
 )
 from calculate.similarity import SimilarityCalculator
+from inferencepkg.response_cache import configure_response_cache, get_response_cache, DEFAULT_CACHE_PATH
+from inferencepkg import adaptive_limiter
+from inferencepkg import prompt_builder
 
 logger_error = None
 logger_info = None
 thread_local_data = threading.local()
 samples_per_repo = 5
 calculator = None
+EMPTY_RESPONSE_RETRIES = 3  # LLM返回空结果时的最大重试次数
 
 # 全局变量申明
 
@@ -200,24 +205,27 @@ def create_samples(repo_root_path, repo_files_content, repo_name, repo_output_pa
             print(f"[Worker-{worker_id}] 🤖 开始LLM推理...")
             
             # 执行推理（这是主要的API调用瓶颈）
-            inference_code = inference.inference_middle_code(
-                prefix_code=sample_data["inference_info"]["prefix_code"], 
-                suffix_code=sample_data["inference_info"]["suffix_code"], 
-                context_code=sample_data["context_code"], 
-                skeleton=sample_data["task_instance_info"].get("function_skeleton") or sample_data["task_instance_info"].get("class_skeleton", ""),  
-                code_description=sample_data["inference_info"]["code_description"], 
-                task_type=sample_data["inference_info"]["fill_type"], 
-                language=sample_data["inference_info"]["language_type"], 
-                model=inference_model
-            )
+            # 空响应说明后端过载 限流器已经收缩了并发 这里退避后有限次重试
+            inference_code = None
+            for retry_count in range(EMPTY_RESPONSE_RETRIES + 1):
+                if retry_count > 0:
+                    time.sleep(min(30, 2 ** retry_count) * np.random.uniform(0.5, 1.0))
+                inference_code = inference.inference_middle_code(
+                    prefix_code=sample_data["inference_info"]["prefix_code"], 
+                    suffix_code=sample_data["inference_info"]["suffix_code"], 
+                    context_code=sample_data["context_code"], 
+                    skeleton=sample_data["task_instance_info"].get("function_skeleton") or sample_data["task_instance_info"].get("class_skeleton", ""),  
+                    code_description=sample_data["inference_info"]["code_description"], 
+                    task_type=sample_data["inference_info"]["fill_type"], 
+                    language=sample_data["inference_info"]["language_type"], 
+                    model=inference_model
+                )
+                if inference_code:
+                    break
+                print(f"[Worker-{worker_id}] 推理代码为空 (重试 {retry_count + 1}/{EMPTY_RESPONSE_RETRIES + 1})")
 
             if inference_code is None or len(inference_code) == 0:
-                retry_count = getattr(thread_local_data, 'retry_count', 0)
-                if retry_count < 3:
-                    thread_local_data.retry_count = retry_count + 1
-                    return should_include_sample_async(sample_data, similarity_threshold, inference_model, worker_id)
-                else:
-                    logger_error.error(f"并发过大 LLM后端负载严重 [Worker-{worker_id}] 推理代码为空 ❌",exc_info=True)
+                logger_error.error(f"并发过大 LLM后端负载严重 [Worker-{worker_id}] 推理代码为空 ❌",exc_info=True)
                 return False, None
             
             print(f"[Worker-{worker_id}] 🤖 LLM推理完成")
@@ -228,19 +236,24 @@ def create_samples(repo_root_path, repo_files_content, repo_name, repo_output_pa
             # 计算相似度
             print(f"[Worker-{worker_id}] 📊 开始计算相似度...")
 
-            editdistance_item = calculator.calculate_edit_distance(
+            # 只需要知道相似度是否落在窗口内 窗口外的样本不计算精确的编辑距离
+            in_window, editdistance_item = calculator.edit_distance_in_window(
                 sample_data["inference_info"]["middle_code"], 
                 predict_code, 
-                language=sample_data["inference_info"]["language_type"]
+                language=sample_data["inference_info"]["language_type"],
+                lower=10,
+                upper=similarity_threshold
             )
             # cosine_item = calculator.calculate_cosine_similarity(
             #     sample_data["inference_info"]["middle_code"], 
             #     predict_code, 
             #     language=sample_data["inference_info"]["language_type"]
             # )
-            edit_similarity = editdistance_item["edit_distance"] 
             print(f"[Worker-{worker_id}] 📊 相似度计算完成")
-            print(f"[Worker-{worker_id}] 📈 编辑距离为 {edit_similarity}%")
+            if in_window:
+                print(f"[Worker-{worker_id}] 📈 编辑距离为 {editdistance_item['edit_distance']}%")
+            else:
+                print(f"[Worker-{worker_id}] 📈 编辑距离不在 (10, {similarity_threshold}) 范围内")
             sample_data.update({
                 "inference_content": {
                     "inference_model": inference_model,
@@ -248,7 +261,7 @@ def create_samples(repo_root_path, repo_files_content, repo_name, repo_output_pa
                     "inference_time": datetime.now().strftime("%Y-%m-%d %H-%M-%S")
                 }
             })
-            if 10 < edit_similarity < similarity_threshold:
+            if in_window:
                 sample_data.update({
                     "editdistance_info": editdistance_item
                 })
@@ -330,6 +343,10 @@ def create_samples(repo_root_path, repo_files_content, repo_name, repo_output_pa
     print(f"🧵 使用线程数: {max_workers}")
     print(f"⏱️  总处理时间: {total_time:.2f}秒")
     print(f"⚡ 平均每样本耗时: {total_time/len(test_data):.2f}秒" if test_data else "⚡ 平均每样本耗时: N/A")
+    print(f"🗄️  {get_response_cache().summary()}")
+    print(f"🗄️  {comment_cache.get_comment_cache().summary()}")
+    for limiter in adaptive_limiter.all_limiters():
+        print(f"🚦 {limiter.summary()}")
     logger_info.info(f"✅ 成功生成样本数：{len(test_data)} ⏱️  总处理时间: {total_time:.2f}秒")
     
     # 按worker统计
@@ -681,7 +698,7 @@ def prepare_test_repo_data(repo_root_path, task_level, language="python",  simil
 def parse_args():
     parser = argparse.ArgumentParser(description="Argument Parser Example")
     parser.add_argument("--repo_root_path", "-repo_root_path", type=str, default="./repos/", help="repo path")
-    parser.add_argument("--tokenizer_path", "-tokenizer_path", type=str, default="./models/models/Qwen/Qwen2.5-Coder-1.5B", help="LLM path")
+    parser.add_argument("--tokenizer_path", "-tokenizer_path", type=str, default=prompt_builder.DEFAULT_TOKENIZER_PATH, help="LLM path")
     parser.add_argument("--action", "-action", type=str, default="test", help="action")
     parser.add_argument("--task_level", "-task_level", type=str, default="class", help="Path to output file")
     parser.add_argument("--process_language", "-language", type=str, default="python", help="Path to output file")
@@ -690,6 +707,14 @@ def parse_args():
     parser.add_argument("--inference_model", "-model", type=str, default="deepseek-v3", help="推理模型")
     import os
     parser.add_argument("--max_workers", "-workers", type=int, default=10, help="最大线程数")
+    parser.add_argument("--no-adaptive", "-no-adaptive", dest="no_adaptive", action="store_true", help="关闭自适应并发控制 固定使用max_workers个在途请求")
+    parser.add_argument("--cache_path", "-cache_path", type=str, default=DEFAULT_CACHE_PATH, help="LLM响应缓存文件")
+    parser.add_argument("--cache_max_mb", "-cache_max_mb", type=int, default=2048, help="LLM响应缓存大小上限(MB) 超过后按LRU淘汰")
+    parser.add_argument("--no-cache", "-no-cache", dest="no_cache", action="store_true", help="不使用LLM响应缓存")
+    parser.add_argument("--comment_cache", "-comment_cache", type=str, default=None,
+                        help=f"去注释结果的sqlite缓存文件 例如 {comment_cache.DEFAULT_CACHE_PATH} 可以与calculate_ed.py共用 默认只在内存中缓存")
+    parser.add_argument("--comment_cache_max_mb", "-comment_cache_max_mb", type=int, default=comment_cache.DEFAULT_MAX_BYTES // (1024 * 1024), help="内存中去注释缓存的大小上限(MB) 所有线程共用一份")
+    parser.add_argument("--no-comment-cache", "-no-comment-cache", dest="no_comment_cache", action="store_true", help="不缓存去注释结果")
     args = parser.parse_args()
     return args
 
@@ -700,7 +725,12 @@ if __name__ == "__main__":
         import sys
         sys.exit(1)
     calculator = SimilarityCalculator()
-    
+    configure_response_cache(path=args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024, enabled=not args.no_cache)
+    comment_cache.configure_comment_cache(max_bytes=args.comment_cache_max_mb * 1024 * 1024, path=args.comment_cache, enabled=not args.no_comment_cache)
+    # 线程数是在途请求的上限 自适应限流器在这个范围内根据后端负载调整
+    adaptive_limiter.configure_limiters(initial_limit=min(adaptive_limiter.LIMITER_SETTINGS["initial_limit"], args.max_workers),
+                                        max_limit=args.max_workers, adaptive=not args.no_adaptive)
+    prompt_builder.configure_prompt_builder(tokenizer_path=args.tokenizer_path)
     
     np.random.seed(1)
     logger_error = setup_logger(args.inference_model, log_level=logging.ERROR)
@@ -3,7 +3,8 @@
 """
 
 import tqdm
-from openai import OpenAI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from config import config
 import argparse
 import re
@@ -11,24 +12,40 @@ from utils import utils
 import time
 import os
 from pathlib import Path
-import concurrent.futures
-import threading
 from config import model_manager
 import sys
 from utils.logger import setup_logger
 import logging
-import calculate_ed
 from datetime import datetime
 from inferencepkg.AnthropicSeries import AnthropicRequest
+from inferencepkg.async_engine import AsyncInferenceEngine
+from inferencepkg import client_pool
+from inferencepkg.checkpoint import CheckpointJournal, get_sample_id, is_completed
+from inferencepkg.response_cache import configure_response_cache, get_response_cache, DEFAULT_CACHE_PATH
+from inferencepkg import adaptive_limiter
+from inferencepkg import endpoint_balancer
+from inferencepkg import prompt_builder
+from inferencepkg import batch_io
+from utils import jsonl_stream
 
 
 logger_info = setup_logger("DeepSeek-R1", logging.INFO)
 logger_error = setup_logger("DeepSeek-R1", logging.ERROR)
 
-def process_single_item(item, language, model, lock, item_index, total_items):
+TEMPERATURE = 0.7
+STREAM_MODE = "stream"  # auto | stream | nonstream 由--stream_mode设置
+NON_STREAM_TASK_TYPES = ("LINE_TYPE", "BLOCK_TYPE")
+# 推理模型思考结束之前不返回任何内容 非流式请求要等整个思考过程 auto模式下这些模型始终使用流式请求
+REASONING_MODEL_MARKERS = ("-r1", "think", "reason", "qwq")
+STREAM_TIMEOUT = 60  # 流式请求两个chunk之间的最长等待
+NON_STREAM_TIMEOUT = 600  # 非流式请求等待完整回答的时间 由--nonstream_timeout设置
+
+async def process_single_item(item, model, item_index, total_items):
     """
-    处理单个数据项的函数
+    处理单个数据项的协程
     """
+    language = item.get("inference_info", {}).get('language_type', 'python')
+    task_type = item.get("inference_info", {}).get('fill_type', 'CLASS_TYPE')
     try:
         # 从JSONL数据中提取字段
         prefix_code = item["inference_info"].get('prefix_code', '')
@@ -37,25 +54,20 @@ def process_single_item(item, language, model, lock, item_index, total_items):
         context_code = item.get('context_code', '')
         skeleton = item["inference_info"].get('class_skeleton', item["inference_info"].get('function_skeleton', "Current task doesn't need skeleton"))
         code_description = item["inference_info"].get('code_description', '')
-        language = item["inference_info"].get('language_type', 'python')
-        task_type = item["inference_info"].get('fill_type', 'CLASS_TYPE')
         created_task_model = item["task_instance_info"].get('created_task_model', "")
-        time.sleep(1)
         # 如果fuzz_similarity_raw不为空，说明已经计算过了，直接返回原始数据
         if created_task_model.lower() == model.lower():
-            with lock:
-                print(f"第 {item_index+1} 条数据已经计算过，因为推理模型和创建task的模型一致{model, created_task_model}")
+            print(f"第 {item_index+1} 条数据已经计算过，因为推理模型和创建task的模型一致{model, created_task_model}")
             return item, item_index
         else:
-            with lock:
-                print(f"虽然第 {item_index+1} 条数据计算过，但是当前推理模型{model}与创建任务模型{created_task_model}不同，开始API调用")
+            print(f"虽然第 {item_index+1} 条数据计算过，但是当前推理模型{model}与创建任务模型{created_task_model}不同，开始API调用")
 
-        with lock:
-            print(f"\n线程开始处理第 {item_index+1}/{total_items} 条数据...")
-            print(f"处理的语言是{language}")
+        print(f"\n协程开始处理第 {item_index+1}/{total_items} 条数据...")
+        print(f"处理的语言是{language}")
         
         # 调用推理函数
-        result = inference_middle_code(
+        inference_stats = {}
+        result = await async_inference_middle_code(
             prefix_code=prefix_code,
             suffix_code=suffix_code,
             context_code=context_code,
@@ -63,7 +75,8 @@ def process_single_item(item, language, model, lock, item_index, total_items):
             code_description=code_description,
             task_type=task_type,
             language=language,
-            model=model
+            model=model,
+            stats=inference_stats
         )
         
         # 保存结果
@@ -72,21 +85,23 @@ def process_single_item(item, language, model, lock, item_index, total_items):
             "inference_content": {
                 "inference_model": model,
                 "inference_result": result,
-                "inference_time": datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+                "inference_time": datetime.now().strftime("%Y-%m-%d %H-%M-%S"),
+                "prompt_tokens": inference_stats.get("prompt_tokens"),
+                "completion_tokens": inference_stats.get("completion_tokens"),
+                "ttft": inference_stats.get("ttft"),
+                "latency": inference_stats.get("latency")
             }
         })
         
-        with lock:
-            print(f"第 {item_index+1} 条数据处理完成")
+        print(f"第 {item_index+1} 条数据处理完成")
         
         return result_item, item_index
         
     except Exception as e:
-        with lock:
-            print(f"处理第 {item_index+1} 条数据时发生错误: {e}")
-            logger_error.error(
-                        f"{os.path.basename(__file__)}中 {model} 在 {language} 任务 {task_type} 执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)}\n"
-                    ,exc_info=True)
+        print(f"处理第 {item_index+1} 条数据时发生错误: {e}")
+        logger_error.error(
+                    f"{os.path.basename(__file__)}中 {model} 在 {language} 任务 {task_type} 执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)}\n"
+                ,exc_info=True)
         
         # 即使出错也保存原始数据
         error_item = item.copy()
@@ -94,68 +109,217 @@ def process_single_item(item, language, model, lock, item_index, total_items):
         error_item['error'] = str(e)
         return error_item, item_index
 
-def process_test_data(test_data, language, output_file, model, max_workers=None):
+def prepare_file_task(input_file, language, output_file):
     """
-    多线程处理测试数据，对每条记录进行推理
+    读取单个文件的checkpoint 返回该文件的任务状态以及需要推理的样本数
+    输入文件只做一次流式扫描 内存中只保留已完成样本的id 待推理样本由iter_pending重新流式读取
     """
+    journal = CheckpointJournal(output_file)
+    completed = journal.load_completed()
+    total, pending = 0, 0
+    for item in jsonl_stream.read_jsonl(input_file):
+        total += 1
+        if get_sample_id(item) not in completed:
+            pending += 1
+    file_task = {
+        "language": language,
+        "input_file": input_file,
+        "output_file": output_file,
+        "journal": journal,
+        "completed": completed,
+        "total": total,
+        "remaining": pending,
+    }
+    if total - pending:
+        print(f"{output_file} 从checkpoint恢复 {total - pending} 条已完成的数据，剩余 {pending} 条需要推理")
+    return file_task, pending
 
-    if max_workers is None:
-        max_workers = os.cpu_count() // 2
-    
-    print(f"使用 {max_workers} 个线程进行并发处理")
-    
-    results = [None] * len(test_data)  # 预分配结果列表，保持顺序
-    lock = threading.Lock()
-    
-    # 使用ThreadPoolExecutor进行并发处理
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        future_to_index = {
-            executor.submit(process_single_item, item, language, model, lock, i, len(test_data)): i 
-            for i, item in enumerate(test_data)
-        }
-        
-        completed_count = 0
-        # 处理完成的任务
-        for future in concurrent.futures.as_completed(future_to_index):
-            try:
-                result_item, original_index = future.result()
-                results[original_index] = result_item  # 按原始顺序存储结果
-                completed_count += 1
-                
-                with lock:
-                    print(f"\n总进度: {completed_count}/{len(test_data)} 条数据已完成")
-                
-                # 定期保存结果（每处理10条或全部完成时）
-                if completed_count % 10 == 0 or completed_count == len(test_data):
-                    # 过滤掉None值（未完成的任务）
-                    current_results = [r for r in results if r is not None]
-                    utils.write_jsonl_file(current_results, output_file)
-                    with lock:
-                        print(f"已保存 {len(current_results)} 条结果到文件")
-                    
-            except Exception as e:
-                original_index = future_to_index[future]
-                with lock:
-                    print(f"任务 {original_index+1} 执行失败: {e}")
-                    logger_error.error(
-                        f"{model} 在 {language} 任务 {original_index+1} 执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)} 输出文件夹为{output_file}\n"
-                    ,exc_info=True)
+def iter_pending(file_task):
+    """流式返回文件中需要推理的样本 (index, sample_id, item)"""
+    for index, item in enumerate(jsonl_stream.read_jsonl(file_task["input_file"])):
+        sample_id = get_sample_id(item)
+        if sample_id not in file_task["completed"]:
+            yield index, sample_id, item
 
-                
-                # 创建错误项
-                error_item = test_data[original_index].copy()
-                error_item['generated_code'] = ''
-                error_item['error'] = str(e)
-                results[original_index] = error_item
-                completed_count += 1
-    
-    # 过滤掉None值并返回最终结果
-    final_results = [r for r in results if r is not None]
-    return final_results
+def finish_file_task(file_task):
+    """
+    文件的所有样本都完成后按输入顺序整理一次输出文件 返回写出的条数
+    """
+    count = file_task["journal"].compact(jsonl_stream.read_jsonl(file_task["input_file"]))
+    print(f"已保存 {count} 条结果到 {file_task['output_file']}")
+    return count
 
-def inference_middle_code(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language="python", model=None, max_input_token=64):
-    print(f"当前处理的语言为 {language}")
+async def async_process_files(file_tasks, model, concurrency):
+    """
+    所有文件的待推理样本进入同一个全局队列 worker在文件之间不停顿 直到整个benchmark跑完
+    每条结果追加到所属文件的checkpoint日志中 某个文件的样本全部完成后立即整理该文件的输出
+    日志的写入、fsync和输出文件的整理都交给单独的写入线程 不阻塞事件循环上其他在途的请求
+    只有一个写入线程 同一个文件的追加和整理按提交顺序执行
+    样本按需从输入文件流式读取 内存占用与文件大小无关
+    file_tasks: [(input_file, language, output_file)]
+    返回 {output_file: 写出的条数}
+    """
+    loop = asyncio.get_running_loop()
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal-writer")
+    states = []
+    total_pending = 0
+    outputs = {}
+    for input_file, language, output_file in file_tasks:
+        file_task, pending = prepare_file_task(input_file, language, output_file)
+        if pending:
+            states.append(file_task)
+            total_pending += pending
+        else:
+            outputs[output_file] = await loop.run_in_executor(writer, finish_file_task, file_task)
+    print(f"共 {len(file_tasks)} 个文件 {total_pending} 条数据需要推理")
+
+    def jobs():
+        for file_task in states:
+            for index, sample_id, item in iter_pending(file_task):
+                yield file_task, index, sample_id, item
+
+    completed_count = 0
+
+    async def handler(job):
+        file_task, index, _, item = job
+        return await process_single_item(item, model, index, file_task["total"])
+
+    def on_error(job, e):
+        file_task, original_index, _, item = job
+        print(f"任务 {original_index+1} 执行失败: {e}")
+        logger_error.error(
+            f"{model} 在 {file_task['language']} 任务 {original_index+1} 执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)} 输出文件夹为{file_task['output_file']}\n"
+        ,exc_info=True)
+        # 创建错误项
+        error_item = item.copy()
+        error_item['generated_code'] = ''
+        error_item['error'] = str(e)
+        return error_item, original_index
+
+    async def on_result(job, result):
+        nonlocal completed_count
+        file_task, _, sample_id, _ = job
+        result_item, _ = result
+        file_task["remaining"] -= 1
+        completed_count += 1
+        finished = file_task["remaining"] == 0
+        print(f"\n总进度: {completed_count}/{total_pending} 条数据已完成")
+        if completed_count % 50 == 0:
+            for limiter in adaptive_limiter.all_limiters():
+                print(limiter.summary())
+            for balancer in endpoint_balancer.all_balancers():
+                print(balancer.summary())
+        await loop.run_in_executor(writer, file_task["journal"].append, sample_id, result_item)
+        if finished:
+            outputs[file_task["output_file"]] = await loop.run_in_executor(writer, finish_file_task, file_task)
+
+    def close_journals():
+        for file_task in states:
+            file_task["journal"].close()
+
+    engine = AsyncInferenceEngine(concurrency=concurrency)
+    try:
+        await engine.run(jobs(), handler, on_result=on_result, on_error=on_error)
+    finally:
+        await loop.run_in_executor(writer, close_journals)
+        writer.shutdown(wait=True)
+        await client_pool.aclose_async_clients()
+    return outputs
+
+def process_files(file_tasks, model, concurrency=256):
+    """
+    在同一个事件循环中处理所有文件 维持最多concurrency个在途请求
+    """
+    print(f"使用 {concurrency} 个并发协程进行处理")
+    return asyncio.run(async_process_files(file_tasks, model, concurrency))
+
+def process_file(input_file, language, output_file, model, concurrency=256):
+    """
+    并发处理单个文件的测试数据 返回写出的条数
+    """
+    return process_files([(input_file, language, output_file)], model, concurrency)[output_file]
+
+def item_prompt_fields(item):
+    """
+    从JSONL数据中提取构造prompt所需的字段 与process_single_item保持一致
+    """
+    info = item["inference_info"]
+    return {
+        "prefix_code": info.get('prefix_code', ''),
+        "suffix_code": info.get('suffix_code', ''),
+        "context_code": item.get('context_code', ''),
+        "skeleton": info.get('class_skeleton', info.get('function_skeleton', "Current task doesn't need skeleton")),
+        "code_description": info.get('code_description', ''),
+        "task_type": info.get('fill_type', 'CLASS_TYPE'),
+        "language": info.get('language_type', 'python'),
+    }
+
+def is_created_by(item, model):
+    """推理模型与创建task的模型一致时直接使用原始数据 不需要推理"""
+    return item["task_instance_info"].get('created_task_model', "").lower() == model.lower()
+
+def export_batch_requests(bench_files, model, batch_dir):
+    """
+    把所有未完成样本的完整prompt写成OpenAI Batch格式的请求文件
+    bench_files: [(input_file, language, output_file)]
+    """
+    writer = batch_io.BatchRequestWriter(batch_dir)
+    for input_file, language, output_file in tqdm.tqdm(bench_files):
+        file_task, _ = prepare_file_task(input_file, language, output_file)
+        for _, sample_id, item in iter_pending(file_task):
+            if is_created_by(item, model):
+                continue
+            messages, _ = build_budgeted_messages(model=model, **item_prompt_fields(item))
+            custom_id = batch_io.make_custom_id(language, input_file, sample_id)
+            writer.write(custom_id, {"model": model, "messages": messages, "temperature": TEMPERATURE})
+    writer.close()
+    print(f"已导出 {writer.count} 条请求到 {writer.files}")
+    return writer.files
+
+def import_batch_outputs(bench_files, model, batch_output):
+    """
+    把Batch输出合并回inference_content格式 写入各文件的checkpoint后整理输出文件
+    没有找到结果的样本保持未完成状态 下次导入或者在线推理时补齐
+    """
+    outputs = batch_io.load_batch_outputs(batch_output)
+    print(f"读取到 {len(outputs)} 条批量推理结果")
+    for input_file, language, output_file in bench_files:
+        file_task, pending = prepare_file_task(input_file, language, output_file)
+        if not pending:
+            finish_file_task(file_task)
+            continue
+        imported, missing = 0, 0
+        for _, sample_id, item in iter_pending(file_task):
+            if is_created_by(item, model):
+                file_task["journal"].append(sample_id, item)
+                continue
+            output = outputs.get(batch_io.make_custom_id(language, input_file, sample_id))
+            if output is None:
+                missing += 1
+                continue
+            content, usage, error = output
+            result_item = item.copy()
+            if error is not None:
+                result_item['generated_code'] = ''
+                result_item['error'] = error
+            else:
+                result_item["inference_content"] = {
+                    "inference_model": model,
+                    "inference_result": content.split("</think>")[-1].strip(),
+                    "inference_time": datetime.now().strftime("%Y-%m-%d %H-%M-%S"),
+                    "prompt_tokens": (usage or {}).get("prompt_tokens"),
+                    "completion_tokens": (usage or {}).get("completion_tokens")
+                }
+                imported += 1
+            file_task["journal"].append(sample_id, result_item)
+        print(f"{input_file} 导入 {imported} 条结果 缺失 {missing} 条")
+        finish_file_task(file_task)
+
+def build_messages(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language="python", model=None, related_files=None):
+    """
+    构造推理所需要的messages 同步与异步推理共用同一份prompt
+    related_files: 打包进prompt的上下文文件 [(file_name, content)] 为空时prompt与原来完全一致
+    """
     system_prompt = f"""
             As a {language} code generation expert, you will receive:
             1. prefix_code - Code preceding the target segment
@@ -175,10 +339,19 @@ def inference_middle_code(prefix_code, suffix_code, context_code, skeleton, code
             I WILL USE RE MATCH, IF DON'T MATCH WITH FORMAT ABOVE, YOUR ANSWER IS WRONG!!!
     """
 
+    related_section = ""
+    if related_files:
+        related_section = f"""
+    Related Files:
+    ```{language}
+    {prompt_builder.format_related_files(related_files)}
+    ```
+"""
+
     user_prompt = f"""
     {task_type}
     
-
+{related_section}
     Current File:
     ```{language}
     {prefix_code}
@@ -204,9 +377,83 @@ def inference_middle_code(prefix_code, suffix_code, context_code, skeleton, code
             {"role": "user", "content": f"{system_prompt} \n\n {user_prompt}"}
         ]
 
-    apikey, base_url = config.CLOSED_API, None
-    modelManager = model_manager.ModelManager(model_name=model)
-    base_url, if_inference = modelManager.load_from_file()
+    if "Qwen3" in model:
+        match_pattern = r"Qwen3-[1-9]\d*B-Chat"
+        if re.match(match_pattern, model):
+            print(f"目前测试{model}的非思考模式 需要再user_prompt后面加上 \\nothink")
+            user_prompt += " \\nothink"
+    return messages
+
+def build_budgeted_messages(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language="python", model=None, max_input_token=None):
+    """
+    按max_input_token(单位K)截断prefix/suffix 可选打包context_code
+    返回messages与最终prompt的token数
+    """
+    tokenizer = prompt_builder.get_tokenizer()
+    fixed_messages = build_messages("", "", context_code, skeleton, code_description, task_type, language, model)
+    fixed_tokens = prompt_builder.count_message_tokens(fixed_messages, tokenizer)
+    prefix_code, suffix_code, related_files = prompt_builder.fit_prompt(
+        prefix_code, suffix_code, context_code, fixed_tokens, max_input_token=max_input_token, tokenizer=tokenizer
+    )
+    messages = build_messages(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language, model, related_files=related_files)
+    return messages, prompt_builder.count_message_tokens(messages, tokenizer)
+
+_model_managers = {}
+
+def resolve_endpoint(model):
+    """
+    获取模型对应的api_key与负载均衡器 model_config.json由ModelManager按mtime缓存
+    model_config.json中配置了多个副本时 请求会在副本之间按在途请求数分摊
+    """
+    apikey = config.CLOSED_API
+    modelManager = _model_managers.get(model)
+    if modelManager is None:
+        modelManager = _model_managers.setdefault(model, model_manager.ModelManager(model_name=model))
+    endpoints, if_inference = modelManager.load_endpoints()
+    if not endpoints:
+        endpoints = [{"url": "", "weight": 1.0}]
+    return apikey, endpoint_balancer.get_balancer(model, endpoints)
+
+def is_reasoning_model(model):
+    model = (model or "").lower()
+    return any(marker in model for marker in REASONING_MODEL_MARKERS)
+
+def use_stream(task_type, model=None):
+    """
+    auto模式下非推理模型的LINE/BLOCK这类短补全使用非流式请求 其余使用流式请求
+    """
+    if STREAM_MODE == "auto":
+        return task_type not in NON_STREAM_TASK_TYPES or is_reasoning_model(model)
+    return STREAM_MODE == "stream"
+
+def record_request_stats(stats, permit, start, first_token_time, usage):
+    """
+    把首token延迟、总延迟以及token用量写入stats
+    流式请求向限流器报告首token延迟 非流式请求没有首token延迟 报告总延迟 限流器分开统计两者
+    """
+    if first_token_time is not None:
+        permit.record_latency(first_token_time - start, kind="ttft")
+    else:
+        permit.record_latency(time.monotonic() - start, kind="total")
+    if stats is None:
+        return
+    stats["ttft"] = round(first_token_time - start, 4) if first_token_time is not None else None
+    stats["latency"] = round(time.monotonic() - start, 4)
+    if usage is not None:
+        # 以服务端统计的token数为准
+        stats["prompt_tokens"] = usage.prompt_tokens
+        stats["completion_tokens"] = usage.completion_tokens
+
+def inference_middle_code(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language="python", model=None, max_input_token=None, stats=None):
+    """
+    max_input_token: 输入token上限(单位K) 为None时使用--max_input_token
+    stats: 可选的dict 用于返回prompt_tokens等统计信息
+    """
+    print(f"当前处理的语言为 {language}")
+    messages, prompt_tokens = build_budgeted_messages(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language, model, max_input_token)
+    if stats is not None:
+        stats["prompt_tokens"] = prompt_tokens
+    apikey, balancer = resolve_endpoint(model)
 
     # # 使用Anthropic客户端
     # if "claude" in model.lower() or "anthropic" in model.lower():
@@ -214,52 +461,194 @@ def inference_middle_code(prefix_code, suffix_code, context_code, skeleton, code
     #     return response
 
 
-    # 使用OpenAI客户端
-    client = OpenAI(api_key=apikey, base_url=base_url)
-    inference_answer = ""
-    if "Qwen3" in model:
-        import re
-        match_pattern = r"Qwen3-[1-9]\d*B-Chat"
-        if re.match(match_pattern, model):
-            if_inference = False
-            print(f"目前测试{model}的非思考模式 需要再user_prompt后面加上 \\nothink")
-            user_prompt += " \\nothink"
+    # 相同的请求直接返回缓存中的结果
+    response_cache = get_response_cache()
+    cache_key = response_cache.make_key(model, balancer.cache_endpoint, messages, TEMPERATURE)
+    cached_answer = response_cache.get(cache_key)
+    if cached_answer is not None:
+        print(f"{model} 命中LLM响应缓存")
+        return cached_answer.split("</think>")[-1].strip()
+
     print(f"{model} 开始输出")
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,
-            timeout=60,
-            stream=True
-        )
-        print("模型开始输出推理答案")
-        for chunk in response:
-            if not chunk.choices or not chunk.choices[0].delta:
-                continue
-            delta = chunk.choices[0].delta
-            if delta.content is not None:
-                inference_answer += delta.content
-                # print(delta.content, end="", flush=True)
-            # 检查是否完成
-            if chunk.choices[0].finish_reason:
-                print(f"\n\n已完成 完成原因 {chunk.choices[0].finish_reason}")
-                break
-    except Exception as e:
-        print(f"{model} API调用失败 {e}")
-        logger_error.error(
-                    f"{model} 在 {__file__}的 {language} 任务 {task_type}  执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)}\n"
-                ,exc_info=True)
+    # 先按负载选择副本 再由该副本的自适应限流器控制在途请求数 后端过载时自动收缩
+    with balancer.lease() as lease, adaptive_limiter.get_limiter(lease.url).slot() as permit:
+        # 使用OpenAI客户端 同一个endpoint在进程内共享连接池
+        client = client_pool.get_client(lease.url, apikey)
+        start = time.monotonic()
+        first_token_time = None
+        usage = None
+        chunks = []
+        try:
+            if use_stream(task_type, model):
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                    timeout=STREAM_TIMEOUT,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                print("模型开始输出推理答案")
+                # 异常退出时也要关闭响应 否则连接不会归还到连接池
+                with response:
+                    for chunk in response:
+                        # 开启include_usage后最后一个chunk只有usage 没有choices
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                        if not chunk.choices or not chunk.choices[0].delta:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content is not None:
+                            if first_token_time is None:
+                                first_token_time = time.monotonic()
+                            # 先收集到列表中 结束后一次性拼接 避免长推理过程的字符串反复拷贝
+                            chunks.append(delta.content)
+                            # print(delta.content, end="", flush=True)
+                        # 检查是否完成
+                        if chunk.choices[0].finish_reason:
+                            print(f"\n\n已完成 完成原因 {chunk.choices[0].finish_reason}")
+            else:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                    timeout=NON_STREAM_TIMEOUT,
+                    stream=False
+                )
+                if response.choices:
+                    chunks.append(response.choices[0].message.content or "")
+                usage = response.usage
+        except Exception as e:
+            permit.record_failure(adaptive_limiter.classify_error(e) or "error")
+            print(f"{model} API调用失败 {e}")
+            logger_error.error(
+                        f"{model} 在 {__file__}的 {language} 任务 {task_type}  执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)}\n"
+                    ,exc_info=True)
+        inference_answer = "".join(chunks)
+        record_request_stats(stats, permit, start, first_token_time, usage)
+        if not inference_answer:
+            # 空响应通常意味着后端负载过高
+            permit.record_failure("empty")
+        if permit.failure is not None:
+            lease.record_failure(permit.failure)
+    response_cache.put(cache_key, inference_answer)
+    return inference_answer.split("</think>")[-1].strip()
+
+async def async_inference_middle_code(prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language="python", model=None, max_input_token=None, stats=None):
+    """
+    inference_middle_code的异步版本 prompt与返回值保持一致
+    """
+    print(f"当前处理的语言为 {language}")
+    # tokenize是CPU密集的操作 放到线程中执行 避免阻塞事件循环
+    messages, prompt_tokens = await asyncio.to_thread(
+        build_budgeted_messages, prefix_code, suffix_code, context_code, skeleton, code_description, task_type, language, model, max_input_token
+    )
+    if stats is not None:
+        stats["prompt_tokens"] = prompt_tokens
+    apikey, balancer = resolve_endpoint(model)
+
+    response_cache = get_response_cache()
+    cache_key = response_cache.make_key(model, balancer.cache_endpoint, messages, TEMPERATURE)
+    # sqlite的读写是同步的 放到线程中执行
+    cached_answer = await asyncio.to_thread(response_cache.get, cache_key)
+    if cached_answer is not None:
+        print(f"{model} 命中LLM响应缓存")
+        return cached_answer.split("</think>")[-1].strip()
+
+    print(f"{model} 开始输出")
+    async with balancer.async_lease() as lease, adaptive_limiter.get_limiter(lease.url).async_slot() as permit:
+        client = client_pool.get_async_client(lease.url, apikey)
+        start = time.monotonic()
+        first_token_time = None
+        usage = None
+        chunks = []
+        try:
+            if use_stream(task_type, model):
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                    timeout=STREAM_TIMEOUT,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                print("模型开始输出推理答案")
+                async with response:
+                    async for chunk in response:
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                        if not chunk.choices or not chunk.choices[0].delta:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content is not None:
+                            if first_token_time is None:
+                                first_token_time = time.monotonic()
+                            chunks.append(delta.content)
+                        # 检查是否完成
+                        if chunk.choices[0].finish_reason:
+                            print(f"\n\n已完成 完成原因 {chunk.choices[0].finish_reason}")
+            else:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                    timeout=NON_STREAM_TIMEOUT,
+                    stream=False
+                )
+                if response.choices:
+                    chunks.append(response.choices[0].message.content or "")
+                usage = response.usage
+        except Exception as e:
+            permit.record_failure(adaptive_limiter.classify_error(e) or "error")
+            print(f"{model} API调用失败 {e}")
+            logger_error.error(
+                        f"{model} 在 {__file__}的 {language} 任务 {task_type}  执行失败: {e}, 异常类型: {type(e).__name__}, 异常详情: {str(e)}\n"
+                    ,exc_info=True)
+        inference_answer = "".join(chunks)
+        record_request_stats(stats, permit, start, first_token_time, usage)
+        if not inference_answer:
+            permit.record_failure("empty")
+        if permit.failure is not None:
+            lease.record_failure(permit.failure)
+    await asyncio.to_thread(response_cache.put, cache_key, inference_answer)
     return inference_answer.split("</think>")[-1].strip()
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Argument Parser Example")
-    parser.add_argument("--language", "-language", type=str, default="python", help="Process Language")
+    parser.add_argument("--mode", "-mode", type=str, default="online", choices=["online", "batch-export", "batch-import"],
+                       help="online: live requests; batch-export: write OpenAI Batch request files; batch-import: merge Batch outputs back")
+    parser.add_argument("--batch_dir", "-batch_dir", type=str, default=None, help="Directory for batch request files (default: ./result/batch/{model})")
+    parser.add_argument("--batch_output", "-batch_output", type=str, default=None, help="Batch output file or directory to import (default: --batch_dir)")
+    parser.add_argument("--language", "-language", type=str, default="python", help="Process Language, comma separated for several languages (e.g. python,java)")
+    parser.add_argument("--all-languages", "-all-languages", dest="all_languages", action="store_true", help="Process every language under ./bench")
     parser.add_argument("--model", "-model", type=str, default="deepseek-v3", help="Inference model")
-    parser.add_argument("--max-workers", "-max-workers", type=int, default=os.cpu_count() // 2, 
-                       help=f"Maximum number of worker threads (default: {os.cpu_count() // 2})")
+    parser.add_argument("--concurrency", "-concurrency", "--max-workers", "-max-workers", dest="concurrency", type=int, default=256,
+                       help="Maximum number of in-flight requests, independent of CPU count (default: 256)")
+    parser.add_argument("--initial-concurrency", "-initial-concurrency", type=int, default=adaptive_limiter.LIMITER_SETTINGS["initial_limit"],
+                       help="Starting in-flight limit per endpoint; AIMD grows it up to --concurrency while the backend stays healthy")
+    parser.add_argument("--min-concurrency", "-min-concurrency", type=int, default=adaptive_limiter.LIMITER_SETTINGS["min_limit"],
+                       help="Lower bound the adaptive limiter backs off to")
+    parser.add_argument("--no-adaptive", "-no-adaptive", dest="no_adaptive", action="store_true",
+                       help="Disable the adaptive limiter and keep --concurrency requests in flight")
+    parser.add_argument("--max-connections", "-max-connections", type=int, default=client_pool.POOL_LIMITS["max_connections"],
+                       help="HTTP connection pool size per endpoint")
+    parser.add_argument("--max-keepalive", "-max-keepalive", type=int, default=client_pool.POOL_LIMITS["max_keepalive_connections"],
+                       help="Idle keep-alive connections kept per endpoint")
+    parser.add_argument("--cache_path", "-cache_path", type=str, default=DEFAULT_CACHE_PATH, help="LLM response cache file")
+    parser.add_argument("--cache_max_mb", "-cache_max_mb", type=int, default=2048, help="LLM response cache size cap in MB, LRU eviction beyond it")
+    parser.add_argument("--no-cache", "-no-cache", dest="no_cache", action="store_true", help="Bypass the LLM response cache")
+    parser.add_argument("--stream_mode", "-stream_mode", type=str, default=STREAM_MODE, choices=["auto", "stream", "nonstream"],
+                       help="auto: non-streaming requests for LINE/BLOCK tasks of non-reasoning models, streaming otherwise")
+    parser.add_argument("--nonstream_timeout", "-nonstream_timeout", type=float, default=NON_STREAM_TIMEOUT,
+                       help="Timeout in seconds for a non-streaming request to return the full answer")
     parser.add_argument("--max_input_token", "-max_input_token", type=int, default=64, 
                        help="Maximum input token limit in K (default: 64, will be multiplied by 1024)")
+    parser.add_argument("--tokenizer_path", "-tokenizer_path", type=str, default=prompt_builder.DEFAULT_TOKENIZER_PATH,
+                       help="Tokenizer used to count prompt tokens (shared default with create_test.py)")
+    parser.add_argument("--allow_char_tokenizer", "-allow_char_tokenizer", action="store_true",
+                       help="Estimate 4 characters per token instead of failing when the tokenizer cannot be loaded")
+    parser.add_argument("--pack_context", "-pack_context", action="store_true",
+                       help="Pack the relevance-sorted context_code files into the remaining token budget")
     args = parser.parse_args()
     return args
 
@@ -316,9 +705,16 @@ def get_output_path(input_file_path, language, model):
 if __name__ == '__main__':
 
     args = parse_args()
-    language = args.language.lower()
     model = args.model
-    max_workers = args.max_workers
+    concurrency = args.concurrency
+    STREAM_MODE = args.stream_mode
+    NON_STREAM_TIMEOUT = args.nonstream_timeout
+    client_pool.configure_pool_limits(max_connections=args.max_connections, max_keepalive_connections=args.max_keepalive)
+    configure_response_cache(path=args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024, enabled=not args.no_cache)
+    adaptive_limiter.configure_limiters(initial_limit=min(args.initial_concurrency, concurrency), min_limit=args.min_concurrency,
+                                        max_limit=concurrency, adaptive=not args.no_adaptive)
+    prompt_builder.configure_prompt_builder(tokenizer_path=args.tokenizer_path, max_input_token=args.max_input_token, pack_context=args.pack_context,
+                                            allow_char_tokenizer=args.allow_char_tokenizer)
 
     logger_error = setup_logger(model, logging.ERROR)
     logger_info = setup_logger(model, logging.INFO)
@@ -327,41 +723,59 @@ if __name__ == '__main__':
         import sys
         print("当前模型不在测试列表中")
         sys.exit(1)
+
+    if args.all_languages:
+        languages = sorted(entry.name for entry in os.scandir("./bench/") if entry.is_dir())
+    else:
+        languages = [language.strip().lower() for language in args.language.split(",") if language.strip()]
     
-    print(f"配置信息: 语言={language}, 模型={model}, 最大线程数={max_workers}")
-    
-    input_path = f"./bench/{language}/"
-    
-    # 扫描所有.jsonl文件
-    jsonl_files = utils.scan_jsonl_files(input_path)
-    
-    if not jsonl_files:
-        print(f"在 {input_path} 中没有找到 .jsonl 文件")
-        exit(1)
-    
-    print(f"找到 {len(jsonl_files)} 个 .jsonl 文件: {jsonl_files}")
+    print(f"配置信息: 语言={languages}, 模型={model}, 最大并发数={concurrency}")
     
-    # 处理每个文件 但目前还是单线程处理一个文件 所以还是很慢
-    for jsonl_file in tqdm.tqdm(jsonl_files):
-        # 添加日志记录功能
+    # 收集所有语言的所有文件 放进同一个全局队列
+    bench_files = []
+    for language in languages:
+        input_path = f"./bench/{language}/"
+        
+        # 扫描所有.jsonl文件
+        jsonl_files = utils.scan_jsonl_files(input_path)
         
-        # 读取测试数据
-        test_data = utils.read_jsonl_file(jsonl_file)
-        if not test_data:
-            print(f"文件 {jsonl_file} 没有有效数据，跳过")
+        if not jsonl_files:
+            print(f"在 {input_path} 中没有找到 .jsonl 文件")
             continue
         
-        # 生成输出路径
-        output_path = get_output_path(jsonl_file, language, model)
-        print(f"输出路径: {output_path}")
-        logger_info.info(f"正在处理文件 {jsonl_file} 输出路径为 {output_path}")
-        # 多线程处理测试数据
-        print(f"开始多线程处理 {len(test_data)} 条测试数据...")
-        results = process_test_data(test_data, language=language, output_file=output_path, max_workers=max_workers, model=model)
+        print(f"找到 {len(jsonl_files)} 个 .jsonl 文件: {jsonl_files}")
         
-        # 保存最终结果
-        print(f"正在保存最终结果到: {output_path}")
-        utils.save_results_to_jsonl(results, output_path)
-        print(f"文件 {jsonl_file} 处理完成！")
+        for jsonl_file in tqdm.tqdm(jsonl_files):
+            # 只统计条数 样本在推理时再流式读取
+            if not jsonl_stream.count_jsonl(jsonl_file):
+                print(f"文件 {jsonl_file} 没有有效数据，跳过")
+                continue
+            
+            # 生成输出路径
+            output_path = get_output_path(jsonl_file, language, model)
+            print(f"输出路径: {output_path}")
+            logger_info.info(f"正在处理文件 {jsonl_file} 输出路径为 {output_path}")
+            bench_files.append((jsonl_file, language, output_path))
+
+    if not bench_files:
+        print("没有找到需要处理的数据")
+        exit(1)
+
+    batch_dir = args.batch_dir or f"./result/batch/{model}"
+    if args.mode == "batch-export":
+        export_batch_requests(bench_files, model, batch_dir)
+        sys.exit(0)
+    if args.mode == "batch-import":
+        import_batch_outputs(bench_files, model, args.batch_output or batch_dir)
+        sys.exit(0)
+
+    # 协程并发处理所有文件
+    print(f"开始并发处理 {len(bench_files)} 个文件...")
+    process_files(bench_files, model=model, concurrency=concurrency)
     
-    print("\n所有文件处理完成！")
\ No newline at end of file
+    print(get_response_cache().summary())
+    for limiter in adaptive_limiter.all_limiters():
+        print(limiter.summary())
+    for balancer in endpoint_balancer.all_balancers():
+        print(balancer.summary())
+    print("\n所有文件处理完成！")
@@ -1,9 +1,9 @@
-import anthropic
-
 def AnthropicRequest(model, api_key, messages):
     """
     按照Anthropic的格式请求，使用messages进行请求
     """
+    # anthropic导入较慢 只有真正使用Anthropic客户端时才导入
+    import anthropic
     client = anthropic.Anthropic(api_key=api_key)
     inference_answer = ""
 
@@ -0,0 +1,293 @@
+"""
+LLM后端的自适应并发控制(AIMD)
+延迟和错误率正常时逐步放大并发 遇到超时、429、5xx或者空响应时按比例收缩 避免把自建的vLLM/SGLang服务压垮
+每个endpoint一个限流器 同时记录该endpoint的延迟分位数
+延迟分两种: 流式请求的首token延迟(ttft)和非流式请求的总延迟(total) 两者量级不同 分开统计和判断
+"""
+
+import asyncio
+import collections
+import contextlib
+import threading
+import time
+
+LATENCY_KINDS = ("ttft", "total")
+
+
+class LatencyTracker:
+    """
+    滑动窗口内的延迟统计
+    """
+    def __init__(self, window=1024):
+        self.samples = collections.deque(maxlen=window)
+
+    def record(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class AIMDController:
+    """
+    AIMD状态机 只负责根据请求结果调整limit 不负责排队
+    慢启动阶段每个成功请求limit+1(每个RTT翻倍) 第一次拥塞之后每个成功请求+1/limit(每个RTT+1)
+    """
+    def __init__(self, initial_limit=32, min_limit=1, max_limit=1024, decrease_factor=0.7, latency_tolerance=2.0):
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.slow_start = True
+        # 每种延迟各自的基线: 后端空闲时的延迟 取最近窗口p50的最小值 并缓慢向上漂移
+        self.baseline = {kind: None for kind in LATENCY_KINDS}
+        self.recent = {kind: LatencyTracker(window=64) for kind in LATENCY_KINDS}
+        self.last_decrease = 0.0
+
+    def latency_healthy(self, kind="ttft"):
+        recent = self.recent[kind]
+        baseline = self.baseline[kind]
+        if baseline is None or len(recent) < 16:
+            return True
+        return recent.percentile(50) <= baseline * self.latency_tolerance
+
+    def on_success(self, latency, inflight, kind="ttft"):
+        recent = self.recent[kind]
+        recent.record(latency)
+        if len(recent) >= 16:
+            p50 = recent.percentile(50)
+            baseline = self.baseline[kind]
+            if baseline is None or p50 < baseline:
+                self.baseline[kind] = p50
+            else:
+                self.baseline[kind] = baseline + (p50 - baseline) * 0.001
+        if not self.latency_healthy(kind):
+            # 延迟明显变高说明后端开始排队 停止增长
+            self.slow_start = False
+            return
+        # 只有并发真的用满时才继续增长 否则limit会无意义地变大
+        if inflight + 1 < int(self.limit):
+            return
+        if self.slow_start:
+            self.limit = min(self.max_limit, self.limit + 1)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_failure(self):
+        """同一次拥塞只收缩一次 冷却时间取当前p50延迟(两种延迟中较大的 至少1秒)"""
+        now = time.monotonic()
+        cooldown = max([1.0] + [recent.percentile(50) or 0.0 for recent in self.recent.values()])
+        if now - self.last_decrease < cooldown:
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+# 只有这些失败说明后端过载 需要收缩并发 其他错误(例如400参数错误)只计数
+CONGESTION_SIGNALS = {"timeout", "429", "5xx", "connection", "empty"}
+
+
+def classify_error(e):
+    """把异常归类为限流器关心的几种拥塞信号 返回None表示与后端负载无关"""
+    import openai
+    if isinstance(e, (openai.APITimeoutError, asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(e, openai.RateLimitError):
+        return "429"
+    if isinstance(e, openai.APIStatusError) and e.status_code >= 500:
+        return "5xx"
+    if isinstance(e, openai.APIConnectionError):
+        return "connection"
+    return None
+
+
+class _Permit:
+    """
+    一次请求占用的并发名额 调用方在请求过程中报告延迟或失败原因
+    """
+    def __init__(self):
+        self.start = time.monotonic()
+        self.latency = None
+        self.latency_kind = None
+        self.failure = None
+
+    def record_latency(self, latency=None, kind="ttft"):
+        """kind: ttft为流式请求的首token延迟 total为非流式请求的总延迟"""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.start if latency is None else latency
+            self.latency_kind = kind
+
+    def record_failure(self, reason):
+        if self.failure is None:
+            self.failure = reason
+
+
+class AdaptiveLimiter:
+    """
+    单个endpoint的自适应限流器
+    可以在多个线程中使用slot() 也可以在同一个事件循环中使用async_slot()
+    """
+    def __init__(self, name, controller):
+        self.name = name
+        self.controller = controller
+        self.inflight = 0
+        self.successes = 0
+        self.failures = collections.Counter()
+        self.latency = {kind: LatencyTracker(window=2048) for kind in LATENCY_KINDS}
+        self._lock = threading.Lock()
+        self._thread_cond = threading.Condition(self._lock)
+        # 事件循环 -> 该循环上的asyncio.Condition 已经关闭的事件循环在下一次取用时移除
+        self._async_conds = {}
+
+    @property
+    def limit(self):
+        return int(self.controller.limit)
+
+    def _has_room(self):
+        return self.inflight < max(1, int(self.controller.limit))
+
+    def _finish(self, permit, exc):
+        reason = permit.failure
+        if reason is None and exc is not None:
+            reason = classify_error(exc) or "error"
+        with self._lock:
+            self.inflight -= 1
+            if reason is not None:
+                self.failures[reason] += 1
+                if reason in CONGESTION_SIGNALS:
+                    self.controller.on_failure()
+            else:
+                # 没有报告延迟的请求按总延迟统计
+                if permit.latency is not None:
+                    latency, kind = permit.latency, permit.latency_kind
+                else:
+                    latency, kind = time.monotonic() - permit.start, "total"
+                self.successes += 1
+                self.latency[kind].record(latency)
+                self.controller.on_success(latency, self.inflight, kind)
+            self._thread_cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """线程版本 阻塞直到有空闲名额"""
+        with self._thread_cond:
+            while not self._has_room():
+                self._thread_cond.wait(timeout=1.0)
+            self.inflight += 1
+        permit = _Permit()
+        exc = None
+        try:
+            yield permit
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            self._finish(permit, exc)
+
+    def _async_condition(self):
+        """当前事件循环上的Condition asyncio.Condition只能在第一次使用它的事件循环中使用"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            cond = self._async_conds.get(loop)
+            if cond is None:
+                for closed in [other for other in self._async_conds if other.is_closed()]:
+                    del self._async_conds[closed]
+                cond = self._async_conds[loop] = asyncio.Condition()
+            return cond
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self):
+        """协程版本 等待时让出事件循环"""
+        cond = self._async_condition()
+        async with cond:
+            while not self._has_room():
+                await cond.wait()
+            with self._lock:
+                self.inflight += 1
+        permit = _Permit()
+        exc = None
+        try:
+            yield permit
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            self._finish(permit, exc)
+            async with cond:
+                cond.notify_all()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "endpoint": self.name,
+                "limit": int(self.controller.limit),
+                "inflight": self.inflight,
+                "successes": self.successes,
+                "failures": dict(self.failures),
+            }
+            for kind, tracker in self.latency.items():
+                stats[kind] = {"count": len(tracker), "p50": tracker.percentile(50), "p90": tracker.percentile(90), "p99": tracker.percentile(99)}
+            return stats
+
+    def summary(self):
+        stats = self.stats()
+        def fmt(value):
+            return f"{value:.2f}s" if value is not None else "N/A"
+        summary = (f"[{stats['endpoint']}] 当前并发上限 {stats['limit']} 在途 {stats['inflight']} "
+                   f"成功 {stats['successes']} 失败 {stats['failures']}")
+        for kind, label in (("ttft", "首token延迟"), ("total", "非流式总延迟")):
+            latency = stats[kind]
+            if latency["count"]:
+                summary += f" {label}({latency['count']}次) p50={fmt(latency['p50'])} p90={fmt(latency['p90'])} p99={fmt(latency['p99'])}"
+        return summary
+
+
+# 新建限流器时使用的参数 在第一次推理之前通过configure_limiters修改
+LIMITER_SETTINGS = {
+    "initial_limit": 32,
+    "min_limit": 1,
+    "max_limit": 1024,
+    "adaptive": True,
+}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_limiters(initial_limit=None, min_limit=None, max_limit=None, adaptive=None):
+    """adaptive为False时limit固定为max_limit 相当于原来的固定并发"""
+    with _limiters_lock:
+        for key, value in (("initial_limit", initial_limit), ("min_limit", min_limit),
+                           ("max_limit", max_limit), ("adaptive", adaptive)):
+            if value is not None:
+                LIMITER_SETTINGS[key] = value
+
+
+def get_limiter(endpoint):
+    """按endpoint获取限流器 进程内共享"""
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            max_limit = LIMITER_SETTINGS["max_limit"]
+            if LIMITER_SETTINGS["adaptive"]:
+                controller = AIMDController(initial_limit=LIMITER_SETTINGS["initial_limit"],
+                                            min_limit=LIMITER_SETTINGS["min_limit"], max_limit=max_limit)
+            else:
+                controller = AIMDController(initial_limit=max_limit, min_limit=max_limit, max_limit=max_limit)
+            limiter = AdaptiveLimiter(endpoint, controller)
+            _limiters[endpoint] = limiter
+        return limiter
+
+
+def all_limiters():
+    with _limiters_lock:
+        return list(_limiters.values())
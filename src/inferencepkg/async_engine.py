@@ -0,0 +1,64 @@
+"""
+基于asyncio的推理引擎
+推理阶段几乎全部时间都在等待网络 因此用单进程+协程维持大量在途请求 而不是按CPU核数开线程
+"""
+
+import asyncio
+import inspect
+
+_STOP = object()
+
+
+class AsyncInferenceEngine:
+    """
+    固定数量的worker协程从队列中取任务执行 并发度与CPU核数无关
+    """
+    def __init__(self, concurrency=256):
+        if concurrency is None or concurrency <= 0:
+            raise ValueError(f"concurrency 必须为正整数 当前为 {concurrency}")
+        self.concurrency = concurrency
+
+    async def run(self, jobs, handler, on_result=None, on_error=None):
+        """
+        jobs: 任务的可迭代对象
+        handler: async函数 handler(job) -> result
+        on_result: 每个任务完成后的回调 on_result(job, result) 可以是async函数 返回的协程会在当前worker中等待完成
+        on_error: handler抛出异常时的回调 on_error(job, exception) -> result 返回值会继续交给on_result
+        返回完成的任务数
+        """
+        # 队列长度有上限 避免一次性把所有任务都放进内存
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        completed = 0
+
+        async def producer():
+            for job in jobs:
+                await queue.put(job)
+            for _ in range(self.concurrency):
+                await queue.put(_STOP)
+
+        async def worker():
+            nonlocal completed
+            while True:
+                job = await queue.get()
+                if job is _STOP:
+                    return
+                try:
+                    result = await handler(job)
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    result = on_error(job, e)
+                completed += 1
+                if on_result is not None:
+                    outcome = on_result(job, result)
+                    if inspect.isawaitable(outcome):
+                        await outcome
+
+        tasks = [asyncio.create_task(producer())]
+        tasks += [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return completed
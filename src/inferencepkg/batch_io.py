@@ -0,0 +1,107 @@
+"""
+离线批量推理的请求导出与结果导入
+请求文件使用OpenAI Batch API的格式 每行一个 {"custom_id", "method", "url", "body"}
+可以直接交给OpenAI Batch API 或者本地vLLM的离线批量推理(run_batch)执行
+custom_id由 语言/文件名/样本id 组成 导入时据此把结果放回对应的输出文件
+"""
+
+import json
+import os
+from pathlib import Path
+
+MAX_REQUESTS_PER_FILE = 50000  # OpenAI Batch API单个文件的请求数上限
+BATCH_ENDPOINT = "/v1/chat/completions"
+REQUEST_FILE_PREFIX = "batch_requests_"
+
+
+def make_custom_id(language, input_file, sample_id):
+    return f"{language}/{Path(input_file).stem}/{sample_id}"
+
+
+class BatchRequestWriter:
+    """
+    按数量切分的请求文件 batch_requests_0000.jsonl, batch_requests_0001.jsonl ...
+    """
+    def __init__(self, batch_dir, max_requests_per_file=MAX_REQUESTS_PER_FILE):
+        self.batch_dir = batch_dir
+        self.max_requests_per_file = max_requests_per_file
+        self.files = []
+        self.count = 0
+        self._file = None
+        self._file_count = 0
+        os.makedirs(batch_dir, exist_ok=True)
+
+    def _open_next(self):
+        self.close()
+        path = os.path.join(self.batch_dir, f"{REQUEST_FILE_PREFIX}{len(self.files):04d}.jsonl")
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file_count = 0
+        self.files.append(path)
+
+    def write(self, custom_id, body):
+        if self._file is None or self._file_count >= self.max_requests_per_file:
+            self._open_next()
+        request = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+        self._file.write(json.dumps(request, ensure_ascii=False) + '\n')
+        self._file_count += 1
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def parse_batch_output(line):
+    """
+    解析Batch API输出文件中的一行
+    返回 (custom_id, content, usage, error) 请求失败时content为None
+    既没有response也没有error的行是请求而不是结果 返回None
+    """
+    record = json.loads(line)
+    if "response" not in record and "error" not in record:
+        return None
+    custom_id = record["custom_id"]
+    if record.get("error"):
+        return custom_id, None, None, json.dumps(record["error"], ensure_ascii=False)
+    response = record.get("response") or {}
+    status_code = response.get("status_code", 200)
+    body = response.get("body") or {}
+    if status_code != 200:
+        return custom_id, None, None, f"status_code {status_code}: {json.dumps(body, ensure_ascii=False)}"
+    choices = body.get("choices") or []
+    if not choices:
+        return custom_id, None, None, "返回结果中没有choices"
+    message = choices[0].get("message") or {}
+    return custom_id, message.get("content") or "", body.get("usage"), None
+
+
+def load_batch_outputs(path):
+    """
+    读取输出文件 path可以是单个文件或者目录(读取目录下除请求文件以外的所有.jsonl)
+    返回 {custom_id: (content, usage, error)} 同一个custom_id以成功的结果为准
+    """
+    if os.path.isdir(path):
+        # 输出默认和导出的请求文件放在同一个目录 请求文件不能当成结果读取 否则缺失的样本会被记成失败
+        files = sorted(str(p) for p in Path(path).glob("*.jsonl") if not p.name.startswith(REQUEST_FILE_PREFIX))
+    else:
+        files = [path]
+    outputs = {}
+    for file in files:
+        with open(file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    parsed = parse_batch_output(line)
+                except (json.JSONDecodeError, KeyError) as e:
+                    print(f"{file} 中存在无法解析的行 跳过: {e}")
+                    continue
+                if parsed is None:
+                    continue
+                custom_id, content, usage, error = parsed
+                previous = outputs.get(custom_id)
+                if previous is None or previous[2] is not None:
+                    outputs[custom_id] = (content, usage, error)
+    return outputs
@@ -0,0 +1,145 @@
+"""
+推理结果的追加式checkpoint日志
+每完成一条样本就向 <output>.journal 追加一行 崩溃后重启只需要重跑缺失或出错的样本
+全部完成后再一次性整理成 *_inference_result.jsonl
+"""
+
+import hashlib
+import json
+import os
+
+from utils import jsonl_stream
+
+FSYNC_EVERY = 32  # 每追加多少条记录做一次fsync
+
+
+def get_sample_id(item):
+    """
+    根据样本内容生成稳定的id 与样本在文件中的位置无关
+    推理结果是在原始数据上追加字段 因此原始样本和推理结果得到的id相同
+    """
+    info = item.get("inference_info", {})
+    key = json.dumps([
+        item.get("repo_name"),
+        item.get("file_name"),
+        info.get("fill_type"),
+        info.get("prefix_code"),
+        info.get("middle_code"),
+        info.get("suffix_code"),
+    ], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def is_completed(record):
+    """出错的样本以及推理结果为空的样本(API调用失败)都需要重跑"""
+    if "error" in record:
+        return False
+    inference_content = record.get("inference_content")
+    if inference_content is not None and not inference_content.get("inference_result"):
+        return False
+    return True
+
+
+class CheckpointJournal:
+    """
+    单个输出文件对应的追加式日志
+    """
+    def __init__(self, output_path):
+        self.output_path = output_path
+        # 不使用.jsonl后缀 避免被scan_jsonl_files当成推理结果扫描到
+        self.journal_path = f"{output_path}.journal"
+        self._file = None
+        self._pending_sync = 0
+
+    def _iter_entries(self):
+        """
+        依次返回 (sample_id, record, 来源文件, 行偏移) 先读上一次整理好的输出文件 再读日志
+        同一个id以最后出现的为准
+        """
+        for path, from_journal in ((self.output_path, False), (self.journal_path, True)):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    line_offset = offset
+                    offset += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = jsonl_stream.loads(line)
+                    except ValueError:
+                        # 崩溃时日志最后一行可能只写了一半
+                        continue
+                    if from_journal:
+                        yield entry["sample_id"], entry["record"], path, line_offset
+                    else:
+                        yield get_sample_id(entry), entry, path, line_offset
+
+    def load(self):
+        """
+        读取已有的结果 返回 {sample_id: record}
+        """
+        return {sample_id: record for sample_id, record, _, _ in self._iter_entries()}
+
+    def load_completed(self):
+        """
+        只返回已经完成的样本id集合 不在内存中保留记录本身
+        """
+        status = {}
+        for sample_id, record, _, _ in self._iter_entries():
+            status[sample_id] = is_completed(record)
+        return {sample_id for sample_id, completed in status.items() if completed}
+
+    def append(self, sample_id, record):
+        """追加一条结果 立即flush 定期fsync"""
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write(jsonl_stream.dumps({"sample_id": sample_id, "record": record}) + '\n')
+        self._file.flush()
+        self._pending_sync += 1
+        if self._pending_sync >= FSYNC_EVERY:
+            os.fsync(self._file.fileno())
+            self._pending_sync = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._pending_sync = 0
+
+    def compact(self, items):
+        """
+        按输入顺序把结果整理到输出文件 写临时文件后原子替换 成功后删除日志
+        items可以是生成器 只在内存中保留每个id最新结果所在的位置 逐条从原文件读取
+        返回整理后的结果条数
+        """
+        self.close()
+        locations = {sample_id: (path, offset) for sample_id, _, path, offset in self._iter_entries()}
+        sources = {}
+        try:
+            with jsonl_stream.JsonlWriter(self.output_path, fsync=True) as writer:
+                for item in items:
+                    location = locations.get(get_sample_id(item))
+                    if location is None:
+                        continue
+                    path, offset = location
+                    if path not in sources:
+                        sources[path] = open(path, 'rb')
+                    source = sources[path]
+                    source.seek(offset)
+                    line = source.readline().strip()
+                    if path == self.journal_path:
+                        writer.write(jsonl_stream.loads(line)["record"])
+                    else:
+                        # 输出文件中的行本身就是记录 原样写出
+                        writer.write_raw(line)
+        finally:
+            for source in sources.values():
+                source.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        return writer.count
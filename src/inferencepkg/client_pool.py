@@ -0,0 +1,83 @@
+"""
+进程级的OpenAI客户端注册表
+同一个(base_url, api_key)在整个进程内只创建一个客户端 底层httpx连接池开启keep-alive 避免每次请求都重新握手
+"""
+
+import asyncio
+import threading
+
+# openai和httpx导入较慢(约0.5秒) 在第一次创建客户端时才导入 inference.py --help等不需要请求的场景可以快速启动
+
+# 连接池参数 需要在第一次获取客户端之前通过configure_pool_limits修改
+POOL_LIMITS = {
+    "max_connections": 1024,
+    "max_keepalive_connections": 256,
+    "keepalive_expiry": 60.0,
+}
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def configure_pool_limits(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None):
+    """修改连接池上限 只对之后新建的客户端生效"""
+    with _lock:
+        if max_connections is not None:
+            POOL_LIMITS["max_connections"] = max_connections
+        if max_keepalive_connections is not None:
+            POOL_LIMITS["max_keepalive_connections"] = max_keepalive_connections
+        if keepalive_expiry is not None:
+            POOL_LIMITS["keepalive_expiry"] = keepalive_expiry
+
+
+def _limits():
+    import httpx
+    return httpx.Limits(**POOL_LIMITS)
+
+
+def get_client(base_url, api_key):
+    """获取同步客户端 线程安全 可以在多个线程之间共享"""
+    key = (base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI, DefaultHttpxClient
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=DefaultHttpxClient(limits=_limits()))
+            _clients[key] = client
+        return client
+
+
+def get_async_client(base_url, api_key):
+    """
+    获取异步客户端 必须在事件循环内调用
+    异步连接池绑定在创建它的事件循环上 因此按事件循环分别缓存
+    """
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key, id(loop))
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=DefaultAsyncHttpxClient(limits=_limits()))
+            _async_clients[key] = client
+        return client
+
+
+async def aclose_async_clients():
+    """关闭当前事件循环创建的所有异步客户端 在asyncio.run结束之前调用"""
+    loop_id = id(asyncio.get_running_loop())
+    with _lock:
+        keys = [key for key in _async_clients if key[2] == loop_id]
+        clients = [_async_clients.pop(key) for key in keys]
+    for client in clients:
+        await client.close()
+
+
+def close_clients():
+    """关闭所有同步客户端"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,170 @@
+"""
+同一个逻辑模型多副本之间的负载均衡
+按 在途请求数/权重 最小的原则选择副本(least outstanding requests)
+连续失败的副本会被暂时摘除 冷却时间过后重新放回 每个副本单独统计吞吐量
+"""
+
+import contextlib
+import random
+import threading
+import time
+
+from inferencepkg.adaptive_limiter import CONGESTION_SIGNALS
+
+EJECT_AFTER = 5  # 连续失败多少次后摘除副本
+EJECT_COOLDOWN = 30.0  # 第一次摘除的冷却时间(秒) 反复被摘除时翻倍
+MAX_EJECT_COOLDOWN = 300.0
+
+
+class Replica:
+    """
+    单个副本的状态
+    """
+    def __init__(self, url, weight=1.0):
+        self.url = url
+        self.weight = weight
+        self.outstanding = 0
+        self.completed = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.first_request = None
+        self.last_finish = None
+
+    def available(self, now):
+        return now >= self.ejected_until
+
+    def load(self):
+        return (self.outstanding + 1) / self.weight
+
+
+class _Lease:
+    """
+    一次请求选中的副本 调用方在失败时报告原因
+    """
+    def __init__(self, replica):
+        self.replica = replica
+        self.url = replica.url
+        self.failure = None
+
+    def record_failure(self, reason):
+        if self.failure is None:
+            self.failure = reason
+
+
+class EndpointBalancer:
+    """
+    线程安全 选择副本时不需要等待 同步推理使用lease() 异步推理使用async_lease()
+    """
+    def __init__(self, name, endpoints, eject_after=EJECT_AFTER, eject_cooldown=EJECT_COOLDOWN):
+        self.name = name
+        self.replicas = [Replica(endpoint["url"], endpoint.get("weight", 1.0)) for endpoint in endpoints]
+        self.eject_after = eject_after
+        self.eject_cooldown = eject_cooldown
+        self._lock = threading.Lock()
+        # 响应缓存使用的endpoint 多个副本共享同一份缓存 单副本时与原来的base_url保持一致
+        if len(self.replicas) == 1:
+            self.cache_endpoint = self.replicas[0].url
+        else:
+            self.cache_endpoint = f"{name}@replicas"
+
+    def _pick(self):
+        now = time.monotonic()
+        candidates = [replica for replica in self.replicas if replica.available(now)]
+        if not candidates:
+            # 所有副本都被摘除时 选最早恢复的那个 不让请求卡住
+            return min(self.replicas, key=lambda replica: replica.ejected_until)
+        best = min(replica.load() for replica in candidates)
+        return random.choice([replica for replica in candidates if replica.load() == best])
+
+    @contextlib.contextmanager
+    def lease(self):
+        with self._lock:
+            replica = self._pick()
+            replica.outstanding += 1
+            if replica.first_request is None:
+                replica.first_request = time.monotonic()
+        lease = _Lease(replica)
+        try:
+            yield lease
+        except BaseException:
+            lease.record_failure("error")
+            raise
+        finally:
+            self._finish(lease)
+
+    @contextlib.asynccontextmanager
+    async def async_lease(self):
+        """协程版本 与lease()相同 方便和限流器写在同一个async with中"""
+        with self.lease() as lease:
+            yield lease
+
+    def _finish(self, lease):
+        replica = lease.replica
+        with self._lock:
+            replica.outstanding -= 1
+            replica.last_finish = time.monotonic()
+            if lease.failure is None:
+                replica.completed += 1
+                replica.consecutive_failures = 0
+                return
+            replica.failures += 1
+            if lease.failure not in CONGESTION_SIGNALS:
+                return
+            replica.consecutive_failures += 1
+            # 冷却结束后重新放回的副本只要再失败一次就再次摘除
+            probation = replica.ejections > 0 and replica.consecutive_failures == 1
+            if replica.consecutive_failures >= self.eject_after or probation:
+                cooldown = min(MAX_EJECT_COOLDOWN, self.eject_cooldown * (2 ** replica.ejections))
+                replica.ejected_until = time.monotonic() + cooldown
+                replica.ejections += 1
+                replica.consecutive_failures = 0
+                print(f"[{self.name}] 副本 {replica.url} 连续失败 暂时摘除 {cooldown:.0f} 秒")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = []
+            for replica in self.replicas:
+                elapsed = (replica.last_finish or now) - replica.first_request if replica.first_request else 0.0
+                stats.append({
+                    "url": replica.url,
+                    "weight": replica.weight,
+                    "outstanding": replica.outstanding,
+                    "completed": replica.completed,
+                    "failures": replica.failures,
+                    "ejected": not replica.available(now),
+                    "throughput": replica.completed / elapsed if elapsed > 0 else 0.0,
+                })
+            return stats
+
+    def summary(self):
+        lines = [f"[{self.name}] {len(self.replicas)} 个副本"]
+        for stats in self.stats():
+            state = "已摘除" if stats["ejected"] else "正常"
+            lines.append(f"  {stats['url']} 权重 {stats['weight']:g} 状态 {state} 完成 {stats['completed']} "
+                         f"失败 {stats['failures']} 在途 {stats['outstanding']} 吞吐 {stats['throughput']:.2f} 条/秒")
+        return "\n".join(lines)
+
+
+_balancers = {}
+_balancers_lock = threading.Lock()
+
+
+def get_balancer(model, endpoints):
+    """
+    按模型获取负载均衡器 model_config.json中的副本列表变化后重新创建
+    """
+    signature = tuple((endpoint["url"], endpoint.get("weight", 1.0)) for endpoint in endpoints)
+    with _balancers_lock:
+        cached = _balancers.get(model)
+        if cached is None or cached[0] != signature:
+            cached = (signature, EndpointBalancer(model, endpoints))
+            _balancers[model] = cached
+        return cached[1]
+
+
+def all_balancers():
+    with _balancers_lock:
+        return [balancer for _, balancer in _balancers.values()]
@@ -0,0 +1,146 @@
+"""
+按token预算组装prompt
+prefix_code从左边截断 suffix_code从右边截断 保留挖空位置附近的代码
+可选地把按相关性排好序的context_code文件依次塞进剩余预算 并记录最终prompt的token数
+"""
+
+import functools
+import threading
+
+from utils import utils
+
+# inference.py和create_test.py共用的默认tokenizer
+DEFAULT_TOKENIZER_PATH = "./models/models/Qwen/Qwen2.5-Coder-1.5B"
+
+# 需要在第一次推理之前通过configure_prompt_builder修改
+PROMPT_SETTINGS = {
+    "tokenizer_path": DEFAULT_TOKENIZER_PATH,
+    "max_input_token": 64,  # 单位K 实际预算为 max_input_token * 1024
+    "pack_context": False,
+    # tokenizer加载失败时是否允许按字符估算 否则直接报错 避免预算按字符数计算后prompt被过度截断
+    "allow_char_tokenizer": False,
+}
+
+_settings_lock = threading.Lock()
+
+
+class CharTokenizer:
+    """
+    tokenizer加载失败并且允许退化时的近似实现 按每4个字符一个token估算
+    提供utils.truncate_prompt需要的tokenize/convert_tokens_to_string接口
+    """
+    chars_per_token = 4
+
+    def tokenize(self, text):
+        step = self.chars_per_token
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    def convert_tokens_to_string(self, tokens):
+        return "".join(tokens)
+
+
+def configure_prompt_builder(tokenizer_path=None, max_input_token=None, pack_context=None, allow_char_tokenizer=None):
+    with _settings_lock:
+        if allow_char_tokenizer is not None:
+            PROMPT_SETTINGS["allow_char_tokenizer"] = allow_char_tokenizer
+        if tokenizer_path is not None:
+            PROMPT_SETTINGS["tokenizer_path"] = tokenizer_path
+        if max_input_token is not None:
+            PROMPT_SETTINGS["max_input_token"] = max_input_token
+        if pack_context is not None:
+            PROMPT_SETTINGS["pack_context"] = pack_context
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(tokenizer_path=None):
+    """
+    进程内每个路径只加载一次tokenizer
+    加载失败时默认抛出RuntimeError 配置了allow_char_tokenizer时才退化为按字符估算并打印警告
+    """
+    tokenizer_path = tokenizer_path or PROMPT_SETTINGS["tokenizer_path"]
+    try:
+        import transformers
+        return transformers.AutoTokenizer.from_pretrained(tokenizer_path, trust_remote_code=True)
+    except Exception as e:
+        if not PROMPT_SETTINGS["allow_char_tokenizer"]:
+            raise RuntimeError(f"加载tokenizer {tokenizer_path} 失败: {e} 请通过--tokenizer_path指定 "
+                               f"或者使用--allow_char_tokenizer按字符估算token数") from e
+        print(f"⚠️ 警告: 加载tokenizer {tokenizer_path} 失败 按每{CharTokenizer.chars_per_token}个字符一个token估算 "
+              f"prompt的截断与真实token数会有偏差: {e}")
+        return CharTokenizer()
+
+
+def count_tokens(text, tokenizer):
+    if not text:
+        return 0
+    return len(tokenizer.tokenize(text))
+
+
+def split_budget(budget, prefix_tokens, suffix_tokens):
+    """
+    把预算分给prefix和suffix 默认各一半 一边用不完的部分留给另一边
+    """
+    if prefix_tokens + suffix_tokens <= budget:
+        return prefix_tokens, suffix_tokens
+    half = budget // 2
+    if prefix_tokens <= half:
+        return prefix_tokens, budget - prefix_tokens
+    if suffix_tokens <= half:
+        return budget - suffix_tokens, suffix_tokens
+    return budget - half, half
+
+
+def format_related_files(files):
+    return "\n\n".join(f"# File: {file_name}\n{content}" for file_name, content in files)
+
+
+def pack_context_files(context_code, budget, tokenizer):
+    """
+    按顺序(已经按相关性排好序)放入完整的文件 放不下的文件跳过
+    返回放入的文件列表与消耗的token数
+    """
+    if isinstance(context_code, dict):
+        context_code = list(context_code.items())
+    packed = []
+    used = 0
+    for file_name, content in context_code or []:
+        if not content:
+            continue
+        cost = count_tokens(format_related_files([(file_name, content)]), tokenizer) + 2
+        if used + cost > budget:
+            continue
+        packed.append((file_name, content))
+        used += cost
+    return packed, used
+
+
+def fit_prompt(prefix_code, suffix_code, context_code, fixed_tokens, max_input_token=None, pack_context=None, tokenizer=None):
+    """
+    fixed_tokens: 模板、任务描述、skeleton等不可截断部分的token数
+    返回 (prefix_code, suffix_code, related_files)
+    """
+    max_input_token = max_input_token or PROMPT_SETTINGS["max_input_token"]
+    pack_context = PROMPT_SETTINGS["pack_context"] if pack_context is None else pack_context
+    tokenizer = tokenizer or get_tokenizer()
+    budget = max(0, max_input_token * 1024 - fixed_tokens)
+
+    prefix_tokens = count_tokens(prefix_code, tokenizer)
+    suffix_tokens = count_tokens(suffix_code, tokenizer)
+    prefix_budget, suffix_budget = split_budget(budget, prefix_tokens, suffix_tokens)
+    if prefix_tokens > prefix_budget:
+        # 保留靠近挖空位置的代码 即prefix的末尾与suffix的开头
+        prefix_code = utils.truncate_prompt(prefix_code, prefix_budget, tokenizer, side="left") if prefix_budget > 0 else ""
+        prefix_tokens = count_tokens(prefix_code, tokenizer)
+    if suffix_tokens > suffix_budget:
+        suffix_code = utils.truncate_prompt(suffix_code, suffix_budget, tokenizer, side="right") if suffix_budget > 0 else ""
+        suffix_tokens = count_tokens(suffix_code, tokenizer)
+
+    related_files = []
+    if pack_context:
+        related_files, _ = pack_context_files(context_code, budget - prefix_tokens - suffix_tokens, tokenizer)
+    return prefix_code, suffix_code, related_files
+
+
+def count_message_tokens(messages, tokenizer=None):
+    tokenizer = tokenizer or get_tokenizer()
+    return sum(count_tokens(message["content"], tokenizer) for message in messages)
@@ -0,0 +1,167 @@
+"""
+LLM响应的内容寻址缓存
+key为(model, endpoint, messages, temperature, 采样参数)的哈希 同样的prompt重复运行时直接返回上一次的结果
+使用sqlite存储 可以被多个线程以及inference.py / create_test.py多个进程共享 总大小超过上限时按LRU淘汰
+get/put是同步的 在事件循环中需要通过asyncio.to_thread调用
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "./cache/llm_response_cache.sqlite"
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+RESYNC_EVERY = 256  # 每写入多少次从数据库重新统计一次总大小(其他进程也可能在写)
+TOUCH_EVERY = 256  # 命中后的访问时间先记在内存中 攒够这么多条(或者下一次写入、进程退出时)再一次性写入
+
+
+class ResponseCache:
+    """
+    线程安全的磁盘响应缓存
+    命中时不立即更新last_access 淘汰之前一定会先写入 LRU的顺序不受影响
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+        self._writes = 0
+        # key -> 最近一次命中的时间 尚未写入数据库
+        self._touched = {}
+        atexit.register(self.flush)
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def make_key(model, endpoint, messages, temperature, sampling_params=None):
+        """生成缓存key 对参数做规范化序列化后取sha256"""
+        payload = json.dumps({
+            "model": model,
+            "endpoint": endpoint,
+            "messages": messages,
+            "temperature": temperature,
+            "sampling_params": sampling_params or {},
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """命中返回缓存的响应文本 未命中或缓存关闭时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_EVERY:
+                self._write_touched(conn)
+                conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """写入响应 空响应不缓存"""
+        if not self.enabled or not response:
+            return
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            self._write_touched(conn)
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            conn.commit()
+            self._total_bytes += size - (old[0] if old else 0)
+            self._writes += 1
+            if self._writes % RESYNC_EVERY == 0:
+                self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+
+    def _write_touched(self, conn):
+        """调用方持有_lock 提交由调用方负责"""
+        if self._touched:
+            conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                             [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched = {}
+
+    def flush(self):
+        """写入尚未保存的访问时间 进程退出时自动调用"""
+        with self._lock:
+            if self._conn is not None and self._touched:
+                self._write_touched(self._conn)
+                self._conn.commit()
+
+    def _evict(self, conn):
+        """按最近访问时间淘汰 直到总大小降到上限的90%以下"""
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 256").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            conn.executemany("DELETE FROM responses WHERE key = ?", [(row[0],) for row in rows])
+            self._total_bytes -= sum(row[1] for row in rows)
+            self.evictions += len(rows)
+        conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        if not self.enabled:
+            return "LLM响应缓存已关闭"
+        return f"LLM响应缓存 命中 {stats['hits']} 次 未命中 {stats['misses']} 次 命中率 {stats['hit_rate'] * 100:.2f}% 淘汰 {stats['evictions']} 条"
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def configure_response_cache(path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+    """在进程启动时配置全局缓存 需要在第一次推理之前调用"""
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = ResponseCache(path=path, max_bytes=max_bytes, enabled=enabled)
+        return _response_cache
+
+
+def get_response_cache():
+    """获取全局缓存 未配置时使用默认参数"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,222 @@
+"""
+编辑距离奖励服务 供GRPO/GSPO等强化学习训练调用
+奖励与calculate_ed.py中的edit_distance一致: 提取代码 -> 去注释 -> tokenizer分词 -> 归一化编辑相似度
+worker进程在启动时加载tokenizer 请求按块分发到进程池 块内批量分词
+
+启动:
+    python reward_server.py --port 8100 --workers 8
+    python reward_server.py --unix_socket /tmp/reward.sock
+请求:
+    POST /reward {"items": [{"reference": "...", "completion": "...", "language": "python"}], "extract": true}
+    返回 {"rewards": [0.0~1.0], "edit_distance": [0~100], "errors": [null或错误信息]}
+    extract为false或单条item中"raw": true时 completion直接作为代码 不从markdown中提取
+    无法计算的样本reward为0.0 并在errors中给出原因
+    GET /health 健康检查  GET /stats 请求统计
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8100
+DEFAULT_CHUNK_SIZE = 32
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+# worker进程内的计算器 由_init_worker加载
+_calculator = None
+
+
+def _init_worker():
+    global _calculator
+    # 已经按进程并行 关闭tokenizers自带的线程池
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    from calculate import similarity
+    _calculator = similarity.SimilarityCalculator()
+
+
+def score_items(task):
+    """
+    task: (items, extract) 返回 [(reward, edit_distance, error)] 与items顺序一致
+    """
+    from calculate.similarity import extract_code
+    items, extract = task
+    results = [None] * len(items)
+    pairs, positions = [], []
+    for index, item in enumerate(items):
+        try:
+            reference = item["reference"]
+            completion = item.get("completion") or ""
+            language = item.get("language", "python")
+        except (KeyError, TypeError, AttributeError) as e:
+            results[index] = (0.0, None, f"请求格式错误: {e}")
+            continue
+        predict_code = completion if (not extract or item.get("raw")) else extract_code(completion, language)
+        if not reference:
+            results[index] = (0.0, None, "reference为空")
+        elif not predict_code:
+            results[index] = (0.0, None, "没有从completion中提取到代码")
+        else:
+            pairs.append((reference, predict_code, language))
+            positions.append(index)
+    for index, info in zip(positions, _calculator.calculate_edit_distance_batch(pairs)):
+        if isinstance(info, Exception):
+            results[index] = (0.0, None, f"计算出错: {info}")
+        else:
+            results[index] = (info["edit_distance"] / 100, info["edit_distance"], None)
+    return results
+
+
+class RewardService:
+    """
+    进程池在服务启动前创建 HTTP线程只负责收发请求 计算都在worker进程中完成
+    """
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.requests = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+        self._stats_lock = threading.Lock()
+        self._pool = mp.get_context("fork").Pool(self.workers, initializer=_init_worker)
+
+    def score(self, items, extract=True):
+        start = time.time()
+        # 按块分发 块数不少于worker数时才能用满所有进程
+        chunk_size = max(1, min(self.chunk_size, -(-len(items) // self.workers)))
+        tasks = [(items[i:i + chunk_size], extract) for i in range(0, len(items), chunk_size)]
+        results = []
+        for chunk_results in self._pool.map(score_items, tasks):
+            results.extend(chunk_results)
+        with self._stats_lock:
+            self.requests += 1
+            self.items += len(items)
+            self.busy_seconds += time.time() - start
+        return results
+
+    def stats(self):
+        with self._stats_lock:
+            uptime = time.time() - self.started_at
+            return {
+                "workers": self.workers,
+                "requests": self.requests,
+                "items": self.items,
+                "uptime": round(uptime, 1),
+                "items_per_second": round(self.items / uptime, 1) if uptime > 0 else 0.0,
+                "avg_request_seconds": round(self.busy_seconds / self.requests, 4) if self.requests else 0.0,
+            }
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+
+class RewardHandler(BaseHTTPRequestHandler):
+    service = None
+    verbose = False
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # unix socket的client_address为空字符串
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {"error": f"未知路径 {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/reward":
+            self._send_json(404, {"error": f"未知路径 {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length <= 0 or length > MAX_BODY_BYTES:
+                self._send_json(400, {"error": f"请求体大小不合法: {length}"})
+                return
+            payload = json.loads(self.rfile.read(length))
+            items = payload["items"]
+            if not isinstance(items, list):
+                raise TypeError("items需要是列表")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"请求格式错误: {e}"})
+            return
+        try:
+            results = self.service.score(items, extract=payload.get("extract", True))
+        except Exception as e:
+            self._send_json(500, {"error": f"计算出错: {e}"})
+            return
+        self._send_json(200, {
+            "rewards": [reward for reward, _, _ in results],
+            "edit_distance": [edit_distance for _, edit_distance, _ in results],
+            "errors": [error for _, _, error in results],
+        })
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="编辑距离奖励服务")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--unix_socket", type=str, default=None, help="使用unix socket监听 指定后忽略host和port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="打分进程数 默认为CPU核数")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE, help="每个任务块的最大样本数")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求的访问日志")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # 先创建进程池再启动HTTP线程 避免在多线程状态下fork
+    service = RewardService(workers=args.workers, chunk_size=args.chunk_size)
+    RewardHandler.service = service
+    # kill发送的SIGTERM按正常退出处理 关闭进程池并删除unix socket文件 在创建进程池之后设置 worker不继承
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    RewardHandler.verbose = args.verbose
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = ThreadingUnixHTTPServer(args.unix_socket, RewardHandler)
+        address = f"unix:{args.unix_socket}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), RewardHandler)
+        address = f"http://{args.host}:{args.port}"
+    print(f"🚀 奖励服务已启动 {address} worker数 {service.workers}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("收到中断信号 正在退出")
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
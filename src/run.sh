@@ -1,6 +1,7 @@
 #!/bin/bash
 
 default_model="DeepSeek-V3"
+fresh=false
 
 # 解析命令行参数
 while [[ $# -gt 0 ]]; do
@@ -9,9 +10,14 @@ while [[ $# -gt 0 ]]; do
             model="$2"
             shift 2
             ;; # break 
+        --fresh)
+            fresh=true
+            shift
+            ;;
         -h|--help)
-            echo "Usage: $0 [--model MODEL_NAME]"
+            echo "Usage: $0 [--model MODEL_NAME] [--fresh]"
             echo "  --model MODEL_NAME           指定要使用的模型 (默认: $default_model)"
+            echo "  --fresh                      删除已有的推理结果重新开始 (默认从checkpoint继续)"
             echo "  -h, --help                   显示此帮助信息"
             exit 0
             ;;
@@ -40,20 +46,21 @@ languages=("c" "c_sharp" "cpp" "go" "java" "php" "python" "javascript" "kotlin"
 start_time=$(date +%s)
 
 echo "Task started at $(date)"
-# 遍历 languages 进行测试数据集的推理
-for language in "${languages[@]}"; do
-    rm -rf ./result/$language/$model
-    echo "已删除原来的result目录  Processing $language/$model - inference"
-    python3 inference.py --language $language --model $model
-done
+if [ "$fresh" = true ]; then
+    for language in "${languages[@]}"; do
+        rm -rf ./result/$language/$model
+    done
+    echo "已删除原来的result目录"
+fi
 
-languages=("c" "c_sharp" "cpp" "go" "java" "php" "python" "javascript" "kotlin" "lua" "r" "rust" "scala" "typescript" "swift" "zig" "verilog" "html")
+# 所有语言在同一个推理进程中共用一个全局队列
+language_list=$(IFS=,; echo "${languages[*]}")
+echo "Processing $language_list/$model - inference"
+python3 inference.py --language $language_list --model $model
 
-# 遍历 languages 进行测试数据集的计算编辑距离
-for language in "${languages[@]}"; do
-    echo "Processing $language - calculate edit distance"
-    python3 calculate_ed.py --language $language --model $model
-done
+# 所有语言在同一个进程中计算编辑距离 tokenizer只加载一次
+echo "Processing $language_list - calculate edit distance"
+python3 calculate_ed.py --language $language_list --model $model
 
 # 画图
 echo "推理&编辑距离计算完成 开始画图"
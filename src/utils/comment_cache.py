@@ -0,0 +1,209 @@
+"""
+remove_comments结果的进程内缓存
+同一段代码在采样、建任务、算编辑距离时会被反复去注释 key为(内容哈希, 语言, remove_blank_line)
+内存中按LRU保存 总大小按字节计算 超过上限时淘汰最久未使用的条目
+配置了path时同时写入sqlite 下一个流程(create_test.py -> calculate_ed.py)或者下一次运行可以直接读取
+sqlite的表名带有STRIPPER_VERSION 去注释规则改变后旧的结果不会再被读到
+"""
+
+import atexit
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from create.parser_factory import normalize_language
+
+# 内存缓存的总大小 calculate_ed的打分进程池中每个worker有一份独立的缓存 总大小按进程数平分
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHE_PATH = "./cache/comment_cache.sqlite"
+# remove_comments输出规则的版本 修改去注释逻辑或者language_symbols中的COMMENT_TYPE后加1
+# 持久化的去注释结果(这里的sqlite和calculate.reference_cache)都按版本区分
+# 2: tree-sitter一次解析 语法树有错误的片段回到正则+tree-sitter的路径
+STRIPPER_VERSION = 2
+# 新结果攒够这么多条再一次性写入sqlite
+FLUSH_EVERY = 256
+
+
+def make_key(code, language, remove_blank_line):
+    """c++/cpp、c#/c_sharp等别名共用同一个key"""
+    digest = hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+    return digest, normalize_language(language), bool(remove_blank_line)
+
+
+class CommentCache:
+    """
+    线程安全 去注释本身在锁外计算 同一段代码被多个线程同时计算时结果相同 后写入的覆盖先写入的
+    内存中的LRU和sqlite各用一把锁 读写sqlite时不阻塞其他线程的内存命中 写入按FLUSH_EVERY条批量提交
+    """
+    TABLE = f"comments_v{STRIPPER_VERSION}"
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None, enabled=True):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.enabled = enabled
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._lock = threading.Lock()
+        # 保护sqlite连接和尚未写入的结果
+        self._db_lock = threading.Lock()
+        self._pending = []
+        self._conn = None
+        self._conn_pid = None
+        if path:
+            atexit.register(self.flush)
+
+    def _connect(self):
+        """调用方持有_db_lock sqlite连接不能跨进程使用 fork之后在子进程中重新连接"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # 缓存可以重建 不需要每次提交都落盘
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                "digest BLOB NOT NULL, language TEXT NOT NULL, remove_blank_line INTEGER NOT NULL, result TEXT NOT NULL, "
+                "PRIMARY KEY (digest, language, remove_blank_line))"
+            )
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key, result):
+        """调用方持有锁"""
+        size = sys.getsizeof(result)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self._entries[key] = (result, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, key):
+        """命中返回去注释后的代码 否则返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        row = None
+        if self.path:
+            with self._db_lock:
+                row = self._connect().execute(
+                    f"SELECT result FROM {self.TABLE} WHERE digest = ? AND language = ? AND remove_blank_line = ?",
+                    (key[0], key[1], int(key[2])),
+                ).fetchone()
+        with self._lock:
+            if row is not None:
+                self._remember(key, row[0])
+                self.disk_hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remember(key, result)
+        if self.path:
+            with self._db_lock:
+                self._pending.append((key[0], key[1], int(key[2]), result))
+                if len(self._pending) >= FLUSH_EVERY:
+                    self._write_pending()
+
+    def _write_pending(self):
+        """调用方持有_db_lock"""
+        if not self._pending:
+            return
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {self.TABLE} (digest, language, remove_blank_line, result) VALUES (?, ?, ?, ?)",
+            self._pending,
+        )
+        conn.commit()
+        self._pending = []
+
+    def flush(self):
+        """把尚未写入的结果写入sqlite 进程退出时自动调用 进程池的worker在每个任务结束时调用"""
+        if not self.path:
+            return
+        with self._db_lock:
+            self._write_pending()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "evictions": self.evictions,
+            }
+
+    def summary(self, stats=None):
+        if not self.enabled:
+            return "去注释缓存已关闭"
+        return format_summary(stats or self.stats())
+
+
+def format_summary(stats):
+    """stats可以是多个进程stats()相加的结果"""
+    total = stats["hits"] + stats["disk_hits"] + stats["misses"]
+    hit_rate = (stats["hits"] + stats["disk_hits"]) / total if total else 0.0
+    return (f"去注释缓存 命中 {stats['hits']} 次 磁盘命中 {stats['disk_hits']} 次 未命中 {stats['misses']} 次 "
+            f"命中率 {hit_rate * 100:.2f}% 淘汰 {stats['evictions']} 条")
+
+
+def merge_stats(stats_list):
+    """合并多个进程的统计"""
+    merged = {"hits": 0, "disk_hits": 0, "misses": 0, "entries": 0, "bytes": 0, "evictions": 0}
+    for stats in stats_list:
+        for key in merged:
+            merged[key] += stats.get(key, 0)
+    total = merged["hits"] + merged["disk_hits"] + merged["misses"]
+    merged["hit_rate"] = round((merged["hits"] + merged["disk_hits"]) / total, 4) if total else 0.0
+    return merged
+
+
+_comment_cache = None
+_comment_cache_lock = threading.Lock()
+
+
+def configure_comment_cache(max_bytes=DEFAULT_MAX_BYTES, path=None, enabled=True, processes=1):
+    """
+    在进程启动时配置全局缓存 path为None时只在内存中缓存
+    max_bytes是所有进程合计的上限 之后会fork出processes个各自缓存的进程时 每个进程使用max_bytes // processes
+    """
+    global _comment_cache
+    with _comment_cache_lock:
+        _comment_cache = CommentCache(max_bytes=max_bytes // max(1, processes), path=path, enabled=enabled)
+        return _comment_cache
+
+
+def get_comment_cache():
+    """获取全局缓存 未配置时只使用默认大小的内存缓存"""
+    global _comment_cache
+    if _comment_cache is None:
+        with _comment_cache_lock:
+            if _comment_cache is None:
+                _comment_cache = CommentCache()
+    return _comment_cache
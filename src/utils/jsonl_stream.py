@@ -0,0 +1,137 @@
+"""
+流式JSONL读写
+读取、变换、写出都基于生成器 任何时候内存中只有当前处理的记录 与文件大小无关
+安装了orjson时使用orjson解析和序列化 否则退化为标准库json
+两种情况下输出的都是紧凑格式(逗号和冒号后没有空格 非ASCII字符不转义) 与orjson的输出逐字节相同
+与原来json.dumps(ensure_ascii=False)的默认格式只差分隔符后的空格 解析后的内容相同 但不是逐字节相同
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 标准库json使用与orjson相同的紧凑分隔符
+SEPARATORS = (",", ":")
+
+
+def loads(data):
+    """data可以是str或bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson不支持的类型(超过64位的整数等)交给标准库处理
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=SEPARATORS).encode("utf-8")
+
+
+def dumps(obj):
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def iter_lines(path):
+    """
+    逐行读取 跳过空行 返回 (行号, 去掉首尾空白的bytes)
+    """
+    with open(path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield line_num, line
+
+
+def read_jsonl(path, skip_invalid=True):
+    """
+    逐条返回记录 skip_invalid为True时跳过无法解析的行并打印警告 否则抛出异常
+    """
+    for line_num, line in iter_lines(path):
+        try:
+            yield loads(line)
+        except ValueError as e:
+            if not skip_invalid:
+                raise
+            print(f"警告：{path} 第{line_num}行JSON解析失败: {e}")
+
+
+def count_jsonl(path):
+    """非空行数 不解析内容"""
+    return sum(1 for _ in iter_lines(path))
+
+
+class JsonlWriter:
+    """
+    逐条写出 atomic为True时先写临时文件 正常退出with块后再原子替换目标文件
+    with块内抛出异常时删除临时文件 原来的输出保持不变
+    """
+    def __init__(self, path, atomic=True, fsync=False):
+        self.path = str(path)
+        self.atomic = atomic
+        self.fsync = fsync
+        self.count = 0
+        self._write_path = f"{self.path}.tmp" if atomic else self.path
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self._write_path, 'wb')
+        return self
+
+    def write(self, record):
+        self.write_raw(dumps_bytes(record))
+
+    def write_raw(self, line):
+        """写入已经序列化好的一行 str或bytes 不需要带换行符"""
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        self._file.write(line)
+        self._file.write(b'\n')
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if not self.atomic:
+            return
+        if exc_type is None:
+            os.replace(self._write_path, self.path)
+        elif os.path.exists(self._write_path):
+            os.remove(self._write_path)
+
+
+def write_jsonl(records, path, atomic=True, fsync=False):
+    """records可以是任意可迭代对象(包括生成器) 返回写出的条数"""
+    with JsonlWriter(path, atomic=atomic, fsync=fsync) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+
+def transform_jsonl(input_path, output_path, func, skip_invalid=True):
+    """
+    逐条读取并变换 func(record)返回新记录 返回None表示丢弃该记录
+    返回 (读取的条数, 写出的条数)
+    """
+    read = 0
+
+    def records():
+        nonlocal read
+        for record in read_jsonl(input_path, skip_invalid=skip_invalid):
+            read += 1
+            result = func(record)
+            if result is not None:
+                yield result
+
+    written = write_jsonl(records(), output_path)
+    return read, written
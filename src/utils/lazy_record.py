@@ -0,0 +1,222 @@
+"""
+按需解析的JSONL记录
+bench中的每条记录都带着整个仓库的context_code 打分和checkpoint只需要其中几个字段
+LazyRecord只扫描JSON的结构找到各个字段在原始bytes中的位置 只解析被访问的字段
+写出时没有修改过的字段直接拷贝原始bytes 不需要解码再编码
+写出的顶层分隔符和新值与jsonl_stream.dumps_bytes一样是紧凑格式 没有修改过的字段保留输入中的原始格式
+输入本身是紧凑格式时(例如由jsonl_stream写出) 扫描和完整解析两种方式的输出逐字节相同
+orjson解析整行比在Python中扫描结构更快 安装了orjson时默认直接完整解析 接口不变
+
+    record = LazyRecord(line)
+    record.get("inference_info.middle_code")   # 只解析inference_info中的middle_code
+    record["editdistance_info"] = {...}          # 新增或替换顶层字段
+    record.to_bytes()                            # 其余字段原样输出
+"""
+
+import re
+
+from utils import jsonl_stream
+
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+_STRUCTURE = re.compile(rb'["\[\]{}]')
+_SCALAR_END = re.compile(rb'[,}\] \t\r\n]')
+
+_OPEN = (0x5b, 0x7b)  # [ {
+_QUOTE = 0x22
+_LEFT_BRACE = 0x7b
+_RIGHT_BRACE = 0x7d
+_COLON = 0x3a
+_COMMA = 0x2c
+
+_MISSING = object()
+
+
+def mask_escapes(raw):
+    """
+    把转义的反斜杠和转义的引号替换成等长的普通字符 之后剩下的引号都是字符串的边界
+    位置与原文一一对应 扫描在掩码上进行 字符串整段用bytes.find跳过 不需要逐个字符检查转义
+    """
+    if b'\\' not in raw:
+        return raw
+    # 反斜杠只出现在字符串的转义序列中 从左到右先替换转义的反斜杠不会拆开任何转义序列
+    return raw.replace(b'\\\\', b'__').replace(b'\\"', b'__')
+
+
+def _skip_whitespace(masked, pos):
+    return _WHITESPACE.match(masked, pos).end()
+
+
+def _skip_string(masked, pos):
+    """pos指向开头的引号 返回结尾引号之后的位置"""
+    end = masked.find(b'"', pos + 1)
+    if end < 0:
+        raise ValueError(f"位置 {pos} 的字符串没有结束")
+    return end + 1
+
+
+def _skip_value(masked, pos):
+    """返回从pos开始的JSON值结束的位置 对象和数组只匹配括号 不解析内容"""
+    first = masked[pos]
+    if first == _QUOTE:
+        return _skip_string(masked, pos)
+    if first in _OPEN:
+        depth = 0
+        index = pos
+        while True:
+            match = _STRUCTURE.search(masked, index)
+            if match is None:
+                raise ValueError(f"位置 {pos} 的对象或数组没有结束")
+            index = match.start()
+            char = masked[index]
+            if char == _QUOTE:
+                index = _skip_string(masked, index)
+                continue
+            depth += 1 if char in _OPEN else -1
+            index += 1
+            if depth == 0:
+                return index
+    match = _SCALAR_END.search(masked, pos)
+    return match.start() if match else len(masked)
+
+
+def split_object(raw, start=0, masked=None):
+    """
+    扫描raw[start:]处的JSON对象的第一层 返回 [(key, 值开始位置, 值结束位置)] 顺序与原文一致
+    masked为mask_escapes(raw)的结果 多次扫描同一行时传入以避免重复计算
+    """
+    if masked is None:
+        masked = mask_escapes(raw)
+    index = _skip_whitespace(masked, start)
+    if index >= len(masked) or masked[index] != _LEFT_BRACE:
+        raise ValueError(f"位置 {index} 不是JSON对象")
+    index = _skip_whitespace(masked, index + 1)
+    fields = []
+    if masked[index] == _RIGHT_BRACE:
+        return fields
+    while True:
+        key_end = _skip_string(masked, index)
+        key = jsonl_stream.loads(raw[index:key_end])
+        index = _skip_whitespace(masked, key_end)
+        if masked[index] != _COLON:
+            raise ValueError(f"位置 {index} 缺少冒号")
+        value_start = _skip_whitespace(masked, index + 1)
+        value_end = _skip_value(masked, value_start)
+        fields.append((key, value_start, value_end))
+        index = _skip_whitespace(masked, value_end)
+        if masked[index] == _COMMA:
+            index = _skip_whitespace(masked, index + 1)
+            continue
+        if masked[index] == _RIGHT_BRACE:
+            return fields
+        raise ValueError(f"位置 {index} 缺少逗号或右括号")
+
+
+def _walk(value, keys, default):
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
+
+
+class LazyRecord:
+    """
+    一行JSON对象的惰性视图 get的用法与dict.get一致 并支持用.分隔的嵌套路径
+    scan为None时只在没有安装orjson时按需扫描
+    """
+    def __init__(self, raw, scan=None):
+        self.raw = bytes(raw).strip()
+        self.scan = jsonl_stream.orjson is None if scan is None else scan
+        self._data = None  # 不扫描时完整解析的结果
+        self._masked = None
+        self._objects = {}  # 路径前缀 -> {key: (start, end)}
+        self._values = {}  # 路径 -> 已经解析的值
+        self._updates = {}  # 顶层字段 -> 新值
+
+    def _parsed(self):
+        if self._data is None:
+            self._data = jsonl_stream.loads(self.raw)
+        return self._data
+
+    def _object_fields(self, prefix, start):
+        fields = self._objects.get(prefix)
+        if fields is None:
+            if self._masked is None:
+                self._masked = mask_escapes(self.raw)
+            fields = {key: (value_start, value_end) for key, value_start, value_end in split_object(self.raw, start, self._masked)}
+            self._objects[prefix] = fields
+        return fields
+
+    def _locate(self, path):
+        """返回路径对应的值在raw中的位置 不存在时返回None"""
+        keys = path.split(".")
+        start, prefix = 0, ""
+        for depth, key in enumerate(keys):
+            if self.raw[_skip_whitespace(self.raw, start)] != _LEFT_BRACE:
+                return None
+            location = self._object_fields(prefix, start).get(key)
+            if location is None:
+                return None
+            if depth == len(keys) - 1:
+                return location
+            start = location[0]
+            prefix = f"{prefix}.{key}" if prefix else key
+        return None
+
+    def get(self, path, default=None):
+        keys = path.split(".")
+        if keys[0] in self._updates:
+            return _walk(self._updates[keys[0]], keys[1:], default)
+        if not self.scan:
+            return _walk(self._parsed(), keys, default)
+        value = self._values.get(path, _MISSING)
+        if value is _MISSING:
+            location = self._locate(path)
+            if location is None:
+                return default
+            value = jsonl_stream.loads(self.raw[location[0]:location[1]])
+            self._values[path] = value
+        return value
+
+    def raw_field(self, key):
+        """顶层字段的原始bytes 不存在时返回None"""
+        location = self._object_fields("", 0).get(key)
+        return None if location is None else self.raw[location[0]:location[1]]
+
+    def keys(self):
+        keys = list(self._object_fields("", 0) if self.scan else self._parsed())
+        return keys + [key for key in self._updates if key not in keys]
+
+    def __contains__(self, key):
+        return key in self._updates or key in (self._object_fields("", 0) if self.scan else self._parsed())
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        """新增或替换顶层字段 已有的字段保持原来的位置 新字段追加在最后"""
+        self._updates[key] = value
+
+    def to_dict(self):
+        """完整解析 需要修改嵌套字段或者把记录交给其他代码时使用"""
+        data = dict(self._parsed())
+        data.update(self._updates)
+        return data
+
+    def to_bytes(self):
+        if not self._updates:
+            return self.raw
+        if not self.scan:
+            return jsonl_stream.dumps_bytes(self.to_dict())
+        fields = self._object_fields("", 0)
+        parts = []
+        for key, (start, end) in fields.items():
+            value = jsonl_stream.dumps_bytes(self._updates[key]) if key in self._updates else self.raw[start:end]
+            parts.append(jsonl_stream.dumps_bytes(key) + b':' + value)
+        for key, value in self._updates.items():
+            if key not in fields:
+                parts.append(jsonl_stream.dumps_bytes(key) + b':' + jsonl_stream.dumps_bytes(value))
+        return b'{' + b','.join(parts) + b'}'
@@ -1,6 +1,5 @@
 import jsonlines
 import glob
-import pandas as pd
 import os
 import math
 import multiprocessing as mp
@@ -20,10 +19,13 @@ import subprocess
 import hashlib
 import random
 import string
-import tree_sitter_language_pack as tree_sitter_languages
 import io
 import importlib
 from fuzzywuzzy import fuzz
+from utils import comment_cache
+from utils import jsonl_stream
+from create.parser_factory import get_parser, normalize_language
+from create.node_tables import get_node_table
 language_symbols = {
     "python": {
         "CLASS_TYPE": ["class_definition"],
@@ -78,7 +80,7 @@ language_symbols = {
         "ATTRIBUTE_TYPE": ["simple_name", "qualified_name"],
         "EXPRESSION_STATEMENT_TYPE": ["expression_statement"],
         "ASSIGNMENT_STATEMENT_TYPE": ["local_declaration_statement", "assignment_expression"],
-        "COMMENT_TYPE": ["single_line_comment", "multi_line_comment", "documentation_comment"],
+        "COMMENT_TYPE": ["comment", "single_line_comment", "multi_line_comment", "documentation_comment"],
         "IF_STATEMENT_TYPE": ["if_statement"],
         "FOR_STATEMENT_TYPE": ["for_statement", "foreach_statement"],
         "WHILE_STATEMENT_TYPE": ["while_statement", "try_statement", "catch_clause", "finally_clause", "block", "namespace_declaration", "declaration_list"],
@@ -429,7 +431,7 @@ language_symbols = {
         "ATTRIBUTE_TYPE": ["FieldOrFnCall", "SuffixOp"],  # 字段访问和后缀操作
         "EXPRESSION_STATEMENT_TYPE": ["Statement", "AssignExpr"],
         "ASSIGNMENT_STATEMENT_TYPE": ["VarDecl", "AssignExpr"],  # 变量声明和赋值表达式
-        "COMMENT_TYPE": ["line_comment", "comment"],
+        "COMMENT_TYPE": ["line_comment", "comment", "doc_comment", "container_doc_comment"],
         "IF_STATEMENT_TYPE": ["IfStatement"],
         "FOR_STATEMENT_TYPE": ["for_statement"],
         "WHILE_STATEMENT_TYPE": ["while_statement"],
@@ -700,15 +702,6 @@ def multi_read_with_filter(file_name = 'example.txt', workers = 32, chunk_size =
     print(f"Successfully Loading from {file_name}: {len(output_objs)} samples")
     return output_objs
 
-def read_jsonl_file(file_name, max_sentence=None):
-    data = []
-    with jsonlines.open(file_name, "r") as r:
-        for i, obj in tqdm.tqdm(enumerate(r)):
-            if max_sentence is not None and i >= max_sentence:
-                return data
-            data.append(obj)
-    return data
-
 def safe_read_jsonl_file(file_name, max_sentence=None):
     data = []
     with open(file_name, "r", encoding="utf-8", errors="ignore") as r:
@@ -753,15 +746,6 @@ def copy_src_to_dest(src_dir, tgt_dir, cur):
     subprocess.run(["cp", "-r", source_dir, target_dir])
 
 
-def read_jsonl_file(file_name, max_sentence=None):
-    data = []
-    with jsonlines.open(file_name, "r") as r:
-        for i, obj in tqdm.tqdm(enumerate(r)):
-            if max_sentence is not None and i >= max_sentence:
-                return data
-            data.append(obj)
-    return data
-
 
 def sentence_jaccard_similarity(sentence1, sentence2):
     def tokenize(sentence):
@@ -860,7 +844,12 @@ def cal_edit_sim(references, hypotheses):
 
 def remove_comments(code, language, remove_blank_line=True):
     """
-    移除代码中的注释，结合正则表达式预处理和tree-sitter补充处理
+    移除代码中的注释 tree-sitter解析一次 收集注释的位置后一次性拼接保留的部分
+    Python的文档字符串(单独成句的三引号字符串)也视为注释
+    语法树中有错误节点时(middle_code、预测结果等代码片段 例如从文档字符串中间开始的片段)注释节点不可靠
+    这时与原来的实现相同: 先用正则去注释 再用tree-sitter去掉剩下的注释节点
+    语言没有注释类型定义或者tree-sitter解析失败时同样使用这条路径
+    结果按(内容哈希, 语言, remove_blank_line)缓存 见utils.comment_cache
     
     Args:
         code (str): 源代码
@@ -873,78 +862,99 @@ def remove_comments(code, language, remove_blank_line=True):
     if not code or not code.strip():
         return code
     
+    cache = comment_cache.get_comment_cache()
+    key = comment_cache.make_key(code, language, remove_blank_line)
+    result = cache.get(key)
+    if result is None:
+        result = _remove_comments_uncached(code, language, remove_blank_line)
+        cache.put(key, result)
+    return result
+
+def _remove_comments_uncached(code, language, remove_blank_line):
     try:
-        # 第一步：使用正则表达式移除常见注释模式
-        code_after_regex = _remove_comments_regex_comprehensive(code, language)
-        
-        # 第二步：使用tree-sitter进行补充处理
+        language = normalize_language(language)
         try:
-            
-            # 语言名称标准化（参考create_test_repo.py的处理方式）
-            language = language.lower()
-            if language == "c++":
-                language = "cpp"
-            elif language == "c#":
-                language = "c_sharp"
-            
-            # 获取语言对应的注释类型
-            if language in language_symbols:
-                comment_types = language_symbols[language].get('COMMENT_TYPE', [])
-                if isinstance(comment_types, str):
-                    comment_types = [comment_types]
-                
-                if comment_types:
-                    code_bytes = bytes(code_after_regex, "utf8")
-                    tree = None
-                    
-                    # 根据create_test_repo.py的方式处理解析器
-                    if language == "c_sharp":
-                        import tree_sitter_c_sharp as tscsharp
-                        from tree_sitter import Language, Parser
-                        CSHARP_LANGUAGE = Language(tscsharp.language())
-                        parser = Parser(CSHARP_LANGUAGE)
-                        tree = parser.parse(code_bytes)
-                    else:
-                        parser = tree_sitter_languages.get_parser(language)
-                        tree = parser.parse(code_bytes)
-                    
-                    if tree:
-                        root_node = tree.root_node
-                        
-                        # 收集所有注释节点的位置
-                        comment_ranges = []
-                        for node in traverse_tree(root_node):
-                            if node.type in comment_types:
-                                comment_ranges.append((node.start_byte, node.end_byte))
-                        
-                        # 按位置倒序排列，从后往前删除，避免位置偏移
-                        comment_ranges.sort(key=lambda x: x[0], reverse=True)
-                        
-                        # 移除注释
-                        code_bytes = code_after_regex.encode('utf8')
-                        for start_byte, end_byte in comment_ranges:
-                            code_bytes = code_bytes[:start_byte] + code_bytes[end_byte:]
-                        
-                        code_after_regex = code_bytes.decode('utf8')
-        
+            code_without_comments = _remove_comments_tree_sitter(code, language)
         except Exception as e:
-            # tree-sitter处理失败，继续使用正则表达式的结果
             print(f"Tree-sitter processing failed for {language}: {e}")
-            pass
+            code_without_comments = None
+        if code_without_comments is None:
+            code_without_comments = _remove_comments_regex_comprehensive(code, language)
+            try:
+                # 正则的结果中剩下的注释节点 与原来的实现一样不处理文档字符串 语法树有错误时也照常删除
+                stripped = _remove_comments_tree_sitter(code_without_comments, language, docstrings=False, allow_errors=True)
+            except Exception as e:
+                print(f"Tree-sitter processing failed for {language}: {e}")
+                stripped = None
+            if stripped is not None:
+                code_without_comments = stripped
         
-        # 第三步：移除空白行（如果需要）
+        # 移除空白行（如果需要）
         if remove_blank_line:
-            lines = code_after_regex.split('\n')
+            lines = code_without_comments.split('\n')
             non_empty_lines = [line for line in lines if line.strip()]
-            code_after_regex = '\n'.join(non_empty_lines)
+            code_without_comments = '\n'.join(non_empty_lines)
         
-        return code_after_regex
+        return code_without_comments
         
     except Exception as e:
         print(f"Error in remove_comments: {e}")
         # 如果所有方法都失败，返回原始代码
         return code
 
+def _is_python_docstring(node):
+    """单独成句的三引号字符串"""
+    if node.named_child_count != 1:
+        return False
+    child = node.named_children[0]
+    if child.type != "string":
+        return False
+    quote = child.text.lstrip(b"rRbBuUfF")[:3]
+    return quote == b'"""' or quote == b"'''"
+
+def _comment_spans(root_node, comment_ids, docstring_ids=frozenset()):
+    """
+    先序遍历一次语法树 返回按位置排列且互不重叠的注释区间 [(start_byte, end_byte)]
+    按node.kind_id查表判断注释 docstring_ids非空时其中单独成句的三引号字符串也算注释
+    注释节点的子节点不再访问
+    """
+    spans = []
+    cursor = root_node.walk()
+    while True:
+        node = cursor.node
+        kind_id = node.kind_id
+        if kind_id in comment_ids or (kind_id in docstring_ids and _is_python_docstring(node)):
+            spans.append((node.start_byte, node.end_byte))
+        elif cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return spans
+
+def _remove_comments_tree_sitter(code, language, docstrings=True, allow_errors=False):
+    """
+    返回去掉注释后的代码 语言没有注释类型定义时返回None
+    语法树中有错误节点时返回None allow_errors为True时除外
+    """
+    if not language_symbols.get(language, {}).get('COMMENT_TYPE'):
+        return None
+    table = get_node_table(language)
+    docstring_ids = table.ids_for("expression_statement") if docstrings and language == "python" else frozenset()
+    code_bytes = bytes(code, "utf8")
+    tree = get_parser(language).parse(code_bytes)
+    if tree.root_node.has_error and not allow_errors:
+        return None
+    spans = _comment_spans(tree.root_node, table.kind_ids["COMMENT_TYPE"], docstring_ids)
+    if not spans:
+        return code
+    kept = []
+    last_end = 0
+    for start_byte, end_byte in spans:
+        kept.append(code_bytes[last_end:start_byte])
+        last_end = end_byte
+    kept.append(code_bytes[last_end:])
+    return b"".join(kept).decode("utf8")
+
 def _remove_comments_regex_comprehensive(code, language):
     """
     使用正则表达式移除常见的注释模式
@@ -1055,22 +1065,14 @@ def multi_tasks_from_objs(objs, workers = 64, task=None, chunk_size=None, args=N
         output_objs.extend(result.get())
     return output_objs
 
-def read_jsonl_file(file_path):
+def read_jsonl_file(file_path, max_sentence=None):
     """
     读取JSONL文件，返回包含所有数据的列表
+    大文件请直接使用jsonl_stream.read_jsonl逐条处理 不要一次性读入内存
     """
-    data = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            for line_num, line in enumerate(file, 1):
-                line = line.strip()
-                if line:  # 跳过空行
-                    try:
-                        json_obj = json.loads(line)
-                        data.append(json_obj)
-                    except json.JSONDecodeError as e:
-                        print(f"警告：第{line_num}行JSON解析失败: {e}")
-                        continue
+        records = jsonl_stream.read_jsonl(file_path)
+        data = list(itertools.islice(records, max_sentence))
         print(f"成功读取 {len(data)} 条记录从 {file_path}")
         return data
     except FileNotFoundError:
@@ -1082,13 +1084,10 @@ def read_jsonl_file(file_path):
 
 def save_results_to_jsonl(results, output_path):
     """
-    将结果保存到JSONL文件
+    将结果保存到JSONL文件 results可以是生成器
     """
     try:
-        with open(output_path, 'w', encoding='utf-8') as file:
-            for result in results:
-                json_line = json.dumps(result, ensure_ascii=False)
-                file.write(json_line + '\n')
+        jsonl_stream.write_jsonl(results, output_path, atomic=False)
         print(f"结果已保存到 {output_path}")
     except Exception as e:
         print(f"保存结果时发生错误: {e}")
@@ -1135,10 +1134,8 @@ def has_return_statement(node, node_types):
 
 def extract_imports(code, language="python"):
     code_bytes = bytes(code, "utf8")
-    parser = tree_sitter_languages.get_parser(language)
-    tree = parser.parse(code_bytes)
+    tree = get_parser(language).parse(code_bytes)
     root_node = tree.root_node
-    parser = tree_sitter_languages.get_parser(language)
     imports = []
     all_nodes = list(traverse_tree(root_node))
     for child in all_nodes:
@@ -1240,7 +1237,7 @@ def extract_cpp_function_info(node, code_bytes):
 
 def merge_header_and_cpp(header_code, cpp_code, class_name=None):
     """合并头文件和实现文件，生成完整的类"""
-    parser = tree_sitter_languages.get_parser("cpp")
+    parser = get_parser("cpp")
     
     # 解析头文件
     header_bytes = bytes(header_code, "utf-8")